@@ -0,0 +1,23 @@
+"""Общая инициализация Django для скриптов бенчмарков."""
+
+import os
+import sys
+from pathlib import Path
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent / "royale_helper"
+
+
+def setup(**env: str) -> None:
+    """
+    Поднимает Django-проект royale_helper. Переменные окружения из ``env``
+    (например, DJANGO_DB_PATH) выставляются до загрузки settings.
+    """
+    os.environ.update(env)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "royale_helper.settings")
+    if str(PROJECT_DIR) not in sys.path:
+        sys.path.insert(0, str(PROJECT_DIR))
+
+    import django
+
+    django.setup()
@@ -0,0 +1,113 @@
+"""
+Время старта: импорт модулей для команд manage.py и воркеров.
+
+Каждый сценарий запускается в отдельном процессе с ``python -X importtime``
+несколько раз; в отчёте — медиана суммарного времени импорта и время
+процесса целиком. Проверки (код выхода 1 при нарушении):
+
+* медиана времени импорта не превышает --budget-ms;
+* сценарий не импортирует модули, которые ему не нужны (requests, bs4).
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --runs 10 --budget-ms 450
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, NamedTuple, Sequence, Tuple
+
+from _django import PROJECT_DIR
+
+
+SETUP = "import django; django.setup(); "
+
+
+class Scenario(NamedTuple):
+    name: str
+    args: Sequence[str]
+    # Модули, которых не должно быть среди импортированных.
+    forbidden: Tuple[str, ...]
+
+
+SCENARIOS = [
+    Scenario("manage.py repopulate_db --help", ["manage.py", "repopulate_db", "--help"], ("requests", "bs4")),
+    Scenario("manage.py batch_recommend --help", ["manage.py", "batch_recommend", "--help"], ("requests", "bs4")),
+    Scenario("воркер batch_recommend", ["-c", SETUP + "import app.services.batch_recommend"], ("requests", "bs4")),
+    Scenario("воркер каталога", ["-c", SETUP + "import app.services.deck_catalog"], ("requests", "bs4")),
+    Scenario("views (первый запрос)", ["-c", SETUP + "import app.views"], ("requests", "bs4")),
+]
+
+# "import time: self [us] | cumulative | imported package"; у модулей
+# верхнего уровня имя отделено от черты одним пробелом.
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+
+def measure(args: Sequence[str]) -> Tuple[float, float, List[str]]:
+    """Время импорта (сумма по модулям верхнего уровня), время процесса, модули."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE="royale_helper.settings")
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall = time.perf_counter() - started
+
+    total_us = 0
+    modules: List[str] = []
+    for line in completed.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        modules.append(match.group(4))
+        if len(match.group(3)) == 1:
+            total_us += int(match.group(2))
+    return total_us / 1000, wall * 1000, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=520.0,
+        help="Предел медианы времени импорта на сценарий.",
+    )
+    args = parser.parse_args()
+
+    failures: List[str] = []
+    print(f"{'сценарий':36} {'импорт, мс':>11} {'процесс, мс':>12}")
+    for scenario in SCENARIOS:
+        imports: List[float] = []
+        walls: List[float] = []
+        loaded: set[str] = set()
+        for _ in range(args.runs):
+            import_ms, wall_ms, modules = measure(scenario.args)
+            imports.append(import_ms)
+            walls.append(wall_ms)
+            loaded.update(modules)
+        median = statistics.median(imports)
+        print(f"{scenario.name:36} {median:11.0f} {statistics.median(walls):12.0f}")
+
+        if median > args.budget_ms:
+            failures.append(f"{scenario.name}: импорт {median:.0f} мс > {args.budget_ms:.0f} мс")
+        for module in scenario.forbidden:
+            if module in loaded:
+                failures.append(f"{scenario.name}: импортирован {module}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
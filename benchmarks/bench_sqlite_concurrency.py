@@ -0,0 +1,128 @@
+"""
+Пропускная способность SQLite при одновременных чтениях и записи.
+
+Поднимает временную БД, наполняет её колодами и в течение --seconds
+гоняет один поток-импортёр (транзакция: колода + 8 карт + запись в
+журнал каталога) и --readers потоков, читающих колоды как view.
+
+    python benchmarks/bench_sqlite_concurrency.py --journal-mode wal
+    python benchmarks/bench_sqlite_concurrency.py --journal-mode delete
+    python benchmarks/bench_sqlite_concurrency.py --replica
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import _django
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--journal-mode", default="wal", choices=["wal", "delete"])
+    parser.add_argument("--replica", action="store_true", help="Читать через read-only alias.")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--decks", type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    _django.setup(
+        DJANGO_DB_PATH=str(Path(tmp_dir.name) / "bench.sqlite3"),
+        SQLITE_JOURNAL_MODE=args.journal_mode.upper(),
+        DJANGO_DB_READ_REPLICA="true" if args.replica else "false",
+    )
+
+    from django.core.management import call_command
+    from django.db import OperationalError, connections, transaction
+
+    from app.models import Card, Deck, DeckCard
+    from app.services.deck_catalog import record_catalog_changes
+
+    call_command("migrate", verbosity=0)
+    cards = Card.objects.bulk_create(
+        [Card(api_id=26000000 + i, name=f"Card {i}", max_level=14) for i in range(100)]
+    )
+    decks = Deck.objects.bulk_create(
+        [Deck(mode="bench", win_rate=50.0, avg_elixir=3.5) for _ in range(args.decks)]
+    )
+    DeckCard.objects.bulk_create(
+        [
+            DeckCard(deck=deck, card=cards[(n * 7 + pos) % len(cards)], position=pos)
+            for n, deck in enumerate(decks)
+            for pos in range(8)
+        ]
+    )
+    connections.close_all()
+
+    stop = threading.Event()
+    counters = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    lock = threading.Lock()
+
+    def bump(name: str) -> None:
+        with lock:
+            counters[name] += 1
+
+    def reader() -> None:
+        while not stop.is_set():
+            try:
+                rows = list(
+                    Deck.objects.order_by("-id").values_list("id", "win_rate")[:50]
+                )
+                list(
+                    DeckCard.objects.filter(deck_id__in=[row[0] for row in rows])
+                    .values_list("deck_id", "card__api_id")
+                )
+            except OperationalError:
+                bump("read_errors")
+            else:
+                bump("reads")
+        connections.close_all()
+
+    def writer() -> None:
+        n = 0
+        while not stop.is_set():
+            try:
+                with transaction.atomic():
+                    deck = Deck.objects.create(mode="bench", win_rate=51.0)
+                    DeckCard.objects.bulk_create(
+                        [
+                            DeckCard(deck=deck, card=cards[(n + pos) % len(cards)], position=pos)
+                            for pos in range(8)
+                        ]
+                    )
+                    record_catalog_changes(upserted=[deck.pk])
+            except OperationalError:
+                bump("write_errors")
+            else:
+                bump("writes")
+            n += 1
+        connections.close_all()
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads.append(threading.Thread(target=writer))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"journal_mode={args.journal_mode} replica={args.replica} readers={args.readers}"
+    )
+    print(
+        f"  reads:  {counters['reads'] / elapsed:10.1f}/s  errors: {counters['read_errors']}"
+    )
+    print(
+        f"  writes: {counters['writes'] / elapsed:10.1f}/s  errors: {counters['write_errors']}"
+    )
+    tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
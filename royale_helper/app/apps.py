@@ -1,6 +1,38 @@
+import os
+import sys
+from pathlib import Path
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+# Программы, которые запускают WSGI/ASGI-приложение и обслуживают запросы.
+SERVERS = ("gunicorn", "uwsgi", "daphne", "uvicorn", "hypercorn")
+
+
+def _serves_requests() -> bool:
+    """
+    Процесс будет обслуживать запросы: один из SERVERS (в том числе через
+    ``python -m``) или рабочий процесс runserver. Остальные процессы —
+    команды manage.py, тесты, ``python -c``, celery, скрипты — прогрев
+    не запускают.
+    """
+    path = Path(sys.argv[0]) if sys.argv and sys.argv[0] else Path()
+    program = path.parent.name if path.name == "__main__.py" else path.stem
+    if program in SERVERS:
+        return True
+    if program not in ("manage", "django-admin") or sys.argv[1:2] != ["runserver"]:
+        return False
+    # С автоперезагрузкой запросы обслуживает дочерний процесс.
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
 
 
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        if settings.WARMUP_ON_STARTUP and _serves_requests():
+            from .services.warmup import start_warmup
+
+            start_warmup()
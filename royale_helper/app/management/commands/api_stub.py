@@ -0,0 +1,94 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.services.api_stub import (
+    StubConfig,
+    default_stub_data,
+    make_stub_server,
+    stub_base_url,
+)
+
+
+DEFAULT_PROFILES_DIR = Path(settings.BASE_DIR) / "player_profiles"
+
+
+def add_stub_arguments(parser) -> None:
+    parser.add_argument(
+        "--profiles",
+        type=str,
+        default=str(DEFAULT_PROFILES_DIR),
+        help="Каталог с записанными ответами /players/{tag} (по умолчанию player_profiles/).",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=0.0,
+        help="Задержка каждого ответа заглушки, мс.",
+    )
+    parser.add_argument(
+        "--jitter-ms",
+        type=float,
+        default=0.0,
+        help="Случайная добавка к задержке, от 0 до указанного значения, мс.",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Доля ответов с ошибкой (0..1).",
+    )
+    parser.add_argument(
+        "--error-status",
+        type=int,
+        default=503,
+        help="HTTP-статус внедряемых ошибок (по умолчанию 503).",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Зерно генератора задержек и ошибок.",
+    )
+
+
+def stub_config(options) -> StubConfig:
+    return StubConfig(
+        latency=options["latency_ms"] / 1000,
+        jitter=options["jitter_ms"] / 1000,
+        error_rate=options["error_rate"],
+        error_status=options["error_status"],
+        seed=options["seed"],
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Локальная заглушка Clash Royale API: /players/{tag} и /cards из записанных "
+        "профилей или синтетических данных, с задержками и ошибками. Для работы "
+        "приложения через заглушку укажи CLASH_ROYALE_API_BASE_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", type=str, default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        add_stub_arguments(parser)
+
+    def handle(self, *args, **options):
+        try:
+            data = default_stub_data(options["profiles"])
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        server = make_stub_server(data, stub_config(options), options["host"], options["port"])
+        self.stdout.write(
+            f"Заглушка API: {stub_base_url(server)} "
+            f"(записанных профилей {len(data.recorded)}, карт {len(data.cards)}). Ctrl+C — выход."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
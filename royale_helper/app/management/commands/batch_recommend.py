@@ -0,0 +1,176 @@
+import csv
+import json
+import sys
+import time
+from contextlib import nullcontext
+from itertools import chain
+from typing import Any, Dict, Iterator, TextIO
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.services.batch_recommend import (
+    CHUNK_SIZE,
+    BatchItem,
+    dump_items,
+    run_batch,
+    stored_items,
+    tag_items,
+)
+
+
+CSV_FIELDS = (
+    "tag",
+    "name",
+    "trophies",
+    "rank",
+    "deck_id",
+    "mode",
+    "owned_cards",
+    "total_level",
+    "win_rate",
+    "avg_elixir",
+    "cards",
+    "error",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Пакетный подбор колод для многих игроков: теги (из хранилища профилей), "
+        "все сохранённые профили или JSON-дампы player_profiles/. Работа "
+        "делится между процессами, результат пишется потоком в NDJSON или CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("tags", nargs="*", help="Теги игроков из хранилища профилей.")
+        parser.add_argument(
+            "--tags-file",
+            type=str,
+            default="",
+            help="Файл с тегами, по одному в строке ('-' — stdin).",
+        )
+        parser.add_argument(
+            "--stored",
+            action="store_true",
+            help="Все игроки из хранилища профилей (StoredPlayer).",
+        )
+        parser.add_argument(
+            "--profiles",
+            type=str,
+            default="",
+            help="Каталог с JSON-дампами ответов API (например, player_profiles/).",
+        )
+        parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+        parser.add_argument("--output", type=str, default="-", help="Файл результата ('-' — stdout).")
+        parser.add_argument("--limit", type=int, default=3, help="Колод на игрока.")
+        parser.add_argument(
+            "--diverse",
+            action="store_true",
+            help="Переранжировать на разнообразие (RECOMMENDATION_DIVERSITY).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Число процессов (по умолчанию — число ядер; 1 — в текущем процессе).",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Игроков в одной пачке.")
+
+    def handle(self, *args, **options):
+        items = self._items(options)
+        if items is None:
+            raise CommandError("Укажи теги, --tags-file, --stored или --profiles.")
+        if options["chunk_size"] < 1 or options["limit"] < 1:
+            raise CommandError("--chunk-size и --limit должны быть положительными.")
+
+        output = options["output"]
+        # Отчёт не должен смешиваться с результатом в stdout.
+        log = self.stderr if output == "-" else self.stdout
+        context = nullcontext(self.stdout) if output == "-" else open(output, "w", encoding="utf-8", newline="")
+        results = run_batch(
+            items,
+            limit=options["limit"],
+            diversity=settings.RECOMMENDATION_DIVERSITY if options["diverse"] else 0.0,
+            workers=options["workers"] or None,
+            chunk_size=options["chunk_size"],
+        )
+
+        started = time.perf_counter()
+        with context as stream:
+            write = self._csv_writer(stream) if options["format"] == "csv" else self._ndjson_writer(stream)
+            processed = errors = 0
+            for result in results:
+                write(result)
+                processed += 1
+                errors += "error" in result
+
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0.0
+        summary = (
+            f"Обработано профилей: {processed} (ошибок {errors}) за {elapsed:.1f} с, "
+            f"{rate:.0f} профилей/с"
+        )
+        peak = _peak_rss_mb()
+        if peak is not None:
+            summary += f"; пик памяти основного процесса {peak:.0f} МБ"
+        log.write(self.style.SUCCESS(summary + "."))
+
+    @staticmethod
+    def _items(options) -> Iterator[BatchItem] | None:
+        sources = []
+        if options["tags"]:
+            sources.append(tag_items(options["tags"]))
+        if options["tags_file"]:
+            sources.append(tag_items(_read_lines(options["tags_file"])))
+        if options["stored"]:
+            sources.append(stored_items())
+        if options["profiles"]:
+            sources.append(dump_items(options["profiles"]))
+        return chain.from_iterable(sources) if sources else None
+
+    @staticmethod
+    def _ndjson_writer(stream: TextIO):
+        def write(result: Dict[str, Any]) -> None:
+            stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+        return write
+
+    @staticmethod
+    def _csv_writer(stream: TextIO):
+        writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+
+        def write(result: Dict[str, Any]) -> None:
+            player = {key: result.get(key, "") for key in ("tag", "name", "trophies", "error")}
+            recommendations = result.get("recommendations") or []
+            if not recommendations:
+                writer.writerow(player)
+            for rank, deck in enumerate(recommendations, start=1):
+                row = dict(player, rank=rank, **deck)
+                row["cards"] = " ".join(map(str, deck["cards"]))
+                writer.writerow(row)
+
+        return write
+
+
+def _peak_rss_mb() -> float | None:
+    """Пик RSS процесса в МБ; None, где модуля resource нет (Windows)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss — КиБ в Linux и байты в macOS.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _read_lines(path: str) -> Iterator[str]:
+    if path == "-":
+        yield from sys.stdin
+        return
+    with open(path, encoding="utf-8") as lines:
+        yield from lines
@@ -0,0 +1,69 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from app.services.clan_recommend import CLAN_WORKERS, clan_report, report_payload
+from app.services.clash_royale import ClashRoyaleAPIError
+
+
+class Command(BaseCommand):
+    help = (
+        "Подбор колод для всех участников клана: состав из /clans/{tag}/members, "
+        "профили загружаются параллельно в пределах бюджета пула токенов API, "
+        "отчёт кэшируется на CLAN_REPORT_TTL секунд."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("clan_tag", type=str, help="Тег клана, например #9GULPJ9L.")
+        parser.add_argument("--limit", type=int, default=3, help="Колод на игрока.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=CLAN_WORKERS,
+            help="Одновременных запросов профилей.",
+        )
+        parser.add_argument(
+            "--diverse",
+            action="store_true",
+            help="Переранжировать на разнообразие (RECOMMENDATION_DIVERSITY).",
+        )
+        parser.add_argument("--refresh", action="store_true", help="Пересчитать, не глядя в кэш.")
+        parser.add_argument("--json", action="store_true", help="Вывести отчёт в JSON.")
+
+    def handle(self, *args, **options):
+        if options["limit"] < 1 or options["workers"] < 1:
+            raise CommandError("--limit и --workers должны быть положительными.")
+        try:
+            report = clan_report(
+                options["clan_tag"],
+                workers=options["workers"],
+                limit=options["limit"],
+                diversity=settings.RECOMMENDATION_DIVERSITY if options["diverse"] else 0.0,
+                refresh=options["refresh"],
+            )
+        except (ValueError, ImproperlyConfigured, ClashRoyaleAPIError) as exc:
+            raise CommandError(str(exc)) from exc
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report_payload(report), ensure_ascii=False))
+            return
+
+        for item in report.members:
+            header = f"{item.member.name} ({item.member.tag}, {item.member.trophies} 🏆)"
+            if item.error:
+                self.stdout.write(f"{header}: {item.error}")
+                continue
+            decks = ", ".join(
+                f"#{deck.deck.id} {deck.owned_cards_count}/8" for deck in item.recommendations
+            )
+            self.stdout.write(f"{header}: {decks or 'нет подходящих колод'}")
+
+        source = "из кэша" if report.from_cache else f"за {report.elapsed:.1f} с"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Клан {report.tag}: участников {len(report.members)}, "
+                f"ошибок {report.failed}, {source}."
+            )
+        )
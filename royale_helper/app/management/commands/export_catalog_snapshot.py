@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.services.catalog_snapshot import write_snapshot
+from app.services.deck_catalog import DeckCatalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает каталог колод в компактный бинарный снимок, который воркеры "
+        "открывают через mmap без запросов к БД."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            type=str,
+            default=settings.CATALOG_SNAPSHOT_PATH,
+            help="Путь до файла снимка (по умолчанию CATALOG_SNAPSHOT_PATH).",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        started = time.perf_counter()
+
+        catalog = DeckCatalog.from_db()
+        size = write_snapshot(catalog, output)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Снимок записан в {output}: колод {len(catalog)}, "
+                f"{size} байт, версия {catalog.version}, {elapsed:.2f} с."
+            )
+        )
@@ -1,62 +1,65 @@
-import os
 
-import requests
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.core.management.base import BaseCommand, CommandError
 
 from app.models import Card
-
-
-BASE_URL = "https://api.clashroyale.com/v1"
+from app.services.clash_royale import ClashRoyaleAPI, ClashRoyaleAPIError
+from app.services.deck_catalog import record_catalog_changes
+
+
+def fetch_cards(api: ClashRoyaleAPI | None = None) -> List[Dict[str, Any]]:
+    """
+    Запрашивает список карт из официального API и возвращает items. Запрос
+    идёт через ClashRoyaleAPI, то есть через общий пул токенов с лимитом.
+    """
+    try:
+        return (api or ClashRoyaleAPI()).get_cards()
+    except ImproperlyConfigured as exc:
+        raise CommandError(str(exc)) from exc
+    except ClashRoyaleAPIError as exc:
+        raise CommandError(f"Ошибка запроса к API: {exc}") from exc
+
+
+def card_defaults(item: Dict[str, Any]) -> Dict[str, Any] | None:
+    """Поля Card для элемента ответа API или None, если элемент неполный."""
+    if item.get("id") is None or not item.get("name"):
+        return None
+
+    icon_urls = item.get("iconUrls") or {}
+    return {
+        "name": item["name"],
+        "slug": Card.make_slug(item["name"]),
+        "max_level": item.get("maxLevel"),
+        "max_evolution_level": item.get("maxEvolutionLevel"),
+        "max_star_level": item.get("maxStarLevel"),
+        "elixir": item.get("elixirCost"),
+        "icon_url": icon_urls.get("medium") or "",
+    }
 
 
 class Command(BaseCommand):
     help = "Импортирует все карты из официального Clash Royale API в таблицу Card"
 
     def handle(self, *args, **options):
-        token = os.getenv("CLASH_ROYALE_API_TOKEN")
-        if not token:
-            raise CommandError(
-                "Переменная окружения CLASH_ROYALE_API_TOKEN не установлена. "
-                "Добавь её в .env в корне проекта."
-            )
-
-        url = f"{BASE_URL}/cards"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/json",
-        }
-
-        self.stdout.write(f"Запрашиваю список карт из {url} ...")
-        resp = requests.get(url, headers=headers, timeout=15)
-        if resp.status_code != 200:
-            raise CommandError(
-                f"Ошибка запроса к API: {resp.status_code} {resp.text}"
-            )
-
-        data = resp.json()
-        items = data.get("items", [])
+        self.stdout.write(
+            f"Запрашиваю список карт из {settings.CLASH_ROYALE_API_BASE_URL}/cards ..."
+        )
+        items = fetch_cards()
         self.stdout.write(f"Найдено карт: {len(items)}")
 
         created = 0
         updated = 0
 
         for item in items:
-            api_id = item.get("id")
-            name = item.get("name")
-            if api_id is None or not name:
+            defaults = card_defaults(item)
+            if defaults is None:
                 continue
 
-            icon_urls = item.get("iconUrls") or {}
-            defaults = {
-                "name": name,
-                "max_level": item.get("maxLevel"),
-                "max_evolution_level": item.get("maxEvolutionLevel"),
-                "max_star_level": item.get("maxStarLevel"),
-                "icon_url": icon_urls.get("medium") or "",
-            }
-
             obj, created_flag = Card.objects.update_or_create(
-                api_id=api_id,
+                api_id=item["id"],
                 defaults=defaults,
             )
             if created_flag:
@@ -64,10 +67,11 @@ class Command(BaseCommand):
             else:
                 updated += 1
 
+        if created or updated:
+            record_catalog_changes(cards_changed=True)
+
         self.stdout.write(
             self.style.SUCCESS(
                 f"Готово. Создано карт: {created}, обновлено: {updated}."
             )
         )
-
-
@@ -0,0 +1,122 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.services.card_index import CardIndex
+from app.services.deck_pipeline import run_pages_pipeline, run_pipeline
+from app.services.deck_sources import SOURCES, DeckSource, RoyaleAPISource, get_source
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует колоды из подключаемого источника (fetch → parse → "
+        "normalize → upsert) в таблицы Deck/DeckCard."
+    )
+
+    # Команды конкретных источников наследуются и фиксируют source_name.
+    source_name: str | None = None
+
+    def add_arguments(self, parser):
+        if self.source_name is None:
+            parser.add_argument(
+                "--source",
+                type=str,
+                required=True,
+                choices=sorted(SOURCES),
+                help="Источник колод.",
+            )
+        parser.add_argument(
+            "--url",
+            type=str,
+            default="",
+            help="URL страницы с колодами (по умолчанию — URL источника).",
+        )
+        parser.add_argument(
+            "--file",
+            type=str,
+            default="",
+            help=(
+                "Путь до заранее сохранённого HTML-файла (например, page.html). "
+                "Если указан, страница не будет скачиваться по сети."
+            ),
+        )
+        parser.add_argument(
+            "--pages",
+            type=str,
+            default="",
+            help=(
+                "Пачка сохранённых страниц: каталог, glob-шаблон или tar-архив. "
+                "Страницы разбираются параллельно в нескольких процессах."
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=0,
+            help="Число процессов для разбора --pages (по умолчанию — число ядер).",
+        )
+        parser.add_argument(
+            "--mode",
+            type=str,
+            default="",
+            help="Значение поля Deck.mode (по умолчанию — режим источника).",
+        )
+        parser.add_argument(
+            "--fuzzy",
+            action="store_true",
+            help=(
+                "Сопоставлять нераспознанные названия карт нечётко (до двух опечаток); "
+                "по умолчанию — только точно и по псевдонимам."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        try:
+            source = get_source(self.source_name or options["source"])
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        index = CardIndex.from_db(fuzzy=options["fuzzy"])
+        if options["pages"]:
+            self.stdout.write(f"Разбираю страницы: {options['pages']}")
+            try:
+                report = run_pages_pipeline(
+                    source,
+                    options["pages"],
+                    mode=options["mode"] or None,
+                    workers=options["workers"] or None,
+                    index=index,
+                )
+            except OSError as exc:
+                raise CommandError(f"Не удалось прочитать страницы: {exc}") from exc
+            self.stdout.write(f"Страниц: {report.pages}")
+        else:
+            html = self.load_html(source, options)
+            report = run_pipeline(source, html, mode=options["mode"] or None, index=index)
+
+        if report.unresolved_names:
+            names = ", ".join(
+                f"{name} ×{count}" for name, count in report.unresolved_names.most_common()
+            )
+            self.stdout.write(self.style.WARNING(f"Нераспознанные карты: {names}"))
+        self.stdout.write(self.style.SUCCESS(f"Готово: {report}."))
+
+    def load_html(self, source: DeckSource, options) -> str:
+        if options["file"]:
+            self.stdout.write(f"Читаю HTML из файла: {options['file']}")
+            try:
+                return source.read_file(options["file"])
+            except OSError as exc:
+                raise CommandError(
+                    f"Не удалось прочитать файл {options['file']}: {exc}"
+                ) from exc
+
+        url = options["url"] or source.default_url
+        self.stdout.write(f"Скачиваю страницу с колодами: {url}")
+        html = source.fetch(url)
+        if isinstance(source, RoyaleAPISource) and not source.has_markers(html):
+            self.stdout.write(
+                self.style.WARNING(
+                    "В HTML не найдены ожидаемые маркеры ('Best Clash Royale Decks' / "
+                    "'Popular Decks' / 'Deck Stats'). Структура страницы могла измениться."
+                )
+            )
+        return html
@@ -0,0 +1,81 @@
+import time
+from itertools import chain
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import StoredPlayer
+from app.services.battle_log import (
+    BATCH_SIZE,
+    FETCH_WORKERS,
+    MIN_BATTLES,
+    BattleAggregator,
+    fetch_battle_logs,
+    prune_battle_keys,
+)
+from app.services.clash_royale import ClashRoyaleAPI, ClashRoyaleAPIError
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает журналы боёв игроков (/players/{tag}/battlelog) и обновляет "
+        "счётчики побед и корон колод. Каждый бой учитывается один раз; колоды "
+        "с достаточным числом боёв попадают в каталог в режиме battlelog."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("tags", nargs="*", help="Теги игроков.")
+        parser.add_argument(
+            "--stored",
+            action="store_true",
+            help="Все игроки из хранилища профилей (StoredPlayer).",
+        )
+        parser.add_argument("--clan", type=str, default="", help="Все участники клана с этим тегом.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=FETCH_WORKERS,
+            help="Одновременных запросов журналов.",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Боёв в одной транзакции.")
+        parser.add_argument(
+            "--min-battles",
+            type=int,
+            default=MIN_BATTLES,
+            help="Сколько боёв нужно колоде, чтобы попасть в каталог.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["tags"] and not options["clan"] and not options["stored"]:
+            raise CommandError("Укажи теги, --stored или --clan.")
+        if options["workers"] < 1 or options["batch_size"] < 1:
+            raise CommandError("--workers и --batch-size должны быть положительными.")
+        try:
+            api = ClashRoyaleAPI()
+            sources = [options["tags"]]
+            if options["clan"]:
+                sources.append(member.tag for member in api.get_clan_members(options["clan"]))
+        except (ValueError, ImproperlyConfigured, ClashRoyaleAPIError) as exc:
+            raise CommandError(str(exc)) from exc
+        if options["stored"]:
+            sources.append(StoredPlayer.objects.values_list("tag", flat=True).iterator())
+
+        started = time.perf_counter()
+        aggregator = BattleAggregator(options["batch_size"], options["min_battles"])
+        players = errors = 0
+        for tag, battles in fetch_battle_logs(api, chain.from_iterable(sources), options["workers"]):
+            players += 1
+            if isinstance(battles, ClashRoyaleAPIError):
+                errors += 1
+                self.stderr.write(f"{tag}: {battles}")
+                continue
+            aggregator.add(battles)
+        result = aggregator.flush()
+
+        pruned = prune_battle_keys()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Журналов: {players} (ошибок {errors}); {result}; "
+                f"удалено старых ключей {pruned}; {time.perf_counter() - started:.1f} с."
+            )
+        )
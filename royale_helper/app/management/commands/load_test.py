@@ -0,0 +1,183 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Callable, List
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from app.management.commands.api_stub import add_stub_arguments, stub_config
+from app.services.api_stub import (
+    default_stub_data,
+    start_stub_server,
+    stub_base_url,
+    synthetic_tag,
+)
+
+
+RECOMMEND_PATH = "/recommend/"
+
+
+@dataclass
+class LoadReport:
+    sent: int
+    errors: int
+    elapsed: float
+    latencies: List[float]
+
+    def percentile(self, q: int) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[q - 1]
+
+    def __str__(self) -> str:
+        throughput = self.sent / self.elapsed if self.elapsed else 0.0
+        return (
+            f"запросов {self.sent}, ошибок {self.errors}, "
+            f"пропускная способность {throughput:.1f} запр/с; "
+            f"p50 {self.percentile(50) * 1000:.1f} мс, "
+            f"p95 {self.percentile(95) * 1000:.1f} мс, "
+            f"p99 {self.percentile(99) * 1000:.1f} мс, "
+            f"max {max(self.latencies, default=0) * 1000:.1f} мс"
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест /recommend/ с заданным RPS. По умолчанию всё работает "
+        "в одном процессе и без сети: поднимается заглушка Clash Royale API, "
+        "запросы идут через тестовый клиент Django. С --url запросы уходят на "
+        "уже запущенный сервер приложения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rps", type=float, default=20.0, help="Целевое число запросов в секунду.")
+        parser.add_argument("--duration", type=float, default=10.0, help="Длительность теста, секунд.")
+        parser.add_argument("--concurrency", type=int, default=16, help="Число одновременных запросов.")
+        parser.add_argument("--players", type=int, default=200, help="Число разных синтетических тегов.")
+        parser.add_argument(
+            "--url",
+            type=str,
+            default="",
+            help="Базовый URL запущенного приложения, например http://127.0.0.1:8000.",
+        )
+        parser.add_argument(
+            "--api-url",
+            type=str,
+            default="",
+            help="Уже запущенная заглушка API (manage.py api_stub); иначе поднимается своя.",
+        )
+        add_stub_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options["rps"] <= 0 or options["duration"] <= 0:
+            raise CommandError("--rps и --duration должны быть положительными.")
+
+        tags = [synthetic_tag(number) for number in range(options["players"])]
+        stub = None
+        api_url = options["api_url"]
+        if not api_url and not options["url"]:
+            try:
+                stub = start_stub_server(default_stub_data(options["profiles"]), stub_config(options))
+            except ValueError as exc:
+                raise CommandError(str(exc)) from exc
+            api_url = stub_base_url(stub)
+            self.stdout.write(f"Заглушка API: {api_url}")
+
+        if options["url"]:
+            send = self._http_sender(options["url"].rstrip("/") + RECOMMEND_PATH)
+            context = nullcontext()
+        else:
+            send = self._client_sender()
+            context = override_settings(
+                CLASH_ROYALE_API_BASE_URL=api_url,
+                CLASH_ROYALE_API_TOKEN="stub-token",
+                # У заглушки нет лимитов, бюджет токена не должен мерить себя.
+                CLASH_ROYALE_API_RATE_LIMIT=1e6,
+                ALLOWED_HOSTS=["*"],
+            )
+
+        self.stdout.write(
+            f"Нагрузка: {options['rps']:g} запр/с в течение {options['duration']:g} с, "
+            f"до {options['concurrency']} одновременно."
+        )
+        try:
+            with context:
+                report = self._run(send, tags, options)
+        finally:
+            if stub is not None:
+                stub.shutdown()
+                stub.server_close()
+
+        self.stdout.write(self.style.SUCCESS(f"Готово: {report}."))
+
+    def _run(self, send: Callable[[str], bool], tags: List[str], options) -> LoadReport:
+        """
+        Открытая модель нагрузки: запросы отправляются по расписанию
+        независимо от ответов, а задержка считается от запланированного
+        момента, поэтому очередь при перегрузке видна в перцентилях.
+        """
+        interval = 1 / options["rps"]
+        total = max(1, int(options["rps"] * options["duration"]))
+        latencies: List[float] = []
+        errors = 0
+        lock = threading.Lock()
+
+        def one(tag: str, scheduled: float) -> None:
+            nonlocal errors
+            try:
+                ok = send(tag)
+            except Exception:  # noqa: BLE001 - любая ошибка клиента — неуспешный запрос
+                ok = False
+            latency = time.perf_counter() - scheduled
+            with lock:
+                latencies.append(latency)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            for number in range(total):
+                scheduled = started + number * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(one, tags[number % len(tags)], scheduled)
+        elapsed = time.perf_counter() - started
+        return LoadReport(sent=total, errors=errors, elapsed=elapsed, latencies=latencies)
+
+    @staticmethod
+    def _client_sender() -> Callable[[str], bool]:
+        local = threading.local()
+
+        def send(tag: str) -> bool:
+            if not hasattr(local, "client"):
+                local.client = Client()
+            response = local.client.post(RECOMMEND_PATH, {"player_tag": tag, "diverse": "1"})
+            return response.status_code == 200 and b"alert-error" not in response.content
+
+        return send
+
+    @staticmethod
+    def _http_sender(url: str) -> Callable[[str], bool]:
+        local = threading.local()
+
+        def send(tag: str) -> bool:
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+                local.session.get(url, timeout=30)
+            token = local.session.cookies.get("csrftoken", "")
+            response = local.session.post(
+                url,
+                data={"player_tag": tag, "diverse": "1", "csrfmiddlewaretoken": token},
+                headers={"Referer": url},
+                timeout=30,
+            )
+            return response.status_code == 200 and "alert-error" not in response.text
+
+        return send
@@ -0,0 +1,178 @@
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from app.management.commands.import_cards import card_defaults, fetch_cards
+from app.services.battle_log import prune_battle_keys
+from app.services.catalog_sync import sync_cards
+from app.services.deck_catalog import prune_catalog_changes
+from app.services.deck_history import prune_snapshots
+from app.services.deck_pipeline import sync_raw_decks
+from app.services.deck_sources import SOURCES, get_source
+
+
+DEFAULT_LOCK_FILE = Path(settings.BASE_DIR) / "refresh_daemon.lock"
+
+
+@dataclass
+class RefreshJob:
+    name: str
+    interval: float
+    # fetch выполняется в пуле потоков (сеть + парсинг), apply — в основном
+    # потоке, чтобы записи в SQLite шли последовательно.
+    fetch: Callable[[], Any]
+    apply: Callable[[Any], object]
+    next_run: float = field(default=0.0)
+
+
+@contextmanager
+def single_instance_lock(path: Path) -> Iterator[None]:
+    """Эксклюзивная неблокирующая блокировка файла: второй экземпляр сразу падает."""
+    handle = open(path, "a+")
+    try:
+        try:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:  # Windows
+            import msvcrt
+
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        raise CommandError(f"refresh_daemon уже запущен (блокировка {path}).")
+    try:
+        yield
+    finally:
+        handle.close()
+
+
+def _fetch_cards() -> Dict[int, Dict[str, Any]]:
+    cards: Dict[int, Dict[str, Any]] = {}
+    for item in fetch_cards():
+        defaults = card_defaults(item)
+        if defaults is not None:
+            cards[item["id"]] = defaults
+    return cards
+
+
+def _prune_history(_: Any = None) -> None:
+    prune_snapshots()
+    prune_battle_keys()
+
+
+def _source_job(name: str, interval: float) -> RefreshJob:
+    source = get_source(name)
+    return RefreshJob(
+        name,
+        interval,
+        # Скачивание и разбор страницы — в потоке пула, запись — в основном.
+        lambda: list(source.parse(source.fetch())),
+        lambda decks: sync_raw_decks(decks, mode=source.default_mode, source=source.name),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Фоновое обновление карт и метовых колод по расписанию. Загрузки идут "
+        "параллельно, в БД пишутся только изменения, а журнал каталога "
+        "позволяет веб-воркерам подхватить их без перезапуска."
+    )
+
+    # Часы расписания; в тестах подменяются.
+    clock = staticmethod(time.monotonic)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cards-interval",
+            type=float,
+            default=24 * 60 * 60,
+            help="Интервал обновления карт, секунд (по умолчанию сутки).",
+        )
+        parser.add_argument(
+            "--decks-interval",
+            type=float,
+            default=60 * 60,
+            help="Интервал обновления колод, секунд (по умолчанию час).",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.1,
+            help="Случайный разброс интервала, доля от него (по умолчанию 0.1).",
+        )
+        parser.add_argument(
+            "--lock-file",
+            type=str,
+            default=str(DEFAULT_LOCK_FILE),
+            help="Файл блокировки, не дающий запустить второй экземпляр.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить все задачи один раз и выйти.",
+        )
+
+    def handle(self, *args, **options):
+        self._stop = threading.Event()
+        self._jitter = options["jitter"]
+        jobs = [
+            RefreshJob("cards", options["cards_interval"], _fetch_cards, sync_cards),
+            # Обслуживание: снимки статистики, ключи боёв и журнал каталога
+            # старше срока хранения.
+            RefreshJob("history", 24 * 60 * 60, lambda: None, _prune_history),
+            RefreshJob("changes", 24 * 60 * 60, lambda: None, lambda _: prune_catalog_changes()),
+        ]
+        jobs.extend(
+            _source_job(name, options["decks_interval"]) for name in SOURCES
+        )
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, lambda *_: self._stop.set())
+            signal.signal(signal.SIGTERM, lambda *_: self._stop.set())
+
+        with single_instance_lock(Path(options["lock_file"])):
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                while not self._stop.is_set():
+                    delay = self._tick(jobs, executor)
+                    if options["once"]:
+                        break
+                    self._stop.wait(delay)
+
+    def _tick(self, jobs: List[RefreshJob], executor: ThreadPoolExecutor) -> float:
+        """Одна итерация цикла: выполняет наступившие задачи и возвращает паузу до следующей."""
+        now = self.clock()
+        due = [job for job in jobs if job.next_run <= now]
+        if due:
+            self._run(due, executor)
+        next_run = min(job.next_run for job in jobs)
+        return max(0.0, next_run - self.clock())
+
+    def _run(self, jobs: List[RefreshJob], executor: ThreadPoolExecutor) -> None:
+        # Карты применяем первыми: от них зависит сопоставление колод.
+        futures = [(job, executor.submit(job.fetch)) for job in jobs]
+        for job, future in futures:
+            started = time.perf_counter()
+            try:
+                close_old_connections()
+                result = job.apply(future.result())
+            except Exception as exc:  # noqa: BLE001 - демон не должен падать из-за одного источника
+                self.stderr.write(f"[{job.name}] ошибка обновления: {exc}")
+            else:
+                self.stdout.write(
+                    f"[{job.name}] {result} за {time.perf_counter() - started:.2f} с"
+                )
+            job.next_run = self.clock() + self._next_interval(job.interval)
+
+    def _next_interval(self, interval: float) -> float:
+        return interval * (1 + random.uniform(-self._jitter, self._jitter))
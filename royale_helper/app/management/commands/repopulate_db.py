@@ -1,26 +1,158 @@
-from django.core.management.base import BaseCommand
-from django.core.management import call_command
-from app.models import Card, Deck
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.management.commands.import_cards import card_defaults, fetch_cards
+from app.models import Card, Deck, DeckCard
+from app.services.catalog_sync import DeckRecord, DeckSink, SyncResult, sync_cards
+from app.services.deck_catalog import record_catalog_changes
+from app.services.deck_sources import RawDeck, StatsRoyaleSource
+
+
+DEFAULT_FILE = Path(settings.BASE_DIR).parent / "page.html"
+
 
 class Command(BaseCommand):
-    help = "Cleans the database and repopulates it with cards and decks."
+    help = (
+        "Rebuilds cards and the decks of one mode without exposing an empty catalog: "
+        "everything is fetched and parsed first, then swapped in with a single transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file",
+            type=str,
+            default=str(DEFAULT_FILE),
+            help="Saved StatsRoyale HTML page with decks (default: page.html in the repo root).",
+        )
+        parser.add_argument(
+            "--mode",
+            type=str,
+            default="path-of-legends",
+            help="Deck.mode value for imported decks; only decks of this mode are replaced.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows per bulk insert.",
+        )
 
     def handle(self, *args, **options):
-        self.stdout.write("Cleaning database...")
-        
-        # Delete Decks first to avoid foreign key issues (though cascade should handle it)
-        deleted_decks, _ = Deck.objects.all().delete()
-        self.stdout.write(f"Deleted {deleted_decks} decks.")
-        
-        deleted_cards, _ = Card.objects.all().delete()
-        self.stdout.write(f"Deleted {deleted_cards} cards.")
-        
-        self.stdout.write("Database cleaned. Starting repopulation...")
-        
-        self.stdout.write("Importing cards...")
-        call_command("import_cards")
-        
-        self.stdout.write("Importing decks from StatsRoyale (local file)...")
-        call_command("import_statsroyale_decks", file=r"..\page.html")
-        
-        self.stdout.write(self.style.SUCCESS("Successfully repopulated the database."))
+        started = time.perf_counter()
+
+        self.stdout.write("Staging cards from the Clash Royale API...")
+        staged_cards = self._stage_cards(fetch_cards())
+
+        file_path = Path(options["file"])
+        self.stdout.write(f"Staging decks from {file_path}...")
+        source = StatsRoyaleSource()
+        try:
+            html = source.read_file(file_path)
+        except OSError as exc:
+            raise CommandError(f"Cannot read {file_path}: {exc}") from exc
+        staged_decks = list(source.parse(html))
+
+        staged_at = time.perf_counter()
+        self.stdout.write(
+            f"Staged {len(staged_cards)} cards and {len(staged_decks)} decks "
+            f"in {staged_at - started:.2f}s. Swapping..."
+        )
+
+        result, removed = self._swap(
+            staged_cards,
+            staged_decks,
+            mode=options["mode"],
+            batch_size=options["batch_size"],
+        )
+
+        finished = time.perf_counter()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully repopulated the database: {len(staged_cards)} cards; decks "
+                f"{result.created} created, {result.updated} updated, "
+                f"{result.unchanged} unchanged, {removed} removed ({result.skipped} skipped). "
+                f"Swap took {finished - staged_at:.2f}s, total {finished - started:.2f}s."
+            )
+        )
+
+    @staticmethod
+    def _stage_cards(items: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        staged: Dict[int, Dict[str, Any]] = {}
+        for item in items:
+            defaults = card_defaults(item)
+            if defaults is not None:
+                staged[item["id"]] = defaults
+        if not staged:
+            raise CommandError("The API returned no cards, keeping the current catalog.")
+        return staged
+
+    @staticmethod
+    def _swap(
+        staged_cards: Dict[int, Dict[str, Any]],
+        staged_decks: List[RawDeck],
+        mode: str,
+        batch_size: int,
+    ) -> Tuple[SyncResult, int]:
+        """
+        Применяет подготовленные данные одной транзакцией: читатели до
+        коммита видят старые данные, после — сразу новые.
+
+        Заменяются только колоды режима ``mode``: они пишутся через DeckSink
+        (сопоставление по Deck.signature, история статистики сохраняется), а
+        колоды режима, которых нет на странице, и дубли по сигнатуре
+        удаляются. Колоды других режимов и источников не трогаются, поэтому
+        устаревшая карта удаляется, только если на неё не ссылается ни одна
+        колода. Возвращает результат записи колод и число удалённых.
+        """
+        records: List[DeckRecord] = []
+        skipped = 0
+        for deck_data in staged_decks:
+            try:
+                api_ids = [int(card_id) for card_id in deck_data.card_ids]
+            except ValueError:
+                skipped += 1
+                continue
+            if not all(api_id in staged_cards for api_id in api_ids):
+                skipped += 1
+                continue
+            records.append(
+                DeckRecord(
+                    api_ids=api_ids,
+                    avg_elixir=deck_data.avg_elixir,
+                    win_rate=deck_data.win_rate,
+                    avg_crowns=deck_data.avg_crowns,
+                )
+            )
+        keep = {Deck.make_signature(record.api_ids) for record in records}
+
+        with transaction.atomic():
+            sync_cards(staged_cards)
+
+            kept: set[str] = set()
+            removed: List[int] = []
+            rows = Deck.objects.filter(mode=mode).order_by("id").values_list("id", "signature")
+            for deck_id, signature in rows:
+                if signature in keep and signature not in kept:
+                    kept.add(signature)
+                else:
+                    removed.append(deck_id)
+            for start in range(0, len(removed), batch_size):
+                chunk = removed[start:start + batch_size]
+                DeckCard.objects.filter(deck_id__in=chunk).delete()
+                Deck.objects.filter(id__in=chunk).delete()
+            record_catalog_changes(deleted=removed)
+
+            result = DeckSink(mode, batch_size, source=StatsRoyaleSource.name).write(records)
+            stale_cards, _ = (
+                Card.objects.exclude(api_id__in=staged_cards).filter(in_decks__isnull=True).delete()
+            )
+            if stale_cards:
+                record_catalog_changes(cards_changed=True)
+
+        result.skipped += skipped
+        return result, len(removed)
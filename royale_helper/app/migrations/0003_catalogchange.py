@@ -0,0 +1,25 @@
+# Generated by Django 6.1.2 on 2026-10-19 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_remove_deck_name_alter_card_api_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('deck_id', models.BigIntegerField(blank=True, null=True)),
+                ('action', models.CharField(choices=[('upsert', 'Колода добавлена или изменена'), ('delete', 'Колода удалена'), ('cards', 'Изменён справочник карт'), ('reset', 'Полная перезагрузка каталога')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.1.2 on 2026-10-19 07:06
+
+from django.db import migrations, models
+
+
+def fill_signatures(apps, schema_editor):
+    Deck = apps.get_model('app', 'Deck')
+    DeckCard = apps.get_model('app', 'DeckCard')
+
+    api_ids_by_deck = {}
+    for deck_id, api_id in DeckCard.objects.values_list('deck_id', 'card__api_id'):
+        api_ids_by_deck.setdefault(deck_id, []).append(api_id)
+
+    decks = list(Deck.objects.only('id'))
+    for deck in decks:
+        deck.signature = ','.join(
+            str(api_id) for api_id in sorted(api_ids_by_deck.get(deck.id, []))
+        )
+    Deck.objects.bulk_update(decks, ['signature'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_catalogchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deck',
+            name='signature',
+            field=models.CharField(blank=True, db_index=True, max_length=128),
+        ),
+        migrations.RunPython(fill_signatures, migrations.RunPython.noop),
+    ]
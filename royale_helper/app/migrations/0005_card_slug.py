@@ -0,0 +1,30 @@
+# Generated by Django 6.1.2 on 2026-10-19 07:07
+
+import re
+
+from django.db import migrations, models
+
+
+def fill_slugs(apps, schema_editor):
+    Card = apps.get_model('app', 'Card')
+    cards = list(Card.objects.only('id', 'name'))
+    for card in cards:
+        slug = card.name.casefold().replace('.', '').replace("'", '')
+        card.slug = re.sub(r'[^a-z0-9]+', '-', slug).strip('-')
+    Card.objects.bulk_update(cards, ['slug'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_deck_signature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='slug',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+    ]
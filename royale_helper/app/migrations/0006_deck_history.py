@@ -0,0 +1,43 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_card_slug'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeckTrend',
+            fields=[
+                ('deck', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='app.deck')),
+                ('window_days', models.PositiveSmallIntegerField()),
+                ('samples', models.PositiveIntegerField()),
+                ('win_rate', models.FloatField(blank=True, null=True)),
+                ('win_rate_change', models.FloatField(blank=True, db_index=True, null=True)),
+                ('usage', models.FloatField(blank=True, null=True)),
+                ('avg_crowns', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeckStatSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(blank=True, max_length=20)),
+                ('taken_at', models.PositiveIntegerField()),
+                ('win_rate_x100', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('usage', models.PositiveIntegerField(blank=True, null=True)),
+                ('avg_crowns_x100', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('deck', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='app.deck')),
+            ],
+            options={
+                'ordering': ['taken_at'],
+                'indexes': [models.Index(fields=['deck', 'taken_at'], name='app_decksta_deck_id_2c5912_idx'), models.Index(fields=['taken_at'], name='app_decksta_taken_a_f43635_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_deck_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredPlayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=20, unique=True)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('exp_level', models.PositiveSmallIntegerField(default=0)),
+                ('trophies', models.PositiveIntegerField(default=0)),
+                ('best_trophies', models.PositiveIntegerField(blank=True, null=True)),
+                ('cards', models.BinaryField()),
+                ('fetched_at', models.DateTimeField()),
+                ('changed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlayerDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField()),
+                ('trophies', models.PositiveIntegerField(default=0)),
+                ('cards', models.BinaryField(blank=True)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deltas', to='app.storedplayer')),
+            ],
+            options={
+                'ordering': ['changed_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_player_store'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='elixir',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
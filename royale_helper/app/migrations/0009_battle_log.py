@@ -0,0 +1,34 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_card_elixir'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BattleDeckStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.CharField(max_length=128, unique=True)),
+                ('battles', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('losses', models.PositiveIntegerField(default=0)),
+                ('crowns', models.PositiveIntegerField(default=0)),
+                ('last_battle_at', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IngestedBattle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('battle_at', models.PositiveIntegerField(db_index=True)),
+            ],
+        ),
+    ]
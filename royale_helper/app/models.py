@@ -1,3 +1,6 @@
+import re
+from typing import Iterable
+
 from django.db import models
 
 
@@ -6,6 +9,12 @@ class Card(models.Model):
         unique=True,
     )
     name = models.CharField(max_length=100)
+    # Слаг карты в URL RoyaleAPI ("mini-pekka", "x-bow"), см. make_slug.
+    slug = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+    )
 
     max_level = models.PositiveSmallIntegerField(
         null=True,
@@ -19,6 +28,11 @@ class Card(models.Model):
         null=True,
         blank=True,
     )
+    # Стоимость в эликсире (elixirCost из API); у Mirror её нет.
+    elixir = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+    )
 
     icon_url = models.URLField(
         blank=True,
@@ -30,12 +44,28 @@ class Card(models.Model):
     def __str__(self) -> str:  # pragma: no cover - простое представление
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = self.make_slug(self.name)
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def make_slug(name: str) -> str:
+        slug = name.casefold().replace(".", "").replace("'", "")
+        return re.sub(r"[^a-z0-9]+", "-", slug).strip("-")
+
 
 class Deck(models.Model):
     mode = models.CharField(
         max_length=50,
         blank=True,
     )
+    # Канонический состав колоды: отсортированные api_id карт через запятую.
+    signature = models.CharField(
+        max_length=128,
+        blank=True,
+        db_index=True,
+    )
 
     avg_elixir = models.FloatField(null=True, blank=True)
     win_rate = models.FloatField(
@@ -62,6 +92,10 @@ class Deck(models.Model):
     def __str__(self) -> str:
         return f"Колода #{self.pk or '—'}"
 
+    @staticmethod
+    def make_signature(api_ids: Iterable[int]) -> str:
+        return ",".join(str(api_id) for api_id in sorted(int(i) for i in api_ids))
+
 
 class DeckCard(models.Model):
     deck = models.ForeignKey(
@@ -86,3 +120,215 @@ class DeckCard(models.Model):
     def __str__(self) -> str:
         return f"{self.deck_id}: {self.card} ({self.position})"
 
+
+class CatalogChange(models.Model):
+    """
+    Журнал изменений каталога колод.
+
+    Импортёры пишут сюда id изменённых колод, а процессы приложения
+    применяют к своему каталогу в памяти только новые записи.
+    Номер последней записи служит версией каталога.
+    """
+
+    UPSERT = "upsert"
+    DELETE = "delete"
+    CARDS = "cards"
+    RESET = "reset"
+
+    ACTION_CHOICES = [
+        (UPSERT, "Колода добавлена или изменена"),
+        (DELETE, "Колода удалена"),
+        (CARDS, "Изменён справочник карт"),
+        (RESET, "Полная перезагрузка каталога"),
+    ]
+
+    deck_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+    )
+    action = models.CharField(
+        max_length=10,
+        choices=ACTION_CHOICES,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self) -> str:
+        return f"{self.pk}: {self.action} {self.deck_id or ''}".rstrip()
+
+
+class DeckStatSnapshot(models.Model):
+    """
+    Снимок статистики колоды на момент импорта.
+
+    Колонки компактные: время — unix-секунды, доли — в сотых (51.23 % →
+    5123), чтобы SQLite хранил их короткими целыми. Старые снимки
+    удаляются по возрасту (см. services.deck_history.prune_snapshots).
+    """
+
+    deck = models.ForeignKey(
+        Deck,
+        on_delete=models.CASCADE,
+        related_name="snapshots",
+        db_index=False,
+    )
+    source = models.CharField(
+        max_length=20,
+        blank=True,
+    )
+    taken_at = models.PositiveIntegerField()
+    win_rate_x100 = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+    )
+    usage = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+    )
+    avg_crowns_x100 = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        ordering = ["taken_at"]
+        indexes = [
+            models.Index(fields=["deck", "taken_at"]),
+            models.Index(fields=["taken_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.deck_id} @ {self.taken_at}"
+
+
+class DeckTrend(models.Model):
+    """
+    Скользящий агрегат снимков колоды за последние ``window_days`` дней.
+    Пересчитывается при импорте, поэтому читать историю для рекомендаций
+    не нужно.
+    """
+
+    deck = models.OneToOneField(
+        Deck,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trend",
+    )
+    window_days = models.PositiveSmallIntegerField()
+    samples = models.PositiveIntegerField()
+    win_rate = models.FloatField(
+        null=True,
+        blank=True,
+    )
+    # Наклон win rate по МНК, процентных пунктов в день.
+    win_rate_change = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+    usage = models.FloatField(
+        null=True,
+        blank=True,
+    )
+    avg_crowns = models.FloatField(
+        null=True,
+        blank=True,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.deck_id}: {self.win_rate_change}"
+
+
+class StoredPlayer(models.Model):
+    """
+    Последний известный профиль игрока. Уровни карт упакованы в ``cards``
+    (см. services.player_store.pack_cards); используется как тёплый
+    запасной вариант, когда Clash Royale API медленный или недоступен.
+    """
+
+    tag = models.CharField(
+        max_length=20,
+        unique=True,
+    )
+    name = models.CharField(
+        max_length=100,
+        blank=True,
+    )
+    exp_level = models.PositiveSmallIntegerField(default=0)
+    trophies = models.PositiveIntegerField(default=0)
+    best_trophies = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+    )
+    cards = models.BinaryField()
+
+    fetched_at = models.DateTimeField()
+    changed_at = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"{self.tag} {self.name}".strip()
+
+
+class PlayerDelta(models.Model):
+    """
+    Изменения профиля между загрузками: только карты, у которых что-то
+    поменялось (в том же упакованном виде), и трофеи.
+    """
+
+    player = models.ForeignKey(
+        StoredPlayer,
+        on_delete=models.CASCADE,
+        related_name="deltas",
+    )
+    changed_at = models.DateTimeField()
+    trophies = models.PositiveIntegerField(default=0)
+    cards = models.BinaryField(blank=True)
+
+    class Meta:
+        ordering = ["changed_at"]
+
+    def __str__(self) -> str:
+        return f"{self.player_id} @ {self.changed_at}"
+
+
+class BattleDeckStats(models.Model):
+    """
+    Счётчики боёв колоды по журналам боёв игроков (services.battle_log).
+    Колода — по каноническому составу, как Deck.signature; счётчики только
+    растут, каждый бой учитывается один раз (см. IngestedBattle).
+    """
+
+    signature = models.CharField(
+        max_length=128,
+        unique=True,
+    )
+    battles = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    crowns = models.PositiveIntegerField(default=0)
+    # Unix-время самого позднего учтённого боя.
+    last_battle_at = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.signature}: {self.wins}/{self.battles}"
+
+
+class IngestedBattle(models.Model):
+    """
+    Ключи уже учтённых боёв: время боя и теги обоих игроков. Один бой
+    приходит в журналах обоих участников, ключ не даёт посчитать его дважды.
+    Ключи старше BATTLE_LOG_RETENTION_DAYS удаляются, такие бои и не читаются.
+    """
+
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+    )
+    battle_at = models.PositiveIntegerField(db_index=True)
+
+    def __str__(self) -> str:
+        return self.key
@@ -1,4 +1,62 @@
-from .clash_royale import ClashRoyaleAPI, PlayerCard, PlayerProfile, ClashRoyaleAPIError, PlayerNotFoundError
-from .deck_recommendation import DeckRecommender, RecommendedDeck, RecommendedDeckCard
+"""
+Сервисный слой. Имена пакета загружаются при первом обращении (PEP 562),
+так что ``import app.services.deck_catalog`` не тянет клиент API, хранилище
+профилей и остальные модули. Общие экземпляры ``player_store`` и
+``recommendation_cache`` импортируются из одноимённых модулей: после
+импорта модуля атрибут пакета с этим именем указывает на модуль.
+"""
 
+from importlib import import_module
+from typing import TYPE_CHECKING
 
+_EXPORTS = {
+    "ClanMember": "clash_royale",
+    "ClanNotFoundError": "clash_royale",
+    "ClashRoyaleAPI": "clash_royale",
+    "ClashRoyaleAPIError": "clash_royale",
+    "PlayerCard": "clash_royale",
+    "PlayerNotFoundError": "clash_royale",
+    "PlayerProfile": "clash_royale",
+    "CardInfo": "deck_catalog",
+    "DeckCatalog": "deck_catalog",
+    "DeckInfo": "deck_catalog",
+    "DeckRecommender": "deck_recommendation",
+    "RecommendedDeck": "deck_recommendation",
+    "RecommendedDeckCard": "deck_recommendation",
+    "UpgradeSuggestion": "deck_recommendation",
+    "CacheStats": "recommendation_cache",
+    "RecommendationCache": "recommendation_cache",
+    "PlayerStore": "player_store",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+if TYPE_CHECKING:
+    from .clash_royale import (
+        ClanMember,
+        ClanNotFoundError,
+        ClashRoyaleAPI,
+        ClashRoyaleAPIError,
+        PlayerCard,
+        PlayerNotFoundError,
+        PlayerProfile,
+    )
+    from .deck_catalog import CardInfo, DeckCatalog, DeckInfo
+    from .deck_recommendation import (
+        DeckRecommender,
+        RecommendedDeck,
+        RecommendedDeckCard,
+        UpgradeSuggestion,
+    )
+    from .recommendation_cache import CacheStats, RecommendationCache
+    from .player_store import PlayerStore
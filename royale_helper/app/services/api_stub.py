@@ -0,0 +1,280 @@
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+from urllib.parse import unquote, urlsplit
+
+from app.models import Card
+from .clash_royale import ClashRoyaleAPI
+from .player_store import iter_profile_dumps
+
+
+# Алфавит тегов Clash Royale (см. ClashRoyaleAPI.normalize_tag).
+TAG_ALPHABET = "0289PYLQGRJCU"
+
+# Максимальный размер клана в игре; синтетические кланы всегда полные.
+CLAN_SIZE = 50
+ROLES = ("leader", "coLeader", "elder", "member")
+
+# Журнал боёв: столько последних боёв, колоды — из общего пула, чтобы
+# статистика колод набиралась так же, как на реальных данных.
+BATTLE_LOG_SIZE = 25
+STUB_DECKS = 40
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    seed: int = 0
+
+
+def synthetic_tag(number: int) -> str:
+    """Детерминированный корректный тег по номеру: 0 → #P0000000, 1 → #P0000002."""
+    chars = []
+    for _ in range(7):
+        number, digit = divmod(number, len(TAG_ALPHABET))
+        chars.append(TAG_ALPHABET[digit])
+    return "#P" + "".join(reversed(chars))
+
+
+def load_recorded_profiles(directory: str | Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Профили из сохранённых ответов API (``player_profiles/*.json``: либо
+    сам ответ, либо ``{"raw": ответ, "meta": ...}``) по нормализованному тегу.
+    """
+    return {
+        ClashRoyaleAPI.normalize_tag(data["tag"]): data
+        for data in iter_profile_dumps(directory)
+    }
+
+
+class StubData:
+    """
+    Данные заглушки: записанные профили отдаются как есть, для остальных
+    тегов профиль генерируется детерминированно из тега по пулу карт.
+    """
+
+    def __init__(
+        self,
+        recorded: Dict[str, Dict[str, Any]],
+        cards: Iterable[Dict[str, Any]] = (),
+    ) -> None:
+        self.recorded = recorded
+        pool: Dict[int, Dict[str, Any]] = {}
+        for card in cards:
+            pool[card["id"]] = card
+        for profile in recorded.values():
+            for card in profile.get("cards") or []:
+                pool.setdefault(
+                    card["id"],
+                    {key: card[key] for key in ("name", "id", "maxLevel", "iconUrls") if key in card},
+                )
+        self.cards: List[Dict[str, Any]] = [pool[api_id] for api_id in sorted(pool)]
+        if not self.cards:
+            raise ValueError("Для заглушки API нужен хотя бы один профиль или список карт.")
+        rng = random.Random(0)
+        size = min(8, len(self.cards))
+        self.decks = [rng.sample(self.cards, size) for _ in range(STUB_DECKS)]
+
+    def player(self, tag: str) -> Dict[str, Any]:
+        recorded = self.recorded.get(tag)
+        if recorded is not None:
+            return recorded
+
+        rng = random.Random(tag)
+        owned = rng.sample(self.cards, rng.randint(len(self.cards) // 2, len(self.cards)))
+        cards = []
+        for card in owned:
+            max_level = card.get("maxLevel") or 14
+            cards.append(
+                {
+                    **card,
+                    "level": rng.randint(max(1, max_level - 6), max_level),
+                    "maxLevel": max_level,
+                }
+            )
+        trophies = rng.randint(4000, 9000)
+        return {
+            "tag": tag,
+            "name": f"Stub {tag[1:]}",
+            "expLevel": rng.randint(20, 60),
+            "trophies": trophies,
+            "bestTrophies": trophies + rng.randint(0, 500),
+            "cards": cards,
+        }
+
+    def clan_members(self, tag: str) -> Dict[str, Any]:
+        """Детерминированный состав клана из синтетических игроков."""
+        rng = random.Random(tag)
+        numbers = rng.sample(range(len(TAG_ALPHABET) ** 7), CLAN_SIZE)
+        items = []
+        for position, number in enumerate(numbers):
+            member_tag = synthetic_tag(number)
+            profile = self.player(member_tag)
+            items.append(
+                {
+                    "tag": member_tag,
+                    "name": profile["name"],
+                    "role": ROLES[min(position, len(ROLES) - 1)],
+                    "expLevel": profile["expLevel"],
+                    "trophies": profile["trophies"],
+                }
+            )
+        return {"items": items, "paging": {"cursors": {}}}
+
+    def battle_log(self, tag: str) -> List[Dict[str, Any]]:
+        """
+        Детерминированный журнал боёв. Время отсчитывается от начала текущего
+        часа, так что повторный запрос в течение часа отдаёт те же бои.
+        """
+        rng = random.Random(f"{tag}:battlelog")
+        battle_time = int(time.time()) // 3600 * 3600
+        battles = []
+        for _ in range(BATTLE_LOG_SIZE):
+            battle_time -= rng.randint(120, 900)
+            opponent = synthetic_tag(rng.randrange(len(TAG_ALPHABET) ** 7))
+            team_deck, opponent_deck = rng.randrange(STUB_DECKS), rng.randrange(STUB_DECKS)
+            # Колоды с меньшим номером выигрывают чаще.
+            team_wins = rng.random() < 0.5 + (opponent_deck - team_deck) / (4 * STUB_DECKS)
+            winner, loser = rng.randint(1, 3), 0
+            battles.append(
+                {
+                    "type": "PvP",
+                    "battleTime": time.strftime("%Y%m%dT%H%M%S.000Z", time.gmtime(battle_time)),
+                    "gameMode": {"id": 72000006, "name": "Ladder"},
+                    "team": [self._battle_side(tag, team_deck, winner if team_wins else loser)],
+                    "opponent": [self._battle_side(opponent, opponent_deck, loser if team_wins else winner)],
+                }
+            )
+        return battles
+
+    def _battle_side(self, tag: str, deck: int, crowns: int) -> Dict[str, Any]:
+        return {
+            "tag": tag,
+            "crowns": crowns,
+            "cards": [{"id": card["id"], "name": card.get("name", "")} for card in self.decks[deck]],
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Обработчик ``/players/{tag}``, ``/players/{tag}/battlelog``,
+    ``/clans/{tag}/members`` и ``/cards`` (с префиксом ``/v1`` или без).
+    """
+
+    data: StubData
+    config: StubConfig
+    rng: random.Random
+    rng_lock: threading.Lock
+
+    def do_GET(self) -> None:  # noqa: N802 - имя задаёт BaseHTTPRequestHandler
+        with self.rng_lock:
+            delay = self.config.latency + self.rng.uniform(0, self.config.jitter)
+            failed = self.rng.random() < self.config.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            self._send(self.config.error_status, {"reason": "injectedError"})
+            return
+
+        path = urlsplit(self.path).path
+        if path.startswith("/v1/"):
+            path = path[3:]
+        if path == "/cards":
+            self._send(200, {"items": self.data.cards})
+        elif path.startswith("/players/") and path.endswith("/battlelog"):
+            try:
+                tag = ClashRoyaleAPI.normalize_tag(unquote(path[len("/players/"):-len("/battlelog")]))
+            except ValueError:
+                self._send(400, {"reason": "badRequest"})
+                return
+            self._send(200, self.data.battle_log(tag))
+        elif path.startswith("/players/"):
+            try:
+                tag = ClashRoyaleAPI.normalize_tag(unquote(path[len("/players/"):]))
+            except ValueError:
+                self._send(400, {"reason": "badRequest"})
+                return
+            self._send(200, self.data.player(tag))
+        elif path.startswith("/clans/") and path.endswith("/members"):
+            try:
+                tag = ClashRoyaleAPI.normalize_tag(unquote(path[len("/clans/"):-len("/members")]))
+            except ValueError:
+                self._send(400, {"reason": "badRequest"})
+                return
+            self._send(200, self.data.clan_members(tag))
+        else:
+            self._send(404, {"reason": "notFound"})
+
+    def _send(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        return
+
+
+def make_stub_server(
+    data: StubData,
+    config: StubConfig,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> ThreadingHTTPServer:
+    """HTTP-сервер заглушки; ``port=0`` — свободный порт (server.server_port)."""
+    handler = type(
+        "BoundStubHandler",
+        (StubHandler,),
+        {
+            "data": data,
+            "config": config,
+            "rng": random.Random(config.seed),
+            "rng_lock": threading.Lock(),
+        },
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_stub_server(
+    data: StubData,
+    config: StubConfig,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> ThreadingHTTPServer:
+    """Запускает заглушку в фоновом потоке; остановка — ``server.shutdown()``."""
+    server = make_stub_server(data, config, host, port)
+    threading.Thread(target=server.serve_forever, name="api-stub", daemon=True).start()
+    return server
+
+
+def stub_base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+def default_stub_data(profiles_dir: str | Path) -> StubData:
+    """Записанные профили из ``profiles_dir`` плюс карты из таблицы Card."""
+    cards = [
+        {
+            "id": api_id,
+            "name": name,
+            "maxLevel": max_level,
+            "iconUrls": {"medium": icon_url},
+        }
+        for api_id, name, max_level, icon_url in Card.objects.values_list(
+            "api_id", "name", "max_level", "icon_url"
+        )
+    ]
+    return StubData(load_recorded_profiles(profiles_dir), cards)
@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List
+
+import django
+from django.db import connections
+
+from app.models import StoredPlayer
+from .clash_royale import ClashRoyaleAPI, PlayerProfile
+from .deck_catalog import DeckCatalog, get_catalog
+from .deck_recommendation import DeckRecommender
+from .player_store import iter_profile_dumps, load_profiles
+
+
+CHUNK_SIZE = 200
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    """Игрок для пакетного подбора: тег из хранилища или готовый ответ API."""
+
+    tag: str
+    raw: Dict[str, Any] | None = None
+
+
+def tag_items(raw_tags: Iterable[str]) -> Iterator[BatchItem]:
+    for raw_tag in raw_tags:
+        raw_tag = raw_tag.strip()
+        if raw_tag:
+            yield BatchItem(tag=raw_tag)
+
+
+def stored_items(chunk_size: int = 2000) -> Iterator[BatchItem]:
+    """Все сохранённые игроки (PlayerStore) курсором, без загрузки в память."""
+    tags = StoredPlayer.objects.order_by("id").values_list("tag", flat=True)
+    for tag in tags.iterator(chunk_size=chunk_size):
+        yield BatchItem(tag=tag)
+
+
+def dump_items(directory: str) -> Iterator[BatchItem]:
+    for data in iter_profile_dumps(directory):
+        yield BatchItem(tag=data["tag"], raw=data)
+
+
+# Каталог процесса-воркера: загружается на первой пачке и дальше не меняется.
+_worker_catalog: DeckCatalog | None = None
+
+
+def _batch_catalog() -> DeckCatalog:
+    global _worker_catalog
+    if multiprocessing.parent_process() is None:
+        return get_catalog()
+    if _worker_catalog is None:
+        # Соединения с БД, унаследованные от родителя при fork, не используем.
+        connections.close_all()
+        _worker_catalog = get_catalog()
+    return _worker_catalog
+
+
+def recommend_chunk(
+    items: List[BatchItem],
+    limit: int = 3,
+    diversity: float = 0.0,
+) -> List[Dict[str, Any]]:
+    """Рекомендации для пачки игроков; сохранённые профили читаются одним запросом."""
+    catalog = _batch_catalog()
+    names = {api_id: info.name for api_id, info in catalog.cards.items()}
+    stored = load_profiles((item.tag for item in items if item.raw is None), names)
+    recommender = DeckRecommender()
+
+    results: List[Dict[str, Any]] = []
+    for item in items:
+        profile: PlayerProfile | None
+        if item.raw is not None:
+            profile = ClashRoyaleAPI.parse_player(item.raw)
+        else:
+            try:
+                profile = stored.get(ClashRoyaleAPI.normalize_tag(item.tag))
+            except ValueError:
+                results.append({"tag": item.tag, "error": "Некорректный тег игрока."})
+                continue
+        if profile is None:
+            results.append({"tag": item.tag, "error": "Профиль не найден в хранилище."})
+            continue
+
+        recommendations = recommender.recommend(profile, catalog, limit=limit, diversity=diversity)
+        results.append(
+            {
+                "tag": profile.tag,
+                "name": profile.name,
+                "trophies": profile.trophies,
+                "recommendations": [
+                    {
+                        "deck_id": deck.deck.id,
+                        "mode": deck.deck.mode,
+                        "owned_cards": deck.owned_cards_count,
+                        "total_level": deck.total_level,
+                        "win_rate": deck.deck.win_rate,
+                        "avg_elixir": deck.deck.avg_elixir,
+                        "cards": [card.card.api_id for card in deck.cards],
+                    }
+                    for deck in recommendations
+                ],
+            }
+        )
+    return results
+
+
+def _chunks(items: Iterable[BatchItem], size: int) -> Iterator[List[BatchItem]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def run_batch(
+    items: Iterable[BatchItem],
+    limit: int = 3,
+    diversity: float = 0.0,
+    workers: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Рекомендации потоком в порядке ``items``. Игроки режутся на пачки по
+    ``chunk_size``; в пуле процессов одновременно не больше ``2 * workers``
+    пачек, так что память не зависит от числа игроков. Каждый воркер
+    загружает каталог один раз. При ``workers == 1`` всё идёт в текущем
+    процессе.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(items, chunk_size)
+    if workers == 1:
+        for chunk in chunks:
+            yield from recommend_chunk(chunk, limit, diversity)
+        return
+
+    # При spawn/forkserver воркер импортирует app.services заново, а вместе
+    # с ним и модели, поэтому Django поднимается в инициализаторе.
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        pending: Deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(recommend_chunk, chunk, limit, diversity))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,231 @@
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.models import BattleDeckStats, Deck, IngestedBattle
+from .catalog_sync import DeckRecord, DeckSink
+from .clash_royale import Battle, ClashRoyaleAPI, ClashRoyaleAPIError
+from .deck_generator import DECK_SIZE, load_elixir_costs
+from .deck_history import DAY
+
+
+# Режим колод каталога, статистика которых посчитана по журналам боёв.
+BATTLELOG_MODE = "battlelog"
+
+BATCH_SIZE = 500
+
+# Колода попадает в каталог, когда по ней набралось столько боёв: при
+# меньшем числе win rate — в основном шум.
+MIN_BATTLES = 20
+
+# Одновременных запросов журналов; темп задаёт пул токенов API.
+FETCH_WORKERS = 8
+
+
+@dataclass
+class IngestResult:
+    battles: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    # По пачкам: колода, встреченная в нескольких пачках, считается в каждой.
+    decks: int = 0
+    published: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"учтено боёв {self.battles}, повторов {self.duplicates}, "
+            f"пропущено {self.skipped}; обновлений счётчиков колод {self.decks}, "
+            f"записей в каталог {self.published}"
+        )
+
+
+def battle_key(battle: Battle) -> str:
+    """Ключ боя: время и теги обоих игроков, независимо от того, чей это журнал."""
+    tags = sorted(side.tag for side in battle.team + battle.opponent)
+    return f"{int(battle.battle_time.timestamp())}:{'|'.join(tags)}"
+
+
+def _deck_results(battle: Battle) -> List[Tuple[str, int, int]]:
+    """``(сигнатура, исход, короны)`` обеих сторон дуэли; исход 1/0/-1."""
+    if len(battle.team) != 1 or len(battle.opponent) != 1:
+        return []
+    team, opponent = battle.team[0], battle.opponent[0]
+    if len(team.card_ids) != DECK_SIZE or len(opponent.card_ids) != DECK_SIZE:
+        return []
+    outcome = (team.crowns > opponent.crowns) - (team.crowns < opponent.crowns)
+    return [
+        (Deck.make_signature(team.card_ids), outcome, team.crowns),
+        (Deck.make_signature(opponent.card_ids), -outcome, opponent.crowns),
+    ]
+
+
+class BattleAggregator:
+    """
+    Потоковый агрегатор боёв. Бои копятся в буфер и сбрасываются пачками
+    по ``batch_size``: одним запросом отсеиваются уже учтённые ключи, затем
+    в одной транзакции записываются новые ключи, счётчики BattleDeckStats
+    прибавляются, а колоды, набравшие ``min_battles`` боёв, с пересчитанной
+    статистикой пишутся в каталог (режим BATTLELOG_MODE) через один
+    DeckSink на агрегатор. Повторы внутри пачки отсекаются в памяти, между
+    пачками — по ключам IngestedBattle, так что память не растёт с числом
+    боёв. Бои старше BATTLE_LOG_RETENTION_DAYS пропускаются.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = BATCH_SIZE,
+        min_battles: int = MIN_BATTLES,
+        now: int | None = None,
+    ) -> None:
+        self.batch_size = batch_size
+        self.min_battles = min_battles
+        now = int(time.time()) if now is None else now
+        self.since = now - settings.BATTLE_LOG_RETENTION_DAYS * DAY
+        self.result = IngestResult()
+        self._elixir = load_elixir_costs()
+        self._sink = DeckSink(BATTLELOG_MODE, batch_size, source=BATTLELOG_MODE)
+        self._pending: Dict[str, Battle] = {}
+        self._seen: set[str] = set()
+
+    def add(self, battles: Iterable[Battle]) -> None:
+        for battle in battles:
+            if int(battle.battle_time.timestamp()) < self.since or not _deck_results(battle):
+                self.result.skipped += 1
+                continue
+            key = battle_key(battle)
+            if key in self._seen:
+                self.result.duplicates += 1
+                continue
+            self._seen.add(key)
+            self._pending[key] = battle
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> IngestResult:
+        if not self._pending:
+            return self.result
+        pending, self._pending = self._pending, {}
+        self._seen.clear()
+        known = set(
+            IngestedBattle.objects.filter(key__in=list(pending)).values_list("key", flat=True)
+        )
+        self.result.duplicates += len(known)
+
+        counters: Dict[str, List[int]] = defaultdict(lambda: [0, 0, 0, 0, 0])
+        keys: List[IngestedBattle] = []
+        for key, battle in pending.items():
+            if key in known:
+                continue
+            battle_at = int(battle.battle_time.timestamp())
+            keys.append(IngestedBattle(key=key, battle_at=battle_at))
+            for signature, outcome, crowns in _deck_results(battle):
+                counter = counters[signature]
+                counter[0] += 1
+                counter[1] += outcome > 0
+                counter[2] += outcome < 0
+                counter[3] += crowns
+                counter[4] = max(counter[4], battle_at)
+        if not keys:
+            return self.result
+
+        with transaction.atomic():
+            IngestedBattle.objects.bulk_create(keys, batch_size=self.batch_size)
+            stats = self._add_counters(counters)
+            records = [self._record(row) for row in stats if row.battles >= self.min_battles]
+            if records:
+                self._sink.write(records)
+
+        self.result.battles += len(keys)
+        self.result.decks += len(stats)
+        self.result.published += len(records)
+        return self.result
+
+    def _add_counters(self, counters: Dict[str, List[int]]) -> List[BattleDeckStats]:
+        signatures = list(counters)
+        current = {
+            row.signature: row
+            for start in range(0, len(signatures), self.batch_size)
+            for row in BattleDeckStats.objects.filter(
+                signature__in=signatures[start:start + self.batch_size]
+            )
+        }
+        now = timezone.now()
+        rows: List[BattleDeckStats] = []
+        new_rows: List[BattleDeckStats] = []
+        for signature, (battles, wins, losses, crowns, last_at) in counters.items():
+            row = current.get(signature)
+            if row is None:
+                row = BattleDeckStats(signature=signature)
+                new_rows.append(row)
+            row.battles += battles
+            row.wins += wins
+            row.losses += losses
+            row.crowns += crowns
+            row.last_battle_at = max(row.last_battle_at, last_at)
+            row.updated_at = now
+            rows.append(row)
+        BattleDeckStats.objects.bulk_create(new_rows, batch_size=self.batch_size)
+        BattleDeckStats.objects.bulk_update(
+            list(current.values()),
+            ["battles", "wins", "losses", "crowns", "last_battle_at", "updated_at"],
+            batch_size=self.batch_size,
+        )
+        return rows
+
+    def _record(self, row: BattleDeckStats) -> DeckRecord:
+        api_ids = [int(api_id) for api_id in row.signature.split(",")]
+        costs = [self._elixir[api_id] for api_id in api_ids if api_id in self._elixir]
+        return DeckRecord(
+            api_ids=api_ids,
+            avg_elixir=round(sum(costs) / len(costs), 1) if costs else None,
+            win_rate=round(row.wins / row.battles * 100, 2),
+            avg_crowns=round(row.crowns / row.battles, 2),
+            usage=row.battles,
+        )
+
+
+def fetch_battle_logs(
+    api: ClashRoyaleAPI,
+    tags: Iterable[str],
+    workers: int = FETCH_WORKERS,
+) -> Iterator[Tuple[str, List[Battle] | ClashRoyaleAPIError]]:
+    """
+    Журналы боёв игроков в порядке ``tags``, загружаемые в ``workers``
+    потоках; одновременно в работе не больше ``2 * workers`` запросов.
+    """
+
+    def fetch(tag: str) -> List[Battle] | ClashRoyaleAPIError:
+        try:
+            return api.get_battle_log(tag)
+        except ClashRoyaleAPIError as exc:
+            return exc
+        except ValueError as exc:
+            return ClashRoyaleAPIError(str(exc))
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="battlelog") as pool:
+        pending: Deque[Tuple[str, Future]] = deque()
+        for tag in tags:
+            pending.append((tag, pool.submit(fetch, tag)))
+            if len(pending) >= 2 * workers:
+                tag, future = pending.popleft()
+                yield tag, future.result()
+        while pending:
+            tag, future = pending.popleft()
+            yield tag, future.result()
+
+
+def prune_battle_keys(days: int | None = None) -> int:
+    """Удаляет ключи боёв старше срока хранения (BATTLE_LOG_RETENTION_DAYS)."""
+    if days is None:
+        days = settings.BATTLE_LOG_RETENTION_DAYS
+    since = int(time.time()) - days * DAY
+    deleted, _ = IngestedBattle.objects.filter(battle_at__lt=since).delete()
+    return deleted
@@ -0,0 +1,151 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from app.models import Card
+
+
+# Распространённые сокращения и варианты написания → нормализованное
+# название карты (см. CardIndex.name_key).
+ALIASES: Dict[str, str] = {
+    "log": "thelog",
+    "hog": "hogrider",
+    "rg": "royalgiant",
+    "mk": "megaknight",
+    "ewiz": "electrowizard",
+    "ebarbs": "elitebarbarians",
+    "barbbarrel": "barbarianbarrel",
+    "gobbarrel": "goblinbarrel",
+    "gobgang": "goblingang",
+    "skarmy": "skeletonarmy",
+    "bbd": "babydragon",
+    "ed": "electrodragon",
+    "mm": "megaminion",
+    "musk": "musketeer",
+    "3musketeers": "threemusketeers",
+    "3m": "threemusketeers",
+}
+
+# Порог нечёткого сравнения: не больше этого числа правок и не больше
+# четверти длины названия.
+MAX_EDIT_DISTANCE = 2
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> int | None:
+    """Расстояние Левенштейна, если оно не больше ``limit``, иначе None."""
+    if abs(len(a) - len(b)) > limit:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, ch_a in enumerate(a, start=1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j, ch_b in enumerate(b, start=1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ch_a != ch_b),
+            )
+            row_min = min(row_min, current[j])
+        if row_min > limit:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+class CardIndex:
+    """
+    Справочник карт в памяти для сопоставления колод из внешних источников.
+    Строится одним запросом на импорт вместо запроса на каждую карту.
+
+    Названия сравниваются по нормализованному ключу (casefold без пунктуации
+    и пробелов: "P.E.K.K.A" и "PEKKA" совпадают), затем по таблице ALIASES,
+    затем — только если вызывающий код включил ``fuzzy`` — нечётко, с
+    ограниченным расстоянием правки: опечатка в неизвестном названии может
+    совпасть с другой картой, поэтому по умолчанию нечёткий поиск выключен.
+    Нераспознанные названия копятся в ``unresolved``.
+    """
+
+    # Эволюции в слагах RoyaleAPI: "royal-recruits-ev1" — та же карта.
+    EVOLUTION_SUFFIX = re.compile(r"-ev\d+$")
+
+    def __init__(
+        self,
+        cards: Iterable[Tuple[int, str, str]],
+        fuzzy: bool = False,
+    ) -> None:
+        self.fuzzy = fuzzy
+        self.unresolved: Counter[str] = Counter()
+        self._api_ids: set[int] = set()
+        self._by_name: Dict[str, int] = {}
+        self._by_slug: Dict[str, int] = {}
+        self._resolved_names: Dict[str, int | None] = {}
+        for api_id, name, slug in cards:
+            self._api_ids.add(api_id)
+            self._by_name[self.name_key(name)] = api_id
+            self._by_slug[slug or Card.make_slug(name)] = api_id
+
+    @classmethod
+    def from_db(cls, fuzzy: bool = False) -> "CardIndex":
+        return cls(Card.objects.values_list("api_id", "name", "slug"), fuzzy=fuzzy)
+
+    @staticmethod
+    def name_key(name: str) -> str:
+        return re.sub(r"[\W_]+", "", name.casefold())
+
+    def by_id(self, raw_id: int | str) -> int | None:
+        try:
+            api_id = int(raw_id)
+        except (TypeError, ValueError):
+            return None
+        return api_id if api_id in self._api_ids else None
+
+    def by_name(self, name: str) -> int | None:
+        if name not in self._resolved_names:
+            self._resolved_names[name] = self._lookup_name(self.name_key(name))
+        return self._resolved_names[name]
+
+    def _lookup_name(self, key: str) -> int | None:
+        api_id = self._by_name.get(key)
+        if api_id is None and key in ALIASES:
+            api_id = self._by_name.get(ALIASES[key])
+        if api_id is None and self.fuzzy and key:
+            api_id = self._closest(key)
+        return api_id
+
+    def _closest(self, key: str) -> int | None:
+        limit = min(MAX_EDIT_DISTANCE, len(key) // 4)
+        if limit == 0:
+            return None
+        best: int | None = None
+        best_distance = limit + 1
+        ambiguous = False
+        for candidate, api_id in self._by_name.items():
+            distance = bounded_edit_distance(key, candidate, limit)
+            if distance is None or distance > best_distance:
+                continue
+            if distance == best_distance:
+                ambiguous = True
+                continue
+            best, best_distance, ambiguous = api_id, distance, False
+        return None if ambiguous else best
+
+    def by_slug(self, slug: str) -> int | None:
+        return self._by_slug.get(self.EVOLUTION_SUFFIX.sub("", slug.strip().lower()))
+
+    def resolve_ids(self, raw_ids: Sequence[int | str]) -> List[int] | None:
+        return self._resolve(raw_ids, self.by_id)
+
+    def resolve_names(self, names: Sequence[str]) -> List[int] | None:
+        return self._resolve(names, self.by_name)
+
+    def resolve_slugs(self, slugs: Sequence[str]) -> List[int] | None:
+        return self._resolve(slugs, self.by_slug)
+
+    def _resolve(self, values: Sequence, lookup) -> List[int] | None:
+        api_ids = [lookup(value) for value in values]
+        if None not in api_ids:
+            return api_ids
+        self.unresolved.update(
+            str(value) for value, api_id in zip(values, api_ids) if api_id is None
+        )
+        return None
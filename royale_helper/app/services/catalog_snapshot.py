@@ -0,0 +1,203 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from hashlib import blake2b
+from pathlib import Path
+from typing import Dict, List
+
+from django.db import connection
+from django.db.migrations.recorder import MigrationRecorder
+
+from .deck_catalog import CardInfo, DeckCatalog
+
+
+MAGIC = b"CRDECKS2"
+
+# magic, database, sequence, decks, card_ids, cards, json_len
+HEADER = struct.Struct("<8s16sqqqqq")
+
+ALIGNMENT = 8
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _padding(size: int) -> bytes:
+    return b"\0" * (-size % ALIGNMENT)
+
+
+def database_fingerprint() -> bytes:
+    """
+    Отпечаток базы, из которой выгружается снимок: хеш времени первой
+    применённой миграции. У каждой базы, созданной через migrate, он свой,
+    поэтому снимок чужой базы с совпавшим номером журнала не подхватится.
+    """
+    applied = (
+        MigrationRecorder(connection)
+        .migration_qs.order_by("id")
+        .values_list("applied", flat=True)
+        .first()
+    )
+    identity = applied.isoformat() if applied else ""
+    return blake2b(identity.encode("utf-8"), digest_size=16).digest()
+
+
+def write_snapshot(catalog: DeckCatalog, path: str | Path) -> int:
+    """
+    Сохраняет данные каталога, нужные для скоринга, в компактный бинарный
+    файл. Запись атомарная: рядом пишется временный файл и подменяется
+    через os.replace, поэтому уже открытые mmap читателей не ломаются.
+
+    Формат: заголовок HEADER (с отпечатком базы и номером журнала
+    CatalogChange), затем выровненные по 8 байт секции
+    deck_ids(q) offsets(q) card_ids(i) avg_elixir(d) win_rate(d)
+    avg_crowns(d) mode_codes(i) card_api_ids(q) card_max_levels(i)
+    и JSON с названиями режимов и карт.
+    """
+    live = catalog.compact() if catalog.dead_count else catalog
+
+    mode_names: List[str] = []
+    mode_codes: Dict[str, int] = {}
+    codes = array("i")
+    for mode in live.modes:
+        if mode not in mode_codes:
+            mode_codes[mode] = len(mode_names)
+            mode_names.append(mode)
+        codes.append(mode_codes[mode])
+
+    card_api_ids = array("q", live.cards)
+    card_max_levels = array(
+        "i", (live.cards[api_id].max_level or 0 for api_id in card_api_ids)
+    )
+    meta = json.dumps(
+        {
+            "modes": mode_names,
+            "cards": [
+                [live.cards[api_id].name, live.cards[api_id].icon_url]
+                for api_id in card_api_ids
+            ],
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    sections = [
+        array("q", live.deck_ids),
+        array("q", live.offsets),
+        array("i", live.card_ids),
+        array("d", live.avg_elixir),
+        array("d", live.win_rate),
+        array("d", live.avg_crowns),
+        codes,
+        card_api_ids,
+        card_max_levels,
+    ]
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as fh:
+        fh.write(
+            HEADER.pack(
+                MAGIC,
+                database_fingerprint(),
+                live.sequence,
+                len(live),
+                len(live.card_ids),
+                len(card_api_ids),
+                len(meta),
+            )
+        )
+        for section in sections:
+            data = section.tobytes()
+            fh.write(data)
+            fh.write(_padding(len(data)))
+        fh.write(meta)
+        size = fh.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+def load_snapshot(path: str | Path, database: bytes | None = None) -> DeckCatalog:
+    """
+    Открывает снимок через mmap только для чтения. Массивы каталога — это
+    memoryview поверх страниц файла, поэтому все воркеры делят одну копию
+    в page cache, а загрузка не делает запросов к БД. Если передан
+    ``database`` (database_fingerprint()), снимок другой базы отвергается.
+    """
+    with open(path, "rb") as fh:
+        buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(buffer)
+    if len(view) < HEADER.size:
+        raise SnapshotError(f"Файл снимка {path} повреждён.")
+    magic, source, sequence, decks, card_ids, cards, meta_len = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise SnapshotError(f"{path} не является снимком каталога.")
+    if database is not None and source != database:
+        raise SnapshotError(f"Снимок {path} выгружен из другой базы.")
+
+    position = HEADER.size
+
+    def section(fmt: str, count: int) -> memoryview:
+        nonlocal position
+        size = struct.calcsize(fmt) * count
+        data = view[position:position + size].cast(fmt)
+        position += size + len(_padding(size))
+        return data
+
+    deck_ids = section("q", decks)
+    offsets = section("q", decks + 1)
+    card_id_view = section("i", card_ids)
+    avg_elixir = section("d", decks)
+    win_rate = section("d", decks)
+    avg_crowns = section("d", decks)
+    codes = section("i", decks)
+    card_api_ids = section("q", cards)
+    card_max_levels = section("i", cards)
+    meta = json.loads(bytes(view[position:position + meta_len]).decode("utf-8"))
+
+    mode_names = meta["modes"]
+    card_info = {
+        api_id: CardInfo(
+            api_id=api_id,
+            name=name,
+            icon_url=icon_url,
+            max_level=max_level or None,
+        )
+        for api_id, max_level, (name, icon_url) in zip(
+            card_api_ids, card_max_levels, meta["cards"]
+        )
+    }
+
+    return DeckCatalog(
+        deck_ids=deck_ids,
+        offsets=offsets,
+        card_ids=card_id_view,
+        avg_elixir=avg_elixir,
+        win_rate=win_rate,
+        avg_crowns=avg_crowns,
+        modes=_ModeColumn(codes, mode_names),
+        cards=card_info,
+        version=str(sequence),
+        sequence=sequence,
+    )
+
+
+class _ModeColumn:
+    """Режимы колод из снимка: коды в mmap, названия в небольшом списке."""
+
+    def __init__(self, codes: memoryview, names: List[str]) -> None:
+        self._codes = codes
+        self._names = names
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, index: int) -> str:
+        return self._names[self._codes[index]]
+
+    def __iter__(self):
+        names = self._names
+        return (names[code] for code in self._codes)
@@ -0,0 +1,203 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import Card, Deck, DeckCard
+from .deck_catalog import record_catalog_changes
+from .deck_history import record_snapshots, refresh_trends
+
+
+CARD_FIELDS = [
+    "name",
+    "slug",
+    "max_level",
+    "max_evolution_level",
+    "max_star_level",
+    "elixir",
+    "icon_url",
+]
+DECK_STAT_FIELDS = ["avg_elixir", "win_rate", "avg_crowns"]
+
+BATCH_SIZE = 500
+
+
+@dataclass(frozen=True)
+class DeckRecord:
+    api_ids: Sequence[int]
+    avg_elixir: float | None = None
+    win_rate: float | None = None
+    avg_crowns: float | None = None
+    usage: int | None = None
+
+
+@dataclass
+class SyncResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"создано {self.created}, обновлено {self.updated}, "
+            f"без изменений {self.unchanged}, пропущено {self.skipped}"
+        )
+
+
+def sync_cards(cards: Dict[int, Dict[str, Any]]) -> SyncResult:
+    """
+    Приводит таблицу Card к переданному набору ``{api_id: поля}``, записывая
+    только новые и реально изменившиеся карты.
+    """
+    result = SyncResult()
+    existing = {
+        row[0]: row
+        for row in Card.objects.values_list("api_id", "id", *CARD_FIELDS)
+    }
+
+    to_create: List[Card] = []
+    to_update: List[Card] = []
+    for api_id, fields in cards.items():
+        row = existing.get(api_id)
+        if row is None:
+            to_create.append(Card(api_id=api_id, **fields))
+            continue
+        current = dict(zip(CARD_FIELDS, row[2:]))
+        if all(current[name] == fields.get(name) for name in CARD_FIELDS):
+            result.unchanged += 1
+            continue
+        to_update.append(Card(id=row[1], api_id=api_id, **fields))
+
+    if to_create or to_update:
+        with transaction.atomic():
+            Card.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+            Card.objects.bulk_update(to_update, CARD_FIELDS, batch_size=BATCH_SIZE)
+            record_catalog_changes(cards_changed=True)
+
+    result.created = len(to_create)
+    result.updated = len(to_update)
+    return result
+
+
+class DeckSink:
+    """
+    Пакетная запись потока DeckRecord в колоды режима ``mode``.
+
+    Новые колоды добавляются, у известных (сопоставление по Deck.signature)
+    обновляется статистика. Пустые значения статистики из источника не
+    затирают сохранённые. Каждая пачка пишется своей транзакцией вместе с
+    записями журнала каталога, снимками статистики (DeckStatSnapshot) и
+    пересчитанным DeckTrend.
+
+    Экземпляр можно переиспользовать: записанные колоды попадают в его
+    словарь известных, а повтор колоды отсекается только внутри одного
+    вызова ``write``.
+    """
+
+    def __init__(self, mode: str, batch_size: int = BATCH_SIZE, source: str = "") -> None:
+        self.mode = mode
+        self.batch_size = batch_size
+        self.source = source
+        self.result = SyncResult()
+        self._card_pks = dict(Card.objects.values_list("api_id", "id"))
+        self._existing = {
+            row[0]: row
+            for row in Deck.objects.filter(mode=mode).values_list(
+                "signature", "id", *DECK_STAT_FIELDS
+            )
+        }
+        self._seen: set[str] = set()
+
+    def write(self, records: Iterable[DeckRecord]) -> SyncResult:
+        self._seen.clear()
+        batch: List[DeckRecord] = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        return self.result
+
+    def _flush(self, batch: List[DeckRecord]) -> None:
+        new_decks: List[Deck] = []
+        new_card_pks: List[List[int]] = []
+        new_records: List[DeckRecord] = []
+        changed: Dict[int, Deck] = {}
+        known: Dict[str, tuple] = {}
+        observed: List[Tuple[int, DeckRecord]] = []
+        now = timezone.now()
+
+        for record in batch:
+            try:
+                card_pks = [self._card_pks[int(api_id)] for api_id in record.api_ids]
+            except (KeyError, ValueError):
+                self.result.skipped += 1
+                continue
+
+            signature = Deck.make_signature(record.api_ids)
+            if signature in self._seen:
+                self.result.unchanged += 1
+                continue
+            self._seen.add(signature)
+
+            stats = {name: getattr(record, name) for name in DECK_STAT_FIELDS}
+            row = self._existing.get(signature)
+            if row is None:
+                new_decks.append(Deck(mode=self.mode, signature=signature, **stats))
+                new_card_pks.append(card_pks)
+                new_records.append(record)
+                continue
+
+            observed.append((row[1], record))
+            current = dict(zip(DECK_STAT_FIELDS, row[2:]))
+            merged = {
+                name: current[name] if value is None else value
+                for name, value in stats.items()
+            }
+            if merged == current:
+                self.result.unchanged += 1
+                continue
+            changed[row[1]] = Deck(id=row[1], updated_at=now, **merged)
+            known[signature] = (signature, row[1], *merged.values())
+
+        if not new_decks and not changed and not observed:
+            return
+
+        with transaction.atomic():
+            Deck.objects.bulk_create(new_decks, batch_size=self.batch_size)
+            DeckCard.objects.bulk_create(
+                [
+                    DeckCard(deck=deck, card_id=card_pk, position=position)
+                    for deck, card_pks in zip(new_decks, new_card_pks)
+                    for position, card_pk in enumerate(card_pks)
+                ],
+                batch_size=self.batch_size,
+            )
+            Deck.objects.bulk_update(
+                list(changed.values()),
+                DECK_STAT_FIELDS + ["updated_at"],
+                batch_size=self.batch_size,
+            )
+            record_catalog_changes(
+                upserted=[deck.pk for deck in new_decks] + list(changed)
+            )
+            observed.extend((deck.pk, record) for deck, record in zip(new_decks, new_records))
+            refresh_trends(record_snapshots(observed, source=self.source))
+
+        for deck in new_decks:
+            known[deck.signature] = (
+                deck.signature,
+                deck.pk,
+                *(getattr(deck, name) for name in DECK_STAT_FIELDS),
+            )
+        self._existing.update(known)
+        self.result.created += len(new_decks)
+        self.result.updated += len(changed)
+
+
+def sync_decks(records: Iterable[DeckRecord], mode: str, source: str = "") -> SyncResult:
+    return DeckSink(mode, source=source).write(records)
@@ -0,0 +1,193 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .clash_royale import (
+    ClanMember,
+    ClashRoyaleAPI,
+    ClashRoyaleAPIError,
+    PlayerProfile,
+)
+from .deck_catalog import DeckCatalog, get_catalog
+from .deck_history import attach_trends
+from .deck_recommendation import DeckRecommender, RecommendedDeck
+from .player_store import player_store
+from .recommendation_cache import recommendation_cache
+
+if TYPE_CHECKING:
+    import requests
+
+
+# Одновременных запросов профилей; темп всё равно задаёт пул токенов API.
+CLAN_WORKERS = 8
+
+
+@dataclass(frozen=True)
+class ClanMemberReport:
+    member: ClanMember
+    profile: PlayerProfile | None
+    recommendations: List[RecommendedDeck]
+    error: str = ""
+
+
+@dataclass(frozen=True)
+class ClanReport:
+    tag: str
+    members: List[ClanMemberReport]
+    # Версия каталога, по которой считались рекомендации.
+    catalog_version: str
+    created_at: datetime
+    elapsed: float
+    from_cache: bool = False
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for item in self.members if item.error)
+
+
+def _cache_key(tag: str, limit: int, diversity: float | None) -> str:
+    return f"clan-report:{tag}:{limit}:{diversity}"
+
+
+def _session(workers: int) -> "requests.Session":
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    # Пул соединений под число потоков, иначе urllib3 открывает лишние.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch_profiles(
+    api: ClashRoyaleAPI,
+    tags: Sequence[str],
+    workers: int = CLAN_WORKERS,
+) -> Dict[str, PlayerProfile | ClashRoyaleAPIError]:
+    """
+    Профили игроков параллельно в ``workers`` потоках. Ошибка по одному
+    игроку не прерывает остальных: вместо профиля возвращается исключение.
+    """
+
+    def fetch(tag: str) -> PlayerProfile | ClashRoyaleAPIError:
+        try:
+            return api.get_player(tag)
+        except ClashRoyaleAPIError as exc:
+            return exc
+        finally:
+            # Хранилище могло открыть соединение с БД в потоке пула.
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="clan") as pool:
+        return dict(zip(tags, pool.map(fetch, tags)))
+
+
+def score_members(
+    members: Sequence[ClanMember],
+    profiles: Dict[str, PlayerProfile | ClashRoyaleAPIError],
+    catalog: DeckCatalog,
+    limit: int = 3,
+    diversity: float | None = None,
+) -> List[ClanMemberReport]:
+    """Рекомендации для всех участников по одному каталогу, тренды — одним запросом."""
+    recommender = DeckRecommender(cache=recommendation_cache)
+    ranked: List[List[RecommendedDeck]] = []
+    for member in members:
+        profile = profiles.get(member.tag)
+        if isinstance(profile, PlayerProfile):
+            ranked.append(recommender.recommend(profile, catalog, limit=limit, diversity=diversity))
+        else:
+            ranked.append([])
+
+    trends = iter(attach_trends([deck for decks in ranked for deck in decks]))
+    reports: List[ClanMemberReport] = []
+    for member, decks in zip(members, ranked):
+        profile = profiles.get(member.tag)
+        if isinstance(profile, PlayerProfile):
+            reports.append(
+                ClanMemberReport(member, profile, [next(trends) for _ in decks])
+            )
+        else:
+            error = str(profile) if profile is not None else "Профиль не загружен."
+            reports.append(ClanMemberReport(member, None, [], error))
+    return reports
+
+
+def clan_report(
+    raw_tag: str,
+    api: ClashRoyaleAPI | None = None,
+    workers: int = CLAN_WORKERS,
+    limit: int = 3,
+    diversity: float | None = None,
+    refresh: bool = False,
+) -> ClanReport:
+    """
+    Рекомендации для всех участников клана. Отчёт кэшируется (кэш Django,
+    CLAN_REPORT_TTL секунд) и пересчитывается раньше срока, если сменилась
+    версия каталога или ``refresh``. Профили запрашиваются параллельно в
+    пределах бюджета общего пула токенов API (CLASH_ROYALE_API_RATE_LIMIT
+    на токен).
+    """
+    tag = ClashRoyaleAPI.normalize_tag(raw_tag)
+    key = _cache_key(tag, limit, diversity)
+    catalog = get_catalog()
+    if not refresh:
+        cached = cache.get(key)
+        if cached is not None and cached.catalog_version == catalog.version:
+            return replace(cached, from_cache=True)
+
+    started = time.perf_counter()
+    if api is None:
+        api = ClashRoyaleAPI(session=_session(workers), store=player_store)
+    members = api.get_clan_members(tag)
+    profiles = fetch_profiles(api, [member.tag for member in members], workers)
+    report = ClanReport(
+        tag=tag,
+        members=score_members(members, profiles, catalog, limit, diversity),
+        catalog_version=catalog.version,
+        created_at=timezone.now(),
+        elapsed=time.perf_counter() - started,
+    )
+    cache.set(key, report, settings.CLAN_REPORT_TTL)
+    return report
+
+
+def report_payload(report: ClanReport) -> Dict[str, Any]:
+    """Отчёт по клану в виде JSON-совместимого словаря."""
+    return {
+        "tag": report.tag,
+        "created_at": report.created_at.isoformat(),
+        "catalog_version": report.catalog_version,
+        "from_cache": report.from_cache,
+        "members": [
+            {
+                "tag": item.member.tag,
+                "name": item.member.name,
+                "role": item.member.role,
+                "trophies": item.member.trophies,
+                "error": item.error,
+                "recommendations": [
+                    {
+                        "deck_id": deck.deck.id,
+                        "mode": deck.deck.mode,
+                        "owned_cards": deck.owned_cards_count,
+                        "total_level": deck.total_level,
+                        "win_rate": deck.deck.win_rate,
+                        "win_rate_change": deck.win_rate_change,
+                        "cards": [card.card.api_id for card in deck.cards],
+                    }
+                    for deck in item.recommendations
+                ],
+            }
+            for item in report.members
+        ],
+    }
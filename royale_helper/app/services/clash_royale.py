@@ -1,22 +1,33 @@
+import threading
+import time
 from dataclasses import dataclass
-from pathlib import Path
-from typing import List
+from datetime import datetime, timezone as dt_timezone
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Protocol, Sequence, Tuple
 from urllib.parse import quote
 
-import json
-import requests
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
+if TYPE_CHECKING:
+    import requests
+
 
 class ClashRoyaleAPIError(Exception):
     pass
 
 
+class APIUnavailableError(ClashRoyaleAPIError):
+    """API не ответил: таймаут или сетевая ошибка."""
+
+
 class PlayerNotFoundError(ClashRoyaleAPIError):
     pass
 
 
+class ClanNotFoundError(ClashRoyaleAPIError):
+    pass
+
+
 @dataclass(frozen=True)
 class PlayerCard:
     id: int
@@ -35,21 +46,253 @@ class PlayerProfile:
     trophies: int
     best_trophies: int | None
     cards: List[PlayerCard]
+    # Время загрузки, если профиль взят из хранилища, а не из API.
+    cached_at: datetime | None = None
+
+
+@dataclass(frozen=True)
+class ClanMember:
+    tag: str
+    name: str
+    role: str
+    exp_level: int
+    trophies: int
+
+
+@dataclass(frozen=True)
+class BattleSide:
+    tag: str
+    crowns: int
+    card_ids: Tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class Battle:
+    battle_time: datetime
+    type: str
+    game_mode: str
+    team: List[BattleSide]
+    opponent: List[BattleSide]
+
+
+class ProfileStore(Protocol):
+    def submit(self, profile: PlayerProfile) -> None: ...
+
+    def load(self, raw_tag: str) -> PlayerProfile | None: ...
+
+
+class RateLimiter:
+    """
+    Token bucket: в среднем не больше ``rate`` запросов в секунду, подряд —
+    до ``burst``. Общий для потоков; ``acquire`` ждёт свободный токен.
+    ``clock`` и ``sleep`` подменяются в тестах.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate должен быть больше нуля.")
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self) -> float:
+        """Берёт токен и возвращает 0, а если его нет — сколько секунд ждать."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def drain(self) -> None:
+        """Обнуляет запас, например после 429 от API."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+    def acquire(self) -> None:
+        while wait := self.try_acquire():
+            self._sleep(wait)
+
+
+@dataclass
+class TokenStats:
+    # Последние символы токена: сами токены в отчёты не попадают.
+    token: str
+    requests: int = 0
+    in_flight: int = 0
+    throttled: int = 0
+    retired: bool = False
+    available: float = 0.0
+
+
+class _PooledToken:
+    __slots__ = ("value", "budget", "in_flight", "requests", "throttled", "retired")
+
+    def __init__(self, value: str, budget: RateLimiter) -> None:
+        self.value = value
+        self.budget = budget
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.retired = False
+
+
+class TokenPool:
+    """
+    Пул токенов Clash Royale API. Лимиты API действуют на каждый токен
+    отдельно, поэтому у каждого свой бюджет ``rate`` запросов в секунду.
+    Запрос получает наименее загруженный токен (меньше запросов в работе),
+    у которого есть бюджет; если бюджета нет ни у одного, ``acquire`` ждёт
+    ближайший. Ответ 429 обнуляет бюджет токена, 403 выводит токен из пула
+    до перезапуска процесса.
+    """
+
+    def __init__(
+        self,
+        tokens: Sequence[str],
+        rate: float,
+        burst: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        tokens = list(dict.fromkeys(token for token in tokens if token))
+        if not tokens:
+            raise ValueError("Нужен хотя бы один токен.")
+        self._tokens = [
+            _PooledToken(token, RateLimiter(rate, burst, clock=clock, sleep=sleep))
+            for token in tokens
+        ]
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    @property
+    def active(self) -> int:
+        return sum(not token.retired for token in self._tokens)
+
+    def acquire(self) -> str:
+        while True:
+            with self._lock:
+                active = [token for token in self._tokens if not token.retired]
+                if not active:
+                    raise ClashRoyaleAPIError(
+                        "Все токены Clash Royale API отклонены (403). Проверь токены и whitelist IP."
+                    )
+                wait = None
+                for token in sorted(active, key=lambda token: (token.in_flight, -token.budget.available())):
+                    delay = token.budget.try_acquire()
+                    if not delay:
+                        token.in_flight += 1
+                        token.requests += 1
+                        return token.value
+                    wait = delay if wait is None else min(wait, delay)
+            self._sleep(wait)
+
+    def release(self, value: str, status: int | None = None) -> None:
+        """Возвращает токен в пул; ``status`` — код ответа или None при сетевой ошибке."""
+        with self._lock:
+            token = next(token for token in self._tokens if token.value == value)
+            token.in_flight -= 1
+            if status == 429:
+                token.throttled += 1
+                token.budget.drain()
+            elif status == 403:
+                token.retired = True
+
+    def stats(self) -> List[TokenStats]:
+        with self._lock:
+            return [
+                TokenStats(
+                    token=f"…{token.value[-4:]}",
+                    requests=token.requests,
+                    in_flight=token.in_flight,
+                    throttled=token.throttled,
+                    retired=token.retired,
+                    available=round(token.budget.available(), 1),
+                )
+                for token in self._tokens
+            ]
+
+
+def configured_tokens() -> List[str]:
+    """Токены из CLASH_ROYALE_API_TOKENS и CLASH_ROYALE_API_TOKEN без повторов."""
+    tokens = [
+        *getattr(settings, "CLASH_ROYALE_API_TOKENS", []),
+        getattr(settings, "CLASH_ROYALE_API_TOKEN", ""),
+    ]
+    return list(dict.fromkeys(token for token in tokens if token))
+
+
+_pool_lock = threading.Lock()
+_pool: TokenPool | None = None
+_pool_key: Tuple | None = None
+
+
+def get_token_pool() -> TokenPool:
+    """
+    Общий для процесса пул токенов: им пользуются и страницы, и пакетные
+    команды. Пересоздаётся, если изменились токены или лимит в настройках.
+    """
+    global _pool, _pool_key
+    tokens = configured_tokens()
+    if not tokens:
+        raise ImproperlyConfigured(
+            "CLASH_ROYALE_API_TOKEN не настроен. Добавь его в .env."
+        )
+    key = (tuple(tokens), getattr(settings, "CLASH_ROYALE_API_RATE_LIMIT", 20.0))
+    with _pool_lock:
+        if _pool is None or _pool_key != key:
+            _pool, _pool_key = TokenPool(tokens, key[1]), key
+        return _pool
 
 
 class ClashRoyaleAPI:
-    def __init__(self, session: requests.Session | None = None) -> None:
-        self._session = session or requests.Session()
+    def __init__(
+        self,
+        session: "requests.Session | None" = None,
+        store: ProfileStore | None = None,
+        pool: TokenPool | None = None,
+    ) -> None:
+        if session is None:
+            # requests импортируется только там, где клиент действительно
+            # создаётся: модуль нужен многим ради одних dataclass-ов.
+            import requests
+
+            session = requests.Session()
+        self._session = session
+        # Хранилище профилей: получает каждый загруженный профиль и отдаёт
+        # сохранённый, когда API не отвечает.
+        self._store = store
+        self._timeout = getattr(settings, "CLASH_ROYALE_API_TIMEOUT", 10)
         self._base_url = getattr(
             settings,
             "CLASH_ROYALE_API_BASE_URL",
             "https://api.clashroyale.com/v1",
         )
-        self._token = getattr(settings, "CLASH_ROYALE_API_TOKEN", "")
-        if not self._token:
-            raise ImproperlyConfigured(
-                "CLASH_ROYALE_API_TOKEN не настроен. Добавь его в .env."
-            )
+        self._pool = pool or get_token_pool()
 
     @staticmethod
     def normalize_tag(raw_tag: str) -> str:
@@ -63,44 +306,39 @@ class ClashRoyaleAPI:
             raise ValueError("Некорректный тег игрока.")
         return f"#{cleaned}"
 
-    def _headers(self) -> dict[str, str]:
+    @staticmethod
+    def _headers(token: str) -> dict[str, str]:
         return {
-            "Authorization": f"Bearer {self._token}",
+            "Authorization": f"Bearer {token}",
             "Accept": "application/json",
         }
 
-    def _save_player_json(self, data: dict) -> None:
-        try:
-            base_dir = getattr(settings, "BASE_DIR", Path("."))
-            output_dir = Path(base_dir) / "player_profiles"
-            output_dir.mkdir(parents=True, exist_ok=True)
-            tag = (data.get("tag") or "").replace("#", "").replace(" ", "")
-            name = data.get("name") or "unknown"
-            safe_tag = tag or "unknown"
-            filename = f"player_{safe_tag}.json"
-            path = output_dir / filename
-            payload = {
-                "raw": data,
-                "meta": {
-                    "tag": data.get("tag"),
-                    "name": name,
-                },
-            }
-            path.write_text(
-                json.dumps(payload, ensure_ascii=False, indent=2),
-                encoding="utf-8",
-            )
-        except Exception:
-            return
+    def _get(self, resource: str, tag: str = "", suffix: str = "") -> "requests.Response":
+        """
+        GET через пул токенов; на 403 запрос повторяется с другим токеном.
+        Сетевые ошибки и таймауты превращаются в APIUnavailableError.
+        """
+        import requests
 
-    def get_player(self, raw_tag: str) -> PlayerProfile:
-        normalized_tag = self.normalize_tag(raw_tag)
-        encoded_tag = quote(normalized_tag, safe="")
-        url = f"{self._base_url}/players/{encoded_tag}"
+        url = f"{self._base_url}/{resource}"
+        if tag:
+            url += f"/{quote(tag, safe='')}"
+        url += suffix
+        while True:
+            token = self._pool.acquire()
+            status = None
+            try:
+                response = self._session.get(url, headers=self._headers(token), timeout=self._timeout)
+                status = response.status_code
+            except requests.RequestException:
+                raise APIUnavailableError("Clash Royale API не отвечает.") from None
+            finally:
+                self._pool.release(token, status)
+            if status != 403 or not self._pool.active:
+                return response
 
-        response = self._session.get(url, headers=self._headers(), timeout=10)
-        if response.status_code == 404:
-            raise PlayerNotFoundError("Игрок с таким тегом не найден.")
+    @staticmethod
+    def _check_status(response: "requests.Response") -> None:
         if response.status_code == 403:
             raise ClashRoyaleAPIError(
                 "Доступ к Clash Royale API запрещён. Проверь токен и whitelist IP."
@@ -110,8 +348,29 @@ class ClashRoyaleAPI:
                 f"Ошибка Clash Royale API ({response.status_code})."
             )
 
-        data = response.json()
-        self._save_player_json(data)
+    def get_player(self, raw_tag: str) -> PlayerProfile:
+        normalized_tag = self.normalize_tag(raw_tag)
+
+        try:
+            response = self._get("players", normalized_tag)
+        except APIUnavailableError as exc:
+            return self._fallback(normalized_tag, str(exc))
+        if response.status_code == 404:
+            raise PlayerNotFoundError("Игрок с таким тегом не найден.")
+        if response.status_code == 429 or response.status_code >= 500:
+            return self._fallback(
+                normalized_tag, f"Ошибка Clash Royale API ({response.status_code})."
+            )
+        self._check_status(response)
+
+        profile = self.parse_player(response.json(), normalized_tag)
+        if self._store is not None:
+            self._store.submit(profile)
+        return profile
+
+    @staticmethod
+    def parse_player(data: dict, tag: str = "") -> PlayerProfile:
+        """PlayerProfile из ответа ``/players/{tag}``."""
         cards_data = data.get("cards") or []
 
         cards: List[PlayerCard] = []
@@ -131,7 +390,7 @@ class ClashRoyaleAPI:
             )
 
         return PlayerProfile(
-            tag=data.get("tag") or normalized_tag,
+            tag=data.get("tag") or tag,
             name=data.get("name") or "",
             exp_level=data.get("expLevel") or 0,
             trophies=data.get("trophies") or 0,
@@ -139,3 +398,75 @@ class ClashRoyaleAPI:
             cards=cards,
         )
 
+    def get_cards(self) -> List[Dict[str, Any]]:
+        """Все карты игры из ``/cards``: элементы ``items`` как есть."""
+        response = self._get("cards")
+        self._check_status(response)
+        return response.json().get("items") or []
+
+    def get_clan_members(self, raw_tag: str) -> List[ClanMember]:
+        """Участники клана из ``/clans/{tag}/members``."""
+        normalized_tag = self.normalize_tag(raw_tag)
+        response = self._get("clans", normalized_tag, "/members")
+        if response.status_code == 404:
+            raise ClanNotFoundError("Клан с таким тегом не найден.")
+        self._check_status(response)
+
+        return [
+            ClanMember(
+                tag=item["tag"],
+                name=item.get("name") or "",
+                role=item.get("role") or "member",
+                exp_level=item.get("expLevel") or 0,
+                trophies=item.get("trophies") or 0,
+            )
+            for item in response.json().get("items") or []
+            if item.get("tag")
+        ]
+
+    def get_battle_log(self, raw_tag: str) -> List[Battle]:
+        """Последние бои игрока из ``/players/{tag}/battlelog``, новые первыми."""
+        normalized_tag = self.normalize_tag(raw_tag)
+        response = self._get("players", normalized_tag, "/battlelog")
+        if response.status_code == 404:
+            raise PlayerNotFoundError("Игрок с таким тегом не найден.")
+        self._check_status(response)
+        return self.parse_battle_log(response.json())
+
+    @staticmethod
+    def parse_battle_log(data: list) -> List[Battle]:
+        """Battle из ответа ``/players/{tag}/battlelog``; бои без времени пропускаются."""
+
+        def sides(players) -> List[BattleSide]:
+            return [
+                BattleSide(
+                    tag=player.get("tag") or "",
+                    crowns=player.get("crowns") or 0,
+                    card_ids=tuple(card["id"] for card in player.get("cards") or [] if "id" in card),
+                )
+                for player in players or []
+            ]
+
+        battles: List[Battle] = []
+        for item in data or []:
+            try:
+                battle_time = datetime.strptime(item["battleTime"], "%Y%m%dT%H%M%S.%fZ")
+            except (KeyError, TypeError, ValueError):
+                continue
+            battles.append(
+                Battle(
+                    battle_time=battle_time.replace(tzinfo=dt_timezone.utc),
+                    type=item.get("type") or "",
+                    game_mode=(item.get("gameMode") or {}).get("name") or "",
+                    team=sides(item.get("team")),
+                    opponent=sides(item.get("opponent")),
+                )
+            )
+        return battles
+
+    def _fallback(self, tag: str, message: str) -> PlayerProfile:
+        cached = self._store.load(tag) if self._store is not None else None
+        if cached is None:
+            raise ClashRoyaleAPIError(message)
+        return cached
+
@@ -0,0 +1,502 @@
+import logging
+import os
+import threading
+from array import array
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import count
+from math import isnan
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from app.models import CatalogChange, Card, Deck, DeckCard
+
+
+logger = logging.getLogger(__name__)
+
+# Отсутствующие float-значения (win_rate и т.п.) храним в массивах как NaN.
+MISSING = float("nan")
+
+# Доля удалённых строк, после которой каталог уплотняется.
+COMPACT_RATIO = 0.25
+
+# Если изменений больше, чем эта доля каталога (и больше минимума),
+# дешевле перечитать всё.
+FULL_RELOAD_RATIO = 0.5
+FULL_RELOAD_MIN_CHANGES = 1000
+
+# Размер пачки при записи журнала изменений.
+CHANGE_BATCH_SIZE = 500
+
+# Номера раскладок строк, собранных в этом процессе из дельт (см. _revision).
+_revisions = count(1)
+
+
+@dataclass(frozen=True)
+class CardInfo:
+    api_id: int
+    name: str
+    icon_url: str
+    max_level: int | None
+
+
+@dataclass(frozen=True)
+class DeckInfo:
+    id: int
+    mode: str
+    avg_elixir: float | None
+    win_rate: float | None
+    avg_crowns: float | None
+
+
+def _to_float(value: float | None) -> float:
+    return MISSING if value is None else float(value)
+
+
+def _from_float(value: float) -> float | None:
+    return None if isnan(value) else value
+
+
+def _revision(sequence: int) -> str:
+    """
+    Версия каталога, собранного в процессе из дельт или уплотнённого.
+    Кэш рекомендаций хранит индексы строк, поэтому версия должна меняться
+    вместе с раскладкой строк, а не только с номером журнала: у каталога
+    из БД с тем же ``sequence`` строки лежат в другом порядке.
+    """
+    return f"{sequence}.{next(_revisions)}"
+
+
+class DeckCatalog:
+    """
+    Компактное представление каталога колод для скоринга.
+
+    Колоды лежат в параллельных массивах (по индексу колоды) в порядке
+    возрастания id, карты колоды хранятся в CSR-виде: карты колоды ``i`` —
+    это ``card_ids[offsets[i]:offsets[i + 1]]`` (api_id карт в порядке позиций).
+    ORM-объекты при скоринге не создаются.
+
+    Каталог обновляется дельтами из CatalogChange: новые и изменённые колоды
+    дописываются в конец, старые строки помечаются в ``alive`` как удалённые
+    (tombstone) и вычищаются при уплотнении. Опубликованный каталог не
+    меняется: дельта применяется к копии (copy-on-write), и читатели,
+    получившие объект из get_catalog(), не видят полупримененных массивов.
+    """
+
+    def __init__(
+        self,
+        deck_ids: Sequence[int],
+        offsets: Sequence[int],
+        card_ids: Sequence[int],
+        avg_elixir: Sequence[float],
+        win_rate: Sequence[float],
+        avg_crowns: Sequence[float],
+        modes: Sequence[str],
+        cards: Dict[int, CardInfo],
+        version: str = "",
+        sequence: int = 0,
+        alive: bytearray | None = None,
+    ) -> None:
+        self.deck_ids = deck_ids
+        self.offsets = offsets
+        self.card_ids = card_ids
+        self.avg_elixir = avg_elixir
+        self.win_rate = win_rate
+        self.avg_crowns = avg_crowns
+        self.modes = modes
+        self.cards = cards
+        # Пустая версия — каталог собран вне БД, кэшировать по нему нельзя.
+        self.version = version
+        # Номер последней применённой записи CatalogChange.
+        self.sequence = sequence
+        self.alive = alive if alive is not None else bytearray(b"\x01") * len(deck_ids)
+        self.dead_count = len(self.alive) - sum(self.alive)
+        # Индексы строк в порядке пометки удалёнными: производные индексы
+        # (deck_similarity) по нему вычитают строки без полного пересчёта.
+        self.removed_rows: List[int] = []
+        # Общий для каталога и его дельта-копий: строки в них совпадают по
+        # индексам, пока каталог не уплотнён и не перезагружен.
+        self.lineage = object()
+        self._index_by_id: Dict[int, int] | None = None
+
+    def __len__(self) -> int:
+        return len(self.deck_ids)
+
+    def deck_card_ids(self, index: int) -> Sequence[int]:
+        return self.card_ids[self.offsets[index]:self.offsets[index + 1]]
+
+    def deck_info(self, index: int) -> DeckInfo:
+        return DeckInfo(
+            id=self.deck_ids[index],
+            mode=self.modes[index],
+            avg_elixir=_from_float(self.avg_elixir[index]),
+            win_rate=_from_float(self.win_rate[index]),
+            avg_crowns=_from_float(self.avg_crowns[index]),
+        )
+
+    def card_info(self, api_id: int) -> CardInfo:
+        info = self.cards.get(api_id)
+        if info is None:
+            return CardInfo(api_id=api_id, name="", icon_url="", max_level=None)
+        return info
+
+    def index_of(self, deck_id: int) -> int | None:
+        return self._ensure_index().get(deck_id)
+
+    def _ensure_index(self) -> Dict[int, int]:
+        if self._index_by_id is None:
+            self._index_by_id = {
+                deck_id: index
+                for index, deck_id in enumerate(self.deck_ids)
+                if self.alive[index]
+            }
+        return self._index_by_id
+
+    def apply_changes(
+        self,
+        changes: Sequence[Tuple[int, int | None, str]],
+    ) -> "DeckCatalog":
+        """
+        Применяет записи журнала ``(id, deck_id, action)`` и возвращает
+        актуальный каталог: этот же объект, если записей нет, иначе новый —
+        копию с дельтой, уплотнённую копию или полную перезагрузку.
+        """
+        if not changes:
+            return self
+
+        actions = {action for _, _, action in changes}
+        reload_threshold = max(FULL_RELOAD_MIN_CHANGES, len(self) * FULL_RELOAD_RATIO)
+        if CatalogChange.RESET in actions or len(changes) > reload_threshold:
+            return DeckCatalog.from_db()
+
+        upserted: set[int] = set()
+        deleted: set[int] = set()
+        for _, deck_id, action in changes:
+            if deck_id is None:
+                continue
+            if action == CatalogChange.UPSERT:
+                upserted.add(deck_id)
+                deleted.discard(deck_id)
+            elif action == CatalogChange.DELETE:
+                deleted.add(deck_id)
+                upserted.discard(deck_id)
+
+        deck_rows: List[tuple] = []
+        cards_by_deck: Dict[int, List[int]] = {}
+        if upserted:
+            deck_rows, cards_by_deck = _load_deck_rows(upserted)
+
+        catalog = self._copy()
+        if CatalogChange.CARDS in actions:
+            catalog.cards = _load_cards()
+
+        for deck_id in deleted | upserted:
+            catalog._tombstone(deck_id)
+        for row in deck_rows:
+            catalog._append(row, cards_by_deck.get(row[0], ()))
+
+        catalog.sequence = changes[-1][0]
+        catalog.version = _revision(catalog.sequence)
+
+        if catalog.dead_count > len(catalog) * COMPACT_RATIO:
+            return catalog.compact()
+        return catalog
+
+    def compact(self) -> "DeckCatalog":
+        """Новый каталог без удалённых строк; строки перенумерованы, версия новая."""
+        cards_by_deck: Dict[int, List[int]] = {}
+        deck_rows = []
+        for index in range(len(self)):
+            if not self.alive[index]:
+                continue
+            deck_id = self.deck_ids[index]
+            cards_by_deck[deck_id] = list(self.deck_card_ids(index))
+            deck_rows.append(
+                (
+                    deck_id,
+                    self.modes[index],
+                    _from_float(self.avg_elixir[index]),
+                    _from_float(self.win_rate[index]),
+                    _from_float(self.avg_crowns[index]),
+                )
+            )
+        deck_rows.sort(key=lambda row: row[0])
+        return DeckCatalog.from_rows(
+            deck_rows,
+            cards_by_deck,
+            self.cards,
+            version=_revision(self.sequence) if self.version else "",
+            sequence=self.sequence,
+        )
+
+    def _copy(self) -> "DeckCatalog":
+        """
+        Изменяемая копия для применения дельты. Массивы из mmap-снимка при
+        этом переносятся в обычные ``array``.
+        """
+        catalog = DeckCatalog(
+            deck_ids=array("q", self.deck_ids),
+            offsets=array("q", self.offsets),
+            card_ids=array("q", self.card_ids),
+            avg_elixir=array("d", self.avg_elixir),
+            win_rate=array("d", self.win_rate),
+            avg_crowns=array("d", self.avg_crowns),
+            modes=list(self.modes),
+            cards=self.cards,
+            version=self.version,
+            sequence=self.sequence,
+            alive=bytearray(self.alive),
+        )
+        catalog.removed_rows = list(self.removed_rows)
+        catalog.lineage = self.lineage
+        if self._index_by_id is not None:
+            catalog._index_by_id = dict(self._index_by_id)
+        return catalog
+
+    def _tombstone(self, deck_id: int) -> None:
+        index = self.index_of(deck_id)
+        if index is None:
+            return
+        self.alive[index] = 0
+        self.dead_count += 1
+        self.removed_rows.append(index)
+        del self._ensure_index()[deck_id]
+
+    def _append(self, row: tuple, api_ids: Iterable[int]) -> None:
+        deck_id, mode, elixir, rate, crowns = row
+        # deck_ids дописываем последним: len(catalog) растёт только когда
+        # все остальные массивы строки уже заполнены.
+        self.card_ids.extend(api_ids)
+        self.offsets.append(len(self.card_ids))
+        self.avg_elixir.append(_to_float(elixir))
+        self.win_rate.append(_to_float(rate))
+        self.avg_crowns.append(_to_float(crowns))
+        self.modes.append(mode)
+        self.alive.append(1)
+        self._ensure_index()[deck_id] = len(self.deck_ids)
+        self.deck_ids.append(deck_id)
+
+    @classmethod
+    def from_rows(
+        cls,
+        deck_rows: Iterable[tuple],
+        cards_by_deck: Dict[int, List[int]],
+        cards: Dict[int, CardInfo],
+        version: str = "",
+        sequence: int = 0,
+    ) -> "DeckCatalog":
+        deck_ids = array("q")
+        offsets = array("q", [0])
+        card_ids = array("q")
+        avg_elixir = array("d")
+        win_rate = array("d")
+        avg_crowns = array("d")
+        modes: List[str] = []
+
+        for deck_id, mode, elixir, rate, crowns in deck_rows:
+            deck_ids.append(deck_id)
+            card_ids.extend(cards_by_deck.get(deck_id, ()))
+            offsets.append(len(card_ids))
+            avg_elixir.append(_to_float(elixir))
+            win_rate.append(_to_float(rate))
+            avg_crowns.append(_to_float(crowns))
+            modes.append(mode)
+
+        return cls(
+            deck_ids=deck_ids,
+            offsets=offsets,
+            card_ids=card_ids,
+            avg_elixir=avg_elixir,
+            win_rate=win_rate,
+            avg_crowns=avg_crowns,
+            modes=modes,
+            cards=cards,
+            version=version,
+            sequence=sequence,
+        )
+
+    @classmethod
+    def from_db(cls) -> "DeckCatalog":
+        sequence = catalog_sequence()
+        deck_rows, cards_by_deck = _load_deck_rows()
+        return cls.from_rows(
+            deck_rows,
+            cards_by_deck,
+            _load_cards(),
+            version=str(sequence),
+            sequence=sequence,
+        )
+
+    @classmethod
+    def from_decks(cls, decks: Iterable[Deck]) -> "DeckCatalog":
+        """
+        Строит каталог из уже загруженных Deck (ожидается
+        ``prefetch_related("deck_cards__card")``).
+        """
+        cards: Dict[int, CardInfo] = {}
+        cards_by_deck: Dict[int, List[int]] = {}
+        deck_rows = []
+
+        for deck in decks:
+            api_ids: List[int] = []
+            for deck_card in deck.deck_cards.all():
+                card = deck_card.card
+                api_ids.append(card.api_id)
+                if card.api_id not in cards:
+                    cards[card.api_id] = CardInfo(
+                        api_id=card.api_id,
+                        name=card.name,
+                        icon_url=card.icon_url,
+                        max_level=card.max_level,
+                    )
+            cards_by_deck[deck.pk] = api_ids
+            deck_rows.append(
+                (deck.pk, deck.mode, deck.avg_elixir, deck.win_rate, deck.avg_crowns)
+            )
+
+        deck_rows.sort(key=lambda row: row[0])
+        return cls.from_rows(deck_rows, cards_by_deck, cards)
+
+
+def _load_cards() -> Dict[int, CardInfo]:
+    return {
+        api_id: CardInfo(
+            api_id=api_id,
+            name=name,
+            icon_url=icon_url,
+            max_level=max_level,
+        )
+        for api_id, name, icon_url, max_level in Card.objects.values_list(
+            "api_id", "name", "icon_url", "max_level"
+        )
+    }
+
+
+def _load_deck_rows(
+    deck_ids: Iterable[int] | None = None,
+) -> Tuple[List[tuple], Dict[int, List[int]]]:
+    decks = Deck.objects.order_by("id")
+    deck_cards = DeckCard.objects.order_by("deck_id", "position")
+    if deck_ids is not None:
+        deck_ids = list(deck_ids)
+        decks = decks.filter(id__in=deck_ids)
+        deck_cards = deck_cards.filter(deck_id__in=deck_ids)
+
+    cards_by_deck: Dict[int, List[int]] = {}
+    for deck_id, api_id in deck_cards.values_list("deck_id", "card__api_id"):
+        cards_by_deck.setdefault(deck_id, []).append(api_id)
+
+    deck_rows = list(
+        decks.values_list("id", "mode", "avg_elixir", "win_rate", "avg_crowns")
+    )
+    return deck_rows, cards_by_deck
+
+
+def catalog_sequence() -> int:
+    return CatalogChange.objects.aggregate(last=Max("id"))["last"] or 0
+
+
+def record_catalog_changes(
+    upserted: Iterable[int] = (),
+    deleted: Iterable[int] = (),
+    cards_changed: bool = False,
+    reset: bool = False,
+) -> None:
+    """
+    Записывает изменения каталога в журнал. Вызывается импортёрами после
+    того, как колоды и их карты уже сохранены.
+    """
+    changes = [
+        CatalogChange(deck_id=deck_id, action=CatalogChange.UPSERT)
+        for deck_id in upserted
+    ]
+    changes.extend(
+        CatalogChange(deck_id=deck_id, action=CatalogChange.DELETE)
+        for deck_id in deleted
+    )
+    if cards_changed:
+        changes.append(CatalogChange(action=CatalogChange.CARDS))
+    if reset:
+        changes.append(CatalogChange(action=CatalogChange.RESET))
+    CatalogChange.objects.bulk_create(changes, batch_size=CHANGE_BATCH_SIZE)
+
+
+def prune_catalog_changes(days: int | None = None) -> int:
+    """
+    Удаляет записи журнала старше срока хранения (CATALOG_CHANGE_RETENTION_DAYS).
+    Последняя запись остаётся всегда: процесс, отставший больше чем на срок
+    хранения, видит разрыв между своей версией и первой оставшейся записью
+    и перечитывает каталог целиком (см. get_catalog).
+    """
+    if days is None:
+        days = settings.CATALOG_CHANGE_RETENTION_DAYS
+    last = catalog_sequence()
+    if not last:
+        return 0
+    since = timezone.now() - timedelta(days=days)
+    deleted, _ = CatalogChange.objects.filter(id__lt=last, created_at__lt=since).delete()
+    return deleted
+
+
+_catalog_lock = threading.Lock()
+_catalog: DeckCatalog | None = None
+
+
+def _snapshot_is_current(sequence: int) -> bool:
+    """
+    Снимок с номером журнала ``sequence`` можно догнать дельтами: его
+    номер не меньше предшественника первой оставшейся записи журнала и не
+    больше последней.
+    """
+    bounds = CatalogChange.objects.aggregate(first=Min("id"), last=Max("id"))
+    if bounds["first"] is None:
+        return sequence == 0
+    return bounds["first"] - 1 <= sequence <= bounds["last"]
+
+
+def _initial_catalog() -> DeckCatalog:
+    snapshot_path = getattr(settings, "CATALOG_SNAPSHOT_PATH", "")
+    if snapshot_path and os.path.exists(snapshot_path):
+        from .catalog_snapshot import SnapshotError, database_fingerprint, load_snapshot
+
+        try:
+            snapshot = load_snapshot(snapshot_path, database=database_fingerprint())
+        except (OSError, SnapshotError, ValueError) as exc:
+            logger.warning("Не удалось открыть снимок каталога %s: %s", snapshot_path, exc)
+        else:
+            if _snapshot_is_current(snapshot.sequence):
+                return snapshot
+            logger.warning(
+                "Снимок каталога %s (журнал %d) не согласован с журналом БД, "
+                "каталог загружается из БД.",
+                snapshot_path,
+                snapshot.sequence,
+            )
+    return DeckCatalog.from_db()
+
+
+def get_catalog() -> DeckCatalog:
+    """
+    Возвращает общий для процесса каталог. Первая загрузка берётся из
+    mmap-снимка (если он есть) или из БД, дальше при каждом вызове
+    дочитываются только новые записи журнала и применяются дельтой.
+    Если часть записей после версии каталога уже удалена из журнала
+    (prune_catalog_changes), каталог перечитывается целиком.
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = _initial_catalog()
+        changes = list(
+            CatalogChange.objects.filter(id__gt=_catalog.sequence)
+            .order_by("id")
+            .values_list("id", "deck_id", "action")
+        )
+        if changes and changes[0][0] > _catalog.sequence + 1:
+            _catalog = DeckCatalog.from_db()
+        else:
+            _catalog = _catalog.apply_changes(changes)
+        return _catalog
@@ -0,0 +1,311 @@
+import threading
+from array import array
+from dataclasses import dataclass
+from heapq import heappush, heapreplace
+from math import log
+from typing import Dict, List, Sequence, Tuple
+
+from app.models import Card
+from .card_index import CardIndex
+from .clash_royale import PlayerProfile
+from .deck_recommendation import MAX_CARD_LEVEL, DeckRecommender, RecommendedDeckCard
+from .deck_similarity import DeckSimilarityIndex, get_similarity_index
+
+
+DECK_SIZE = 8
+
+# Роли карт для ограничений на состав (ключи — CardIndex.name_key).
+WIN_CONDITIONS = frozenset(
+    {
+        "hogrider", "giant", "golem", "royalgiant", "balloon", "xbow", "mortar",
+        "miner", "graveyard", "goblinbarrel", "lavahound", "ramrider", "battleram",
+        "elixirgolem", "electrogiant", "goblingiant", "threemusketeers",
+        "wallbreakers", "skeletonbarrel", "goblindrill", "royalhogs", "sparky",
+        "pekka", "megaknight", "giantskeleton", "goblinmachine",
+    }
+)
+SPELLS = frozenset(
+    {
+        "zap", "thelog", "arrows", "fireball", "poison", "rocket", "lightning",
+        "earthquake", "giantsnowball", "barbarianbarrel", "tornado", "freeze",
+        "rage", "clone", "graveyard", "goblinbarrel", "royaldelivery", "void",
+        "goblincurse", "mirror",
+    }
+)
+
+# Вклад уровня карты в оценку: LEVEL_WEIGHT * effective_level / MAX_CARD_LEVEL
+# за карту, против суммы логарифмов lift по 28 парам колоды.
+LEVEL_WEIGHT = 1.0
+
+# Сглаживание lift: log((вместе + k) / (ожидаемо + k)). Без него пара из
+# одной-двух колод получает lift выше метового архетипа, а несыгранная
+# пара — -inf; k — «сколько колод нужно, чтобы поверить lift».
+PAIR_SMOOTHING = 5.0
+
+BEAM_WIDTH = 48
+
+# Сгенерированные колоды в выдаче различаются хотя бы на столько карт.
+MIN_DIFFERENT_CARDS = 2
+
+
+@dataclass(frozen=True)
+class DeckConstraints:
+    min_elixir: float | None = 2.6
+    max_elixir: float | None = 4.3
+    min_win_conditions: int = 1
+    min_spells: int = 1
+    max_spells: int = 3
+
+
+@dataclass(frozen=True)
+class GeneratedDeck:
+    cards: List[RecommendedDeckCard]
+    avg_elixir: float | None
+    # Сумма сглаженных log-lift по парам карт колоды.
+    synergy: float
+    score: float
+
+
+class _State:
+    """Частичная колода и вклад каждой карты пула при её добавлении."""
+
+    __slots__ = ("score", "mask", "members", "gains", "elixir", "costed", "win", "spells")
+
+    def __init__(self, score, mask, members, gains, elixir, costed, win, spells):
+        self.score = score
+        self.mask = mask
+        self.members = members
+        self.gains = gains
+        self.elixir = elixir
+        self.costed = costed
+        self.win = win
+        self.spells = spells
+
+
+class DeckGenerator:
+    """
+    Генератор новых колод из карт игрока поверх DeckSimilarityIndex.
+
+    Попарные оценки карт (сглаженный log-lift совместной встречаемости)
+    считаются один раз на версию каталога. Поиск — лучевой: состояние
+    хранит массив ``gains`` с приростом оценки для каждой карты пула, так что
+    оценка кандидата стоит O(1), а обновление состояния — одно сложение
+    массивов. Кандидаты отсекаются по ограничениям (эликсир, роли) и по
+    верхней оценке относительно порога луча.
+    """
+
+    def __init__(self, index: DeckSimilarityIndex, elixir: Dict[int, int]) -> None:
+        self.index = index
+        self.catalog = index.catalog
+        self.sequence = index.catalog.sequence
+        self.elixir = elixir
+        self.api_ids = [
+            api_id
+            for api_id, bit in index.card_bits.items()
+            if index.card_counts[bit]
+        ]
+        self.positions = {api_id: pos for pos, api_id in enumerate(self.api_ids)}
+        self.pair_scores = self._pair_scores()
+
+    def _pair_scores(self) -> List[array]:
+        index = self.index
+        counts = [index.card_counts[index.card_bits[api_id]] for api_id in self.api_ids]
+        live = index.live_count or 1
+        size = len(self.api_ids)
+        rows = [array("d", bytes(8 * size)) for _ in range(size)]
+        for a in range(size):
+            row_a = rows[a]
+            for b in range(a + 1, size):
+                both = index.cooccurrence(self.api_ids[a], self.api_ids[b])
+                expected = counts[a] * counts[b] / live
+                score = log((both + PAIR_SMOOTHING) / (expected + PAIR_SMOOTHING))
+                row_a[b] = score
+                rows[b][a] = score
+        return rows
+
+    def generate(
+        self,
+        player: PlayerProfile,
+        limit: int = 3,
+        constraints: DeckConstraints | None = None,
+        beam_width: int = BEAM_WIDTH,
+    ) -> List[GeneratedDeck]:
+        constraints = constraints or DeckConstraints()
+        levels = DeckRecommender.effective_levels(player, self.catalog)
+        pool = [api_id for api_id in levels if api_id in self.positions]
+        if len(pool) < DECK_SIZE:
+            return []
+
+        positions = [self.positions[api_id] for api_id in pool]
+        pairs = [
+            array("d", (row[other] for other in positions))
+            for row in (self.pair_scores[pos] for pos in positions)
+        ]
+        unary = array("d", (LEVEL_WEIGHT * levels[api_id] / MAX_CARD_LEVEL for api_id in pool))
+        keys = [CardIndex.name_key(self.catalog.card_info(api_id).name) for api_id in pool]
+        win = [key in WIN_CONDITIONS for key in keys]
+        spell = [key in SPELLS for key in keys]
+        costs = [self.elixir.get(api_id) for api_id in pool]
+        known = [cost for cost in costs if cost is not None]
+        cost_range = (min(known), max(known)) if known else (0, 0)
+        search = _Search(pairs, unary, win, spell, costs, cost_range, constraints)
+
+        finals = search.run(max(beam_width, limit))
+
+        raw_levels = {card.id: card.level for card in player.cards}
+        chosen: List[_State] = []
+        for state in finals:
+            if len(chosen) == limit:
+                break
+            if all(
+                (state.mask & ~other.mask).bit_count() >= MIN_DIFFERENT_CARDS
+                for other in chosen
+            ):
+                chosen.append(state)
+
+        return [self._result(state, pool, unary, costs, raw_levels, levels) for state in chosen]
+
+    def _result(
+        self,
+        state: _State,
+        pool: Sequence[int],
+        unary: array,
+        costs: Sequence[int | None],
+        raw_levels: Dict[int, int],
+        levels: Dict[int, int],
+    ) -> GeneratedDeck:
+        members = sorted(state.members)
+        cards: List[RecommendedDeckCard] = []
+        for member in members:
+            api_id = pool[member]
+            cards.append(
+                RecommendedDeckCard(
+                    card=self.catalog.card_info(api_id),
+                    level=raw_levels.get(api_id),
+                    effective_level=levels.get(api_id),
+                )
+            )
+        return GeneratedDeck(
+            cards=cards,
+            avg_elixir=round(state.elixir / state.costed, 1) if state.costed else None,
+            synergy=state.score - sum(unary[member] for member in members),
+            score=state.score,
+        )
+
+
+class _Search:
+    def __init__(self, pairs, unary, win, spell, costs, cost_range, constraints) -> None:
+        self.pairs = pairs
+        self.unary = unary
+        self.win = win
+        self.spell = spell
+        self.costs = costs
+        self.min_cost, self.max_cost = cost_range
+        self.constraints = constraints
+
+    def _feasible(self, state: _State, candidate: int, remaining: int) -> Tuple[bool, int, int, int, int]:
+        constraints = self.constraints
+        spells = state.spells + self.spell[candidate]
+        if spells > constraints.max_spells:
+            return False, 0, 0, 0, 0
+        win = state.win + self.win[candidate]
+        missing = max(0, constraints.min_win_conditions - win) + max(0, constraints.min_spells - spells)
+        if missing > remaining:
+            return False, 0, 0, 0, 0
+        elixir, costed = state.elixir, state.costed
+        cost = self.costs[candidate]
+        if cost is not None:
+            elixir += cost
+            costed += 1
+        if costed + remaining:
+            low = (elixir + remaining * self.min_cost) / (costed + remaining)
+            high = (elixir + remaining * self.max_cost) / (costed + remaining)
+            if constraints.max_elixir is not None and low > constraints.max_elixir:
+                return False, 0, 0, 0, 0
+            if constraints.min_elixir is not None and high < constraints.min_elixir:
+                return False, 0, 0, 0, 0
+        return True, elixir, costed, win, spells
+
+    def run(self, width: int) -> List[_State]:
+        """
+        Лучевой поиск шириной ``width``. Кандидаты каждого состояния
+        перебираются по убыванию прироста: оценка кандидата — верхняя граница
+        для всех следующих, поэтому перебор обрывается, как только она не
+        проходит порог уже набранного луча. Результат — полные колоды по
+        убыванию оценки.
+        """
+        size = len(self.unary)
+        unary = self.unary
+        beam = [_State(0.0, 0, (), array("d", bytes(8 * size)), 0, 0, 0, 0)]
+        for step in range(DECK_SIZE):
+            remaining = DECK_SIZE - step - 1
+            heap: List[Tuple[float, int, _State, int, tuple]] = []
+            seen = set()
+            for state in beam:
+                base, state_mask = state.score, state.mask
+                gains = list(map(float.__add__, unary, state.gains))
+                order = sorted(range(size), key=gains.__getitem__, reverse=True)
+                for candidate in order:
+                    score = base + gains[candidate]
+                    if len(heap) == width and score <= heap[0][0]:
+                        break
+                    if state_mask >> candidate & 1:
+                        continue
+                    mask = state_mask | 1 << candidate
+                    # Оценка зависит только от набора карт, не от порядка.
+                    if mask in seen:
+                        continue
+                    feasible, *counters = self._feasible(state, candidate, remaining)
+                    if not feasible:
+                        continue
+                    seen.add(mask)
+                    item = (score, mask, state, candidate, tuple(counters))
+                    if len(heap) < width:
+                        heappush(heap, item)
+                    else:
+                        heapreplace(heap, item)
+
+            beam = []
+            for score, mask, parent, candidate, (elixir, costed, win, spells) in sorted(heap, reverse=True):
+                gains = parent.gains
+                if remaining:
+                    gains = array("d", map(float.__add__, gains, self.pairs[candidate]))
+                beam.append(
+                    _State(score, mask, parent.members + (candidate,), gains, elixir, costed, win, spells)
+                )
+            if not beam:
+                return []
+        return [state for state in beam if self._complete(state)]
+
+    def _complete(self, state: _State) -> bool:
+        constraints = self.constraints
+        if state.costed:
+            average = state.elixir / state.costed
+            if constraints.min_elixir is not None and average < constraints.min_elixir:
+                return False
+            if constraints.max_elixir is not None and average > constraints.max_elixir:
+                return False
+        return state.win >= constraints.min_win_conditions and state.spells >= constraints.min_spells
+
+
+def load_elixir_costs() -> Dict[int, int]:
+    return dict(Card.objects.filter(elixir__isnull=False).values_list("api_id", "elixir"))
+
+
+_generator_lock = threading.Lock()
+_generator: DeckGenerator | None = None
+
+
+def get_deck_generator() -> DeckGenerator:
+    """Общий для процесса генератор; пересобирается при изменении каталога."""
+    global _generator
+    index = get_similarity_index()
+    with _generator_lock:
+        if (
+            _generator is None
+            or _generator.index is not index
+            or _generator.catalog is not index.catalog
+            or _generator.sequence != index.catalog.sequence
+        ):
+            _generator = DeckGenerator(index, load_elixir_costs())
+        return _generator
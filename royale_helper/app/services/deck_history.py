@@ -0,0 +1,183 @@
+import time
+from collections import defaultdict
+from dataclasses import replace
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from django.conf import settings
+from django.db.models import QuerySet
+
+from app.models import DeckStatSnapshot, DeckTrend
+
+
+DAY = 24 * 60 * 60
+
+# Окно скользящего агрегата DeckTrend.
+TREND_WINDOW_DAYS = 7
+
+BATCH_SIZE = 500
+
+
+def _x100(value: float | None) -> int | None:
+    return None if value is None else max(0, round(value * 100))
+
+
+def _from_x100(value: int | None) -> float | None:
+    return None if value is None else value / 100
+
+
+def record_snapshots(
+    observations: Iterable[Tuple[int, object]],
+    source: str = "",
+    taken_at: int | None = None,
+) -> List[int]:
+    """
+    Сохраняет снимки статистики для пар ``(deck_id, запись)``, где у записи
+    есть атрибуты win_rate, usage и avg_crowns. Записи без статистики
+    пропускаются. Возвращает id колод, получивших снимок.
+    """
+    taken_at = int(time.time()) if taken_at is None else taken_at
+    snapshots = [
+        DeckStatSnapshot(
+            deck_id=deck_id,
+            source=source,
+            taken_at=taken_at,
+            win_rate_x100=_x100(record.win_rate),
+            usage=record.usage,
+            avg_crowns_x100=_x100(record.avg_crowns),
+        )
+        for deck_id, record in observations
+        if record.win_rate is not None
+        or record.usage is not None
+        or record.avg_crowns is not None
+    ]
+    DeckStatSnapshot.objects.bulk_create(snapshots, batch_size=BATCH_SIZE)
+    return [snapshot.deck_id for snapshot in snapshots]
+
+
+def _mean(values: Sequence[float]) -> float | None:
+    return sum(values) / len(values) if values else None
+
+
+def _slope_per_day(points: Sequence[Tuple[int, float]]) -> float | None:
+    """Наклон МНК по точкам (unix-время, значение), в единицах за сутки."""
+    if len(points) < 2:
+        return None
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_v = sum(v for _, v in points) / len(points)
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    if not var_t:
+        return None
+    cov = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return cov / var_t * DAY
+
+
+def refresh_trends(
+    deck_ids: Iterable[int],
+    window_days: int = TREND_WINDOW_DAYS,
+    now: int | None = None,
+) -> int:
+    """
+    Пересчитывает DeckTrend для указанных колод по снимкам из окна. Читаются
+    только снимки этих колод за окно (индекс deck, taken_at); колоды без
+    снимков в окне теряют агрегат.
+    """
+    deck_ids = sorted(set(deck_ids))
+    if not deck_ids:
+        return 0
+    now = int(time.time()) if now is None else now
+    since = now - window_days * DAY
+
+    samples: Dict[int, List[Tuple[int, int | None, int | None, int | None]]] = defaultdict(list)
+    for start in range(0, len(deck_ids), BATCH_SIZE):
+        rows = DeckStatSnapshot.objects.filter(
+            deck_id__in=deck_ids[start:start + BATCH_SIZE],
+            taken_at__gte=since,
+        ).values_list("deck_id", "taken_at", "win_rate_x100", "usage", "avg_crowns_x100")
+        for deck_id, *row in rows:
+            samples[deck_id].append(tuple(row))
+
+    trends: List[DeckTrend] = []
+    for deck_id, rows in samples.items():
+        win_points = [(t, w / 100) for t, w, _, _ in rows if w is not None]
+        trends.append(
+            DeckTrend(
+                deck_id=deck_id,
+                window_days=window_days,
+                samples=len(rows),
+                win_rate=_mean([v for _, v in win_points]),
+                win_rate_change=_slope_per_day(win_points),
+                usage=_mean([u for _, _, u, _ in rows if u is not None]),
+                avg_crowns=_mean([c / 100 for _, _, _, c in rows if c is not None]),
+            )
+        )
+
+    DeckTrend.objects.bulk_create(
+        trends,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["deck"],
+        # auto_now не действует на ветку ON CONFLICT: updated_at перечисляем явно.
+        update_fields=[
+            "window_days",
+            "samples",
+            "win_rate",
+            "win_rate_change",
+            "usage",
+            "avg_crowns",
+            "updated_at",
+        ],
+    )
+    stale = [deck_id for deck_id in deck_ids if deck_id not in samples]
+    for start in range(0, len(stale), BATCH_SIZE):
+        DeckTrend.objects.filter(deck_id__in=stale[start:start + BATCH_SIZE]).delete()
+    return len(trends)
+
+
+def win_rate_history(
+    deck_id: int,
+    days: int = TREND_WINDOW_DAYS,
+) -> List[Tuple[datetime, float]]:
+    """Точки win rate колоды за последние ``days`` дней (диапазон по индексу)."""
+    since = int(time.time()) - days * DAY
+    rows = DeckStatSnapshot.objects.filter(
+        deck_id=deck_id,
+        taken_at__gte=since,
+        win_rate_x100__isnull=False,
+    ).values_list("taken_at", "win_rate_x100")
+    return [
+        (datetime.fromtimestamp(taken_at, tz=dt_timezone.utc), _from_x100(win_rate))
+        for taken_at, win_rate in rows
+    ]
+
+
+def trending_decks(mode: str | None = None, limit: int = 10) -> QuerySet:
+    """Колоды с самым быстрым ростом win rate по предрасчитанному агрегату."""
+    trends = DeckTrend.objects.filter(win_rate_change__isnull=False)
+    if mode is not None:
+        trends = trends.filter(deck__mode=mode)
+    return trends.select_related("deck").order_by("-win_rate_change")[:limit]
+
+
+def deck_trends(deck_ids: Iterable[int]) -> Dict[int, DeckTrend]:
+    return {trend.deck_id: trend for trend in DeckTrend.objects.filter(deck_id__in=list(deck_ids))}
+
+
+def attach_trends(recommendations: Sequence) -> list:
+    """Дополняет рекомендации изменением win rate из DeckTrend одним запросом."""
+    trends = deck_trends(item.deck.id for item in recommendations)
+    return [
+        replace(item, win_rate_change=trends[item.deck.id].win_rate_change)
+        if item.deck.id in trends
+        else item
+        for item in recommendations
+    ]
+
+
+def prune_snapshots(days: int | None = None) -> int:
+    """Удаляет снимки старше срока хранения (DECK_HISTORY_RETENTION_DAYS)."""
+    if days is None:
+        days = settings.DECK_HISTORY_RETENTION_DAYS
+    since = int(time.time()) - days * DAY
+    deleted, _ = DeckStatSnapshot.objects.filter(taken_at__lt=since).delete()
+    return deleted
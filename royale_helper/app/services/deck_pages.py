@@ -0,0 +1,96 @@
+import glob
+import os
+import tarfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Iterable, Iterator, List
+
+import django
+
+from .deck_sources import RawDeck, get_source
+
+
+HTML_SUFFIXES = (".html", ".htm")
+
+
+@dataclass(frozen=True)
+class Page:
+    """
+    Сохранённая страница: путь к файлу либо уже прочитанный HTML (для
+    элементов tar-архива, которые читаются последовательно в основном
+    процессе, чтобы не распаковывать архив заново в каждом воркере).
+    """
+
+    name: str
+    path: str | None = None
+    html: str | None = None
+
+
+def collect_pages(spec: str) -> Iterator[Page]:
+    """
+    Страницы по ``spec``: каталог (все *.html внутри), glob-шаблон, tar-архив
+    (в том числе .tar.gz) или одиночный файл.
+    """
+    path = Path(spec)
+    if path.is_dir():
+        for child in sorted(path.rglob("*")):
+            if child.is_file() and child.suffix.lower() in HTML_SUFFIXES:
+                yield Page(name=str(child), path=str(child))
+    elif path.is_file() and tarfile.is_tarfile(path):
+        with tarfile.open(path) as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.lower().endswith(HTML_SUFFIXES):
+                    continue
+                stream = archive.extractfile(member)
+                if stream is None:
+                    continue
+                yield Page(
+                    name=f"{path}:{member.name}",
+                    html=stream.read().decode("utf-8", errors="replace"),
+                )
+    elif path.is_file():
+        yield Page(name=str(path), path=str(path))
+    else:
+        matches = sorted(glob.glob(spec, recursive=True))
+        if not matches:
+            raise FileNotFoundError(f"Не найдено страниц по пути или шаблону: {spec}")
+        for match in matches:
+            yield from collect_pages(match)
+
+
+def parse_page(source_name: str, page: Page) -> List[RawDeck]:
+    """Разбор одной страницы; выполняется в воркере пула."""
+    source = get_source(source_name)
+    html = page.html if page.html is not None else source.read_file(page.path)
+    return list(source.parse(html))
+
+
+def parse_pages(
+    source_name: str,
+    pages: Iterable[Page],
+    workers: int | None = None,
+) -> Iterator[RawDeck]:
+    """
+    Разбирает страницы в пуле процессов и отдаёт колоды потоком в порядке
+    страниц. В работе одновременно не больше ``2 * workers`` страниц, так
+    что память не растёт с размером архива. При ``workers == 1`` разбор
+    идёт в текущем процессе.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for page in pages:
+            yield from parse_page(source_name, page)
+        return
+
+    # При spawn/forkserver воркер импортирует app.services заново, а вместе
+    # с ним и модели, поэтому Django поднимается в инициализаторе.
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        pending: Deque[Future] = deque()
+        for page in pages:
+            pending.append(pool.submit(parse_page, source_name, page))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,107 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+from .card_index import CardIndex
+from .catalog_sync import DeckRecord, DeckSink, SyncResult
+from .deck_pages import Page, collect_pages, parse_pages
+from .deck_sources import DeckSource, RawDeck
+
+
+@dataclass
+class PipelineReport:
+    parsed: int = 0
+    unresolved: int = 0
+    pages: int = 0
+    sync: SyncResult = field(default_factory=SyncResult)
+    unresolved_names: Counter[str] = field(default_factory=Counter)
+
+    def __str__(self) -> str:
+        return (
+            f"разобрано колод {self.parsed}, не распознано {self.unresolved}; "
+            f"{self.sync}"
+        )
+
+
+def normalize(
+    decks: Iterable[RawDeck],
+    index: CardIndex,
+    report: PipelineReport,
+) -> Iterator[DeckRecord]:
+    """Сопоставляет карты колод со справочником и отбрасывает нераспознанные."""
+    for raw in decks:
+        report.parsed += 1
+        if raw.card_ids:
+            api_ids = index.resolve_ids(raw.card_ids)
+        elif raw.card_slugs:
+            api_ids = index.resolve_slugs(raw.card_slugs)
+        else:
+            api_ids = index.resolve_names(raw.card_names)
+
+        if api_ids is None:
+            report.unresolved += 1
+            continue
+
+        yield DeckRecord(
+            api_ids=api_ids,
+            avg_elixir=raw.avg_elixir,
+            win_rate=raw.win_rate,
+            avg_crowns=raw.avg_crowns,
+            usage=raw.usage,
+        )
+
+
+def sync_raw_decks(
+    decks: Iterable[RawDeck],
+    mode: str,
+    index: CardIndex | None = None,
+    source: str = "",
+) -> PipelineReport:
+    """parse → normalize → upsert для уже полученного потока RawDeck."""
+    report = PipelineReport()
+    index = index or CardIndex.from_db()
+    seen_unresolved = index.unresolved.copy()
+    records = normalize(decks, index, report)
+    report.sync = DeckSink(mode, source=source).write(records)
+    report.unresolved_names = index.unresolved - seen_unresolved
+    return report
+
+
+def run_pipeline(
+    source: DeckSource,
+    html: str,
+    mode: str | None = None,
+    index: CardIndex | None = None,
+) -> PipelineReport:
+    """
+    fetch → parse → normalize → upsert: стадии — генераторы, колоды идут
+    по одной до пакетной записи в DeckSink.
+    """
+    return sync_raw_decks(
+        source.parse(html), mode or source.default_mode, index, source=source.name
+    )
+
+
+def run_pages_pipeline(
+    source: DeckSource,
+    spec: str,
+    mode: str | None = None,
+    workers: int | None = None,
+    index: CardIndex | None = None,
+) -> PipelineReport:
+    """
+    То же для пачки сохранённых страниц (каталог, glob или tar-архив):
+    страницы разбираются в пуле процессов, колоды идут в один DeckSink.
+    """
+    pages_seen = 0
+
+    def counted(pages: Iterable[Page]) -> Iterator[Page]:
+        nonlocal pages_seen
+        for page in pages:
+            pages_seen += 1
+            yield page
+
+    decks = parse_pages(source.name, counted(collect_pages(spec)), workers)
+    report = sync_raw_decks(decks, mode or source.default_mode, index, source=source.name)
+    report.pages = pages_seen
+    return report
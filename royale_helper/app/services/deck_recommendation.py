@@ -1,79 +1,325 @@
+from array import array
 from dataclasses import dataclass
-from typing import Iterable, List
+from heapq import nlargest
+from typing import Dict, Iterable, List, Tuple
 
-from app.models import Card, Deck
+from app.models import Deck
 from .clash_royale import PlayerProfile
+from .deck_catalog import CardInfo, DeckCatalog, DeckInfo
+from .recommendation_cache import RecommendationCache
+
+
+# Максимальный уровень карты в игре: уровни игрока приводятся к этой шкале.
+MAX_CARD_LEVEL = 16
+
+# Ключ сортировки колоды упакован в одно 64-битное целое:
+# owned << OWNED_SHIFT | total_level << LEVEL_SHIFT | deck_id.
+# id колоды в младших битах разрешает ничьи в пользу более новых колод
+# независимо от физического порядка строк в каталоге.
+OWNED_SHIFT = 56
+LEVEL_SHIFT = 40
+
+# Переранжирование на разнообразие (MMR) идёт по короткому списку лучших
+# колод: SHORTLIST_FACTOR * limit, но не меньше SHORTLIST_MIN.
+SHORTLIST_FACTOR = 10
+SHORTLIST_MIN = 30
+
+# Советы по прокачке считаются по этому числу лучших колод игрока.
+UPGRADE_TOP_DECKS = 30
 
 
 @dataclass(frozen=True)
 class RecommendedDeckCard:
-    card: Card
+    card: CardInfo
     level: int | None
     effective_level: int | None
 
 
 @dataclass(frozen=True)
 class RecommendedDeck:
-    deck: Deck
+    deck: DeckInfo
     owned_cards_count: int
     total_level: int
     cards: List[RecommendedDeckCard]
+    # Изменение win rate за окно DeckTrend, п.п. в день (deck_history.attach_trends).
+    win_rate_change: float | None = None
+
+
+@dataclass(frozen=True)
+class UpgradeSuggestion:
+    card: CardInfo
+    level: int | None
+    effective_level: int
+    # Сколько из лучших колод игрока содержат карту.
+    decks: int
+    # Прирост взвешенной суммы уровней лучших колод за один уровень карты;
+    # вес колоды — доля открытых в ней карт.
+    gain: float
 
 
 class DeckRecommender:
+    """
+    ``diversity`` (0..1) — вес штрафа за общие карты с уже выбранными
+    колодами при переранжировании (MMR); 0 — чистая сортировка по ключу.
+    """
+
+    def __init__(
+        self,
+        cache: RecommendationCache | None = None,
+        diversity: float = 0.0,
+    ) -> None:
+        self.cache = cache
+        self.diversity = diversity
+
+    def parameters(self, diversity: float | None = None) -> Tuple[object, ...]:
+        """Параметры скоринга, влияющие на результат (входят в ключ кэша)."""
+        if diversity is None:
+            diversity = self.diversity
+        return (MAX_CARD_LEVEL, round(diversity, 3), SHORTLIST_FACTOR, SHORTLIST_MIN)
+
+    @staticmethod
+    def effective_levels(
+        player: PlayerProfile,
+        catalog: DeckCatalog,
+    ) -> Dict[int, int]:
+        levels: Dict[int, int] = {}
+        for player_card in player.cards:
+            level = player_card.level
+            max_level = catalog.card_info(player_card.id).max_level
+            if max_level:
+                level = MAX_CARD_LEVEL - max_level + level
+            levels[player_card.id] = level
+        return levels
+
+    @staticmethod
+    def score(catalog: DeckCatalog, levels: Dict[int, int]) -> array:
+        """
+        Возвращает массив ключей сортировки для всех колод каталога.
+        Колоды без единой открытой карты и удалённые строки получают ключ 0.
+        """
+        get_level = levels.get
+        card_ids = catalog.card_ids
+        offsets = catalog.offsets
+        deck_ids = catalog.deck_ids
+        alive = catalog.alive
+        keys = array("q", bytes(8 * len(catalog)))
+
+        for index in range(len(keys)):
+            if not alive[index]:
+                continue
+            owned = 0
+            total_level = 0
+            for pos in range(offsets[index], offsets[index + 1]):
+                level = get_level(card_ids[pos])
+                if level is not None:
+                    owned += 1
+                    total_level += level
+            if owned:
+                keys[index] = (
+                    (owned << OWNED_SHIFT)
+                    | (total_level << LEVEL_SHIFT)
+                    | deck_ids[index]
+                )
+
+        return keys
+
     def recommend(
         self,
         player: PlayerProfile,
-        decks: Iterable[Deck],
+        decks: DeckCatalog | Iterable[Deck],
         limit: int = 3,
+        diversity: float | None = None,
     ) -> List[RecommendedDeck]:
-        level_by_card_id = {card.id: card.level for card in player.cards}
-        scored: List[RecommendedDeck] = []
+        if diversity is None:
+            diversity = self.diversity
+        catalog = decks if isinstance(decks, DeckCatalog) else DeckCatalog.from_decks(decks)
+        levels = self.effective_levels(player, catalog)
 
-        for deck in decks:
-            owned = 0
-            total_level = 0
-            cards: List[RecommendedDeckCard] = []
+        top = self._cached_rank(
+            catalog, levels, limit, diversity, self.parameters(diversity)
+        )
 
-            for deck_card in deck.deck_cards.all():
-                card = deck_card.card
-                card_level = level_by_card_id.get(card.api_id)
-                effective_level: int | None = None
+        raw_levels = {card.id: card.level for card in player.cards}
+        return [
+            self._build_result(catalog, index, raw_levels, levels)
+            for index in top
+        ]
 
-                if card_level is not None:
-                    owned += 1
-                    effective_level = card_level
-                    if card.max_level:
-                        effective_level = 16 - card.max_level + card_level
-                    total_level += effective_level
-                cards.append(
-                    RecommendedDeckCard(
-                        card=card,
-                        level=card_level,
-                        effective_level=effective_level,
-                    )
-                )
+    def _cached_rank(
+        self,
+        catalog: DeckCatalog,
+        levels: Dict[int, int],
+        limit: int,
+        diversity: float,
+        params: Tuple[object, ...],
+    ) -> Tuple[int, ...]:
+        if self.cache is None or not catalog.version:
+            return self.rank(catalog, levels, limit, diversity)
+        relevant = {
+            api_id: level
+            for api_id, level in levels.items()
+            if api_id in catalog.cards
+        }
+        key = self.cache.make_key(relevant, limit, params, catalog.version)
+        top = self.cache.get(key)
+        if top is None:
+            top = self.rank(catalog, levels, limit, diversity)
+            self.cache.put(key, top)
+        return top
 
-            if owned == 0:
-                continue
+    def upgrades(
+        self,
+        player: PlayerProfile,
+        catalog: DeckCatalog,
+        limit: int = 5,
+        top: int = UPGRADE_TOP_DECKS,
+    ) -> List[UpgradeSuggestion]:
+        """
+        Какие карты выгоднее всего прокачать: прирост считается сразу для
+        всех карт игрока одним проходом по лучшим ``top`` колодам —
+        произведение матрицы ``колода × карта`` (CSR-массивы каталога) на
+        вектор весов колод, с маской карт, которые ещё не на максимуме.
+        Пересчитывать рекомендации для каждой карты не нужно.
+        """
+        levels = self.effective_levels(player, catalog)
+        columns: Dict[int, int] = {}
+        for api_id, level in levels.items():
+            if level < MAX_CARD_LEVEL:
+                columns[api_id] = len(columns)
+        if not columns:
+            return []
 
-            scored.append(
-                RecommendedDeck(
-                    deck=deck,
-                    owned_cards_count=owned,
-                    total_level=total_level,
-                    cards=cards,
-                )
+        # Тот же ключ кэша, что у recommend(limit=top, diversity=0).
+        shortlist = self._cached_rank(catalog, levels, top, 0.0, self.parameters(0.0))
+        gains = array("d", bytes(8 * len(columns)))
+        counts = array("I", bytes(4 * len(columns)))
+        card_ids = catalog.card_ids
+        offsets = catalog.offsets
+        get_column = columns.get
+        for index in shortlist:
+            start, end = offsets[index], offsets[index + 1]
+            deck_cards = card_ids[start:end]
+            weight = sum(api_id in levels for api_id in deck_cards) / (end - start)
+            for api_id in deck_cards:
+                column = get_column(api_id)
+                if column is not None:
+                    gains[column] += weight
+                    counts[column] += 1
+
+        # При равном приросте дешевле поднять карту пониже.
+        best = nlargest(
+            limit,
+            (api_id for api_id, column in columns.items() if counts[column]),
+            key=lambda api_id: (gains[columns[api_id]], -levels[api_id], -api_id),
+        )
+        raw_levels = {card.id: card.level for card in player.cards}
+        return [
+            UpgradeSuggestion(
+                card=catalog.card_info(api_id),
+                level=raw_levels.get(api_id),
+                effective_level=levels[api_id],
+                decks=counts[columns[api_id]],
+                gain=gains[columns[api_id]],
             )
+            for api_id in best
+        ]
 
-        scored.sort(
-            key=lambda d: (
-                d.owned_cards_count,
-                d.total_level,
-            ),
-            reverse=True,
+    def rank(
+        self,
+        catalog: DeckCatalog,
+        levels: Dict[int, int],
+        limit: int,
+        diversity: float = 0.0,
+    ) -> Tuple[int, ...]:
+        """
+        Индексы лучших колод каталога: по убыванию ключа или, при
+        ``diversity > 0``, в порядке MMR-переранжирования короткого списка.
+        """
+        keys = self.score(catalog, levels)
+        candidates = (index for index in range(len(keys)) if keys[index])
+        if diversity <= 0:
+            return tuple(nlargest(limit, candidates, key=keys.__getitem__))
+        shortlist = nlargest(
+            max(SHORTLIST_MIN, SHORTLIST_FACTOR * limit), candidates, key=keys.__getitem__
         )
+        return self.diversify(catalog, keys, shortlist, limit, diversity)
 
-        return scored[:limit]
+    @staticmethod
+    def diversify(
+        catalog: DeckCatalog,
+        keys: array,
+        shortlist: List[int],
+        limit: int,
+        diversity: float,
+    ) -> Tuple[int, ...]:
+        """
+        Жадный MMR: на каждом шаге берётся колода с максимальным
+        ``(1 - diversity) * релевантность - diversity * перекрытие``, где
+        перекрытие — доля общих карт с самой похожей из уже выбранных
+        (popcount пересечения битовых масок). Ничьи решает ключ сортировки,
+        поэтому результат детерминирован.
+        """
+        bits: Dict[int, int] = {}
+        masks: Dict[int, int] = {}
+        relevance: Dict[int, float] = {}
+        max_level_sum = 8 * MAX_CARD_LEVEL + 1
+        for index in shortlist:
+            mask = 0
+            for api_id in catalog.deck_card_ids(index):
+                mask |= 1 << bits.setdefault(api_id, len(bits))
+            masks[index] = mask
+            key = keys[index]
+            owned = key >> OWNED_SHIFT
+            total_level = (key >> LEVEL_SHIFT) & ((1 << (OWNED_SHIFT - LEVEL_SHIFT)) - 1)
+            # Открытые карты важнее любой суммы уровней, как и в ключе.
+            relevance[index] = (owned + total_level / max_level_sum) / 9
 
+        selected: List[int] = []
+        overlap = dict.fromkeys(shortlist, 0.0)
+        remaining = list(shortlist)
+        while remaining and len(selected) < limit:
+            best = max(
+                remaining,
+                key=lambda index: (
+                    (1 - diversity) * relevance[index] - diversity * overlap[index],
+                    keys[index],
+                ),
+            )
+            selected.append(best)
+            remaining.remove(best)
+            best_mask = masks[best]
+            size = best_mask.bit_count() or 1
+            for index in remaining:
+                shared = (masks[index] & best_mask).bit_count() / size
+                if shared > overlap[index]:
+                    overlap[index] = shared
+        return tuple(selected)
 
+    @staticmethod
+    def _build_result(
+        catalog: DeckCatalog,
+        index: int,
+        raw_levels: Dict[int, int],
+        levels: Dict[int, int],
+    ) -> RecommendedDeck:
+        owned = 0
+        total_level = 0
+        cards: List[RecommendedDeckCard] = []
+        for api_id in catalog.deck_card_ids(index):
+            effective_level = levels.get(api_id)
+            if effective_level is not None:
+                owned += 1
+                total_level += effective_level
+            cards.append(
+                RecommendedDeckCard(
+                    card=catalog.card_info(api_id),
+                    level=raw_levels.get(api_id),
+                    effective_level=effective_level,
+                )
+            )
+        return RecommendedDeck(
+            deck=catalog.deck_info(index),
+            owned_cards_count=owned,
+            total_level=total_level,
+            cards=cards,
+        )
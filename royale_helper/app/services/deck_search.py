@@ -0,0 +1,205 @@
+import re
+import threading
+from array import array
+from dataclasses import dataclass, field
+from math import isnan
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from app.models import Card
+from .deck_catalog import DeckCatalog, DeckInfo, get_catalog
+
+
+@dataclass(frozen=True)
+class DeckQuery:
+    include: Sequence[int] = ()
+    exclude: Sequence[int] = ()
+    mode: str | None = None
+    min_elixir: float | None = None
+    max_elixir: float | None = None
+    min_win_rate: float | None = None
+    limit: int = 50
+
+
+@dataclass
+class SearchResult:
+    decks: List[DeckInfo] = field(default_factory=list)
+    card_ids: List[List[int]] = field(default_factory=list)
+    # Есть ли подходящие колоды сверх limit.
+    has_more: bool = False
+
+
+# Номера установленных битов байта от старшего к младшему.
+_BYTE_BITS = tuple(
+    tuple(bit for bit in range(7, -1, -1) if value >> bit & 1) for value in range(256)
+)
+_NONZERO_BYTE = re.compile(b"[^\x00]")
+_ALIVE_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+class DeckSearchIndex:
+    """
+    Инвертированный индекс каталога: api_id карты → отсортированный массив
+    строк каталога с этой картой. Новые и изменённые колоды DeckCatalog
+    дописывает в конец, поэтому массивы остаются отсортированными и при
+    ``sync`` только дополняются; удалённые строки отсекаются маской
+    ``catalog.alive``.
+
+    Как и DeckCatalog, опубликованный индекс не меняется: ``sync`` строит
+    новый, копируя только дополняемые массивы, поэтому поиск без блокировок
+    всегда видит согласованные каталог и индекс.
+
+    Пересечение и разность списков считаются над битовыми масками строк
+    (``int``), которые строятся из массивов лениво и дополняются вместе с
+    ними, — это операции на C, а не цикл по спискам. Найденные строки
+    перебираются от недавно обновлённых колод к старым, фильтры по режиму,
+    эликсиру и винрейту проверяются по колонкам каталога до ``limit``
+    результатов.
+    """
+
+    def __init__(self, catalog: DeckCatalog, base: "DeckSearchIndex | None" = None) -> None:
+        # base — индекс предыдущей версии того же каталога: его массивы
+        # берутся как есть и копируются, только если дополняются.
+        self.catalog = catalog
+        self.postings: Dict[int, array] = dict(base.postings) if base else {}
+        self._masks: Dict[int, Tuple[int, int]] = dict(base._masks) if base else {}
+        self._alive: int | None = None
+        self._rows = base._rows if base else 0
+        self._sync_rows()
+
+    def sync(self, catalog: DeckCatalog) -> "DeckSearchIndex":
+        """Индекс для ``catalog``; текущий экземпляр не меняется."""
+        if catalog is self.catalog:
+            return self
+        if catalog.lineage is not self.catalog.lineage:
+            return DeckSearchIndex(catalog)
+        return DeckSearchIndex(catalog, base=self)
+
+    def _sync_rows(self) -> None:
+        catalog = self.catalog
+        postings = self.postings
+        copied: set[int] = set()
+        for row in range(self._rows, len(catalog)):
+            for api_id in set(catalog.deck_card_ids(row)):
+                if api_id not in copied:
+                    # Массив мог достаться от предыдущего индекса.
+                    postings[api_id] = array("i", postings.get(api_id, ()))
+                    copied.add(api_id)
+                postings[api_id].append(row)
+        self._rows = len(catalog)
+
+    def count(self, api_id: int) -> int:
+        """Число строк каталога с картой, включая удалённые."""
+        return len(self.postings.get(api_id, ()))
+
+    def _card_mask(self, api_id: int) -> int:
+        posting = self.postings.get(api_id)
+        if not posting:
+            return 0
+        mask, covered = self._masks.get(api_id, (0, 0))
+        if covered < len(posting):
+            if covered == 0:
+                bits = bytearray(self._rows // 8 + 1)
+                for row in posting:
+                    bits[row >> 3] |= 1 << (row & 7)
+                mask = int.from_bytes(bits, "little")
+            else:
+                for row in posting[covered:]:
+                    mask |= 1 << row
+            self._masks[api_id] = (mask, len(posting))
+        return mask
+
+    def _alive_mask(self) -> int:
+        if self._alive is None:
+            digits = bytes(self.catalog.alive[::-1]).translate(_ALIVE_DIGITS)
+            self._alive = int(digits, 2) if digits else 0
+        return self._alive
+
+    def _rows_desc(self, mask: int) -> Iterator[int]:
+        size = (mask.bit_length() + 7) // 8
+        data = mask.to_bytes(size, "big")
+        for match in _NONZERO_BYTE.finditer(data):
+            position = match.start()
+            base = (size - 1 - position) * 8
+            for bit in _BYTE_BITS[data[position]]:
+                yield base + bit
+
+    def search(self, query: DeckQuery) -> SearchResult:
+        catalog = self.catalog
+        mask = self._alive_mask()
+        for api_id in set(query.include):
+            mask &= self._card_mask(api_id)
+        for api_id in set(query.exclude):
+            mask &= ~self._card_mask(api_id)
+
+        offsets = catalog.offsets
+        card_ids = catalog.card_ids
+        modes = catalog.modes
+        elixir = catalog.avg_elixir
+        win_rate = catalog.win_rate
+        min_elixir = query.min_elixir
+        max_elixir = query.max_elixir
+        min_win_rate = query.min_win_rate
+
+        result = SearchResult()
+        for row in self._rows_desc(mask):
+            if query.mode is not None and modes[row] != query.mode:
+                continue
+            if min_elixir is not None or max_elixir is not None:
+                value = elixir[row]
+                if isnan(value):
+                    continue
+                if min_elixir is not None and value < min_elixir:
+                    continue
+                if max_elixir is not None and value > max_elixir:
+                    continue
+            if min_win_rate is not None:
+                value = win_rate[row]
+                if isnan(value) or value < min_win_rate:
+                    continue
+            if len(result.decks) == query.limit:
+                result.has_more = True
+                break
+            result.decks.append(catalog.deck_info(row))
+            result.card_ids.append(list(card_ids[offsets[row]:offsets[row + 1]]))
+
+        return result
+
+    def resolve_cards(self, values: Iterable[str]) -> List[int] | None:
+        """
+        Карты запроса по api_id, названию или слагу ("hog-rider"). None, если
+        какую-то карту найти не удалось.
+        """
+        by_slug = {
+            Card.make_slug(info.name): api_id
+            for api_id, info in self.catalog.cards.items()
+            if info.name
+        }
+        api_ids: List[int] = []
+        for value in values:
+            value = value.strip()
+            if not value:
+                continue
+            if value.isdigit():
+                api_ids.append(int(value))
+                continue
+            api_id = by_slug.get(Card.make_slug(value))
+            if api_id is None:
+                return None
+            api_ids.append(api_id)
+        return api_ids
+
+
+_index_lock = threading.Lock()
+_index: DeckSearchIndex | None = None
+
+
+def get_search_index() -> DeckSearchIndex:
+    """Общий для процесса индекс, синхронизированный с get_catalog()."""
+    global _index
+    catalog = get_catalog()
+    with _index_lock:
+        if _index is None:
+            _index = DeckSearchIndex(catalog)
+        else:
+            _index = _index.sync(catalog)
+        return _index
@@ -0,0 +1,285 @@
+import random
+import threading
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from heapq import nlargest
+from itertools import combinations
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+from .deck_catalog import DeckCatalog, DeckInfo, get_catalog
+
+
+# MinHash: NUM_HASHES значений на колоду, LSH-корзины по ROWS_PER_BAND
+# значений. Для колод из 8 карт пара с 7 общими картами попадает хотя бы
+# в одну общую корзину с вероятностью ~99.8 %, с 6 общими — ~91 %,
+# а случайные колоды почти не пересекаются, и корзины остаются маленькими.
+NUM_HASHES = 30
+ROWS_PER_BAND = 3
+
+# На каталогах меньше этого размера полный перебор быстрее LSH.
+LSH_MIN_DECKS = 2000
+
+# Сколько кандидатов из LSH (с наибольшим числом общих корзин) проверять
+# точным Jaccard: в плотных кластерах метовых колод корзины большие.
+MAX_CANDIDATES = 256
+
+SEED = 0x5EED
+
+
+@dataclass(frozen=True)
+class SimilarDeck:
+    index: int
+    deck: DeckInfo
+    similarity: float
+
+
+class DeckSimilarityIndex:
+    """
+    Индексы близости колод поверх DeckCatalog.
+
+    * Состав колоды — битовая маска по картам, Jaccard считается как
+      ``popcount(a & b) / popcount(a | b)``.
+    * Матрица совместной встречаемости карт ``card × card`` (число колод,
+      где есть обе карты) и число колод на карту.
+    * MinHash-подписи колод, разложенные по LSH-корзинам, для поиска
+      кандидатов на больших каталогах.
+
+    ``sync`` строит индекс для новой версии каталога из текущего: добавляет
+    дописанные строки и вычитает помеченные удалёнными
+    (DeckCatalog.removed_rows). Как и DeckCatalog, опубликованный индекс не
+    меняется, поэтому запросы без блокировок не видят наполовину
+    пересчитанных счётчиков. Полный пересчёт — только когда каталог уплотнён
+    или перезагружен (сменился ``catalog.lineage``).
+    """
+
+    def __init__(self, catalog: DeckCatalog, base: "DeckSimilarityIndex | None" = None) -> None:
+        # base — индекс предыдущей версии того же каталога (см. sync).
+        self.catalog = catalog
+        self._rng = random.Random(SEED)
+        if base is None:
+            self.card_bits: Dict[int, int] = {}
+            self._card_hashes: List[Tuple[int, ...]] = []
+            self.card_counts = array("I")
+            self._pairs: List[array] = []
+            self.masks: List[int] = []
+            self.live_count = 0
+            self._buckets: Dict[Tuple[int, ...], Set[int]] = {}
+            # Ключи корзин, которые можно менять на месте; None — все.
+            self._owned: Set[Tuple[int, ...]] | None = None
+            self._removed_seen = 0
+        else:
+            self._rng.setstate(base._rng.getstate())
+            self.card_bits = dict(base.card_bits)
+            self._card_hashes = list(base._card_hashes)
+            self.card_counts = array("I", base.card_counts)
+            self._pairs = [array("I", row) for row in base._pairs]
+            self.masks = list(base.masks)
+            self.live_count = base.live_count
+            # Корзины общие с base и копируются при первом изменении.
+            self._buckets = dict(base._buckets)
+            self._owned = set()
+            self._removed_seen = base._removed_seen
+        self._sync_rows()
+
+    def sync(self, catalog: DeckCatalog) -> "DeckSimilarityIndex":
+        """Индекс для ``catalog``; текущий экземпляр не меняется."""
+        if catalog is self.catalog:
+            return self
+        if catalog.lineage is not self.catalog.lineage:
+            return DeckSimilarityIndex(catalog)
+        return DeckSimilarityIndex(catalog, base=self)
+
+    def _sync_rows(self) -> None:
+        catalog = self.catalog
+        for row in range(len(self.masks), len(catalog)):
+            if catalog.alive[row]:
+                self._add(catalog.deck_card_ids(row))
+            else:
+                self.masks.append(0)
+        removed = catalog.removed_rows
+        for row in removed[self._removed_seen:]:
+            if row < len(self.masks) and self.masks[row]:
+                self._remove(row)
+        self._removed_seen = len(removed)
+
+    # --- карты -------------------------------------------------------------
+
+    def _bit(self, api_id: int) -> int:
+        bit = self.card_bits.get(api_id)
+        if bit is not None:
+            return bit
+        bit = len(self.card_bits)
+        self.card_bits[api_id] = bit
+        self._card_hashes.append(
+            tuple(self._rng.getrandbits(32) for _ in range(NUM_HASHES))
+        )
+        self.card_counts.append(0)
+        for row in self._pairs:
+            row.append(0)
+        self._pairs.append(array("I", bytes(4 * (bit + 1))))
+        return bit
+
+    def mask_of(self, api_ids: Iterable[int]) -> int:
+        """Маска набора карт; неизвестные индексу карты не учитываются."""
+        mask = 0
+        for api_id in api_ids:
+            bit = self.card_bits.get(api_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    @staticmethod
+    def _bits(mask: int) -> List[int]:
+        bits = []
+        while mask:
+            low = mask & -mask
+            bits.append(low.bit_length() - 1)
+            mask ^= low
+        return bits
+
+    def cooccurrence(self, a: int, b: int) -> int:
+        """Число колод каталога, где есть обе карты (api_id)."""
+        bit_a, bit_b = self.card_bits.get(a), self.card_bits.get(b)
+        if bit_a is None or bit_b is None:
+            return 0
+        if bit_a == bit_b:
+            return self.card_counts[bit_a]
+        return self._pairs[bit_a][bit_b]
+
+    def synergy(self, a: int, b: int) -> float:
+        """
+        Lift пары карт: во сколько раз чаще они встречаются вместе, чем при
+        независимом выборе. 1.0 — нейтрально, 0.0 — вместе не встречаются.
+        """
+        bit_a, bit_b = self.card_bits.get(a), self.card_bits.get(b)
+        if bit_a is None or bit_b is None or not self.live_count:
+            return 0.0
+        both = self.cooccurrence(a, b)
+        if not both:
+            return 0.0
+        return both * self.live_count / (self.card_counts[bit_a] * self.card_counts[bit_b])
+
+    # --- колоды ------------------------------------------------------------
+
+    def _signature(self, bits: Sequence[int]) -> Tuple[int, ...]:
+        return tuple(map(min, zip(*(self._card_hashes[bit] for bit in bits))))
+
+    def _band_keys(self, bits: Sequence[int]) -> List[Tuple[int, ...]]:
+        signature = self._signature(bits)
+        return [
+            (start,) + signature[start:start + ROWS_PER_BAND]
+            for start in range(0, NUM_HASHES, ROWS_PER_BAND)
+        ]
+
+    def _bucket(self, key: Tuple[int, ...]) -> Set[int]:
+        bucket = self._buckets.get(key)
+        if bucket is None or (self._owned is not None and key not in self._owned):
+            bucket = self._buckets[key] = set(bucket or ())
+            if self._owned is not None:
+                self._owned.add(key)
+        return bucket
+
+    def _add(self, api_ids: Iterable[int]) -> None:
+        bits = sorted({self._bit(api_id) for api_id in api_ids})
+        row = len(self.masks)
+        mask = 0
+        for bit in bits:
+            mask |= 1 << bit
+            self.card_counts[bit] += 1
+        for a, b in combinations(bits, 2):
+            self._pairs[a][b] += 1
+            self._pairs[b][a] += 1
+        self.masks.append(mask)
+        if bits:
+            self.live_count += 1
+            for key in self._band_keys(bits):
+                self._bucket(key).add(row)
+
+    def _remove(self, row: int) -> None:
+        bits = self._bits(self.masks[row])
+        for bit in bits:
+            self.card_counts[bit] -= 1
+        for a, b in combinations(bits, 2):
+            self._pairs[a][b] -= 1
+            self._pairs[b][a] -= 1
+        for key in self._band_keys(bits):
+            if key in self._buckets:
+                bucket = self._bucket(key)
+                bucket.discard(row)
+                if not bucket:
+                    del self._buckets[key]
+        self.masks[row] = 0
+        self.live_count -= 1
+
+    def jaccard(self, row_a: int, row_b: int) -> float:
+        a, b = self.masks[row_a], self.masks[row_b]
+        union = (a | b).bit_count()
+        return (a & b).bit_count() / union if union else 0.0
+
+    def _candidates(self, bits: Sequence[int], limit: int) -> Iterable[int]:
+        if self.live_count < LSH_MIN_DECKS:
+            return range(len(self.masks))
+        # Число общих корзин растёт с Jaccard, поэтому лучшие кандидаты —
+        # строки с наибольшим числом попаданий.
+        hits: Counter[int] = Counter()
+        for key in self._band_keys(bits):
+            hits.update(self._buckets.get(key, ()))
+        if len(hits) <= limit:
+            return hits
+        return [row for row, _ in hits.most_common(limit)]
+
+    def similar(
+        self,
+        api_ids: Sequence[int],
+        limit: int = 5,
+        exclude_row: int | None = None,
+    ) -> List[SimilarDeck]:
+        """
+        Ближайшие по Jaccard колоды к набору карт. На больших каталогах
+        кандидаты берутся из LSH-корзин, поэтому результат приближённый.
+        """
+        mask = self.mask_of(api_ids)
+        # Карты, которых нет ни в одной колоде, всё равно увеличивают объединение.
+        unknown = len(set(api_ids)) - mask.bit_count()
+        bits = self._bits(mask)
+        if not bits:
+            return []
+
+        scored: List[Tuple[float, int, int]] = []
+        deck_ids = self.catalog.deck_ids
+        for row in self._candidates(bits, max(MAX_CANDIDATES, 8 * limit)):
+            other = self.masks[row]
+            if not other or row == exclude_row:
+                continue
+            shared = (mask & other).bit_count()
+            if shared:
+                union = (mask | other).bit_count() + unknown
+                scored.append((shared / union, deck_ids[row], row))
+
+        return [
+            SimilarDeck(index=row, deck=self.catalog.deck_info(row), similarity=similarity)
+            for similarity, _, row in nlargest(limit, scored)
+        ]
+
+    def similar_to_deck(self, deck_id: int, limit: int = 5) -> List[SimilarDeck]:
+        row = self.catalog.index_of(deck_id)
+        if row is None:
+            return []
+        return self.similar(self.catalog.deck_card_ids(row), limit=limit, exclude_row=row)
+
+
+_index_lock = threading.Lock()
+_index: DeckSimilarityIndex | None = None
+
+
+def get_similarity_index() -> DeckSimilarityIndex:
+    """Общий для процесса индекс, синхронизированный с get_catalog()."""
+    global _index
+    catalog = get_catalog()
+    with _index_lock:
+        if _index is None:
+            _index = DeckSimilarityIndex(catalog)
+        else:
+            _index = _index.sync(catalog)
+        return _index
@@ -0,0 +1,280 @@
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Type
+
+
+@dataclass(frozen=True)
+class RawDeck:
+    """
+    Колода в том виде, в каком её отдал источник. Карты заданы одним из
+    способов: api_id (``card_ids``), слагами RoyaleAPI (``card_slugs``)
+    или названиями (``card_names``).
+    """
+
+    card_ids: List[str] = field(default_factory=list)
+    card_slugs: List[str] = field(default_factory=list)
+    card_names: List[str] = field(default_factory=list)
+    avg_elixir: float | None = None
+    win_rate: float | None = None
+    avg_crowns: float | None = None
+    usage: int | None = None
+
+
+class DeckSource:
+    """
+    Плагин источника колод: ``fetch`` отдаёт HTML, ``parse`` — генератор
+    RawDeck. Новый источник достаточно унаследовать и зарегистрировать
+    в SOURCES.
+    """
+
+    name = ""
+    default_url = ""
+    default_mode = ""
+    headers: Dict[str, str] = {"User-Agent": "Mozilla/5.0 (royale-helper)"}
+    timeout = 20
+
+    def fetch(self, url: str | None = None) -> str:
+        # bs4 и requests импортируются при первом использовании: разбор
+        # сохранённых файлов не ходит в сеть, а импорт модуля не платит за оба.
+        import requests
+
+        resp = requests.get(
+            url or self.default_url,
+            headers=self.headers,
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return resp.text
+
+    @staticmethod
+    def read_file(path: str | Path) -> str:
+        return Path(path).read_text(encoding="utf-8")
+
+    def parse(self, html: str) -> Iterator[RawDeck]:
+        raise NotImplementedError
+
+
+class StatsRoyaleSource(DeckSource):
+    name = "statsroyale"
+    default_url = "https://statsroyale.com/ru/decks/popular?type=path-of-legends"
+    default_mode = "path-of-legends"
+
+    def parse(self, html: str) -> Iterator[RawDeck]:
+        import bs4  # type: ignore
+
+        soup = bs4.BeautifulSoup(html, "html.parser")
+
+        for box in soup.select("div.content-box"):
+            link = box.select_one('a[href^="clashroyale://copyDeck?deck="]')
+            if not link:
+                continue
+
+            m = re.search(r"deck=([^&]+)", link.get("href", ""))
+            if not m:
+                continue
+
+            card_ids = [cid for cid in m.group(1).split(";") if cid]
+            if len(card_ids) != 8:
+                continue
+
+            yield RawDeck(
+                card_ids=card_ids,
+                avg_elixir=self._number_by_img(box, "images/elixir.png"),
+                win_rate=self._number_by_img(box, "images/battle.png"),
+                avg_crowns=self._number_by_img(box, "images/crown-blue.png"),
+            )
+
+    @staticmethod
+    def _number_by_img(box, src_fragment: str) -> float | None:
+        img = box.select_one(f'img[src*="{src_fragment}"]')
+        if not img:
+            return None
+        parent_div = img.find_parent("div")
+        if not parent_div:
+            return None
+        text_divs = parent_div.select("div")
+        if not text_divs:
+            return None
+        raw = text_divs[-1].get_text(strip=True)
+        raw = raw.replace("%", "").replace(",", ".").strip()
+        try:
+            return float(raw)
+        except ValueError:
+            return None
+
+
+class RoyaleAPISource(DeckSource):
+    name = "royaleapi"
+    default_url = (
+        "https://royaleapi.com/decks/popular"
+        "?time=1d&sort=rating&size=30&players=PvP"
+        "&min_elixir=1&max_elixir=9&evo=None"
+        "&min_cycle_elixir=4&max_cycle_elixir=28"
+        "&mode=detail&type=Ranked&global_exclude=false"
+    )
+    default_mode = "ranked"
+    headers = {
+        "User-Agent": "Mozilla/5.0 (royale-helper)",
+        "Accept-Language": "en-US,en;q=0.9,ru;q=0.8",
+    }
+    timeout = 25
+
+    markers = ["Best Clash Royale Decks", "Popular Decks", "Deck Stats"]
+
+    bad_tokens = {
+        "Deck Stats",
+        "4-Card Cycle",
+        "Rating",
+        "Usage",
+        "Wins",
+        "Draws",
+        "Losses",
+    }
+
+    def has_markers(self, html: str) -> bool:
+        return any(marker in html for marker in self.markers)
+
+    def parse(self, html: str) -> Iterator[RawDeck]:
+        """
+        Сначала быстрый путь по JSON-LD, текстовый разбор страницы — только
+        если JSON-LD на странице нет или в нём не нашлось колод.
+        """
+        found = False
+        for deck in self.parse_json_ld(html):
+            found = True
+            yield deck
+        if not found:
+            yield from self.parse_text(html)
+
+    def parse_json_ld(self, html: str) -> Iterator[RawDeck]:
+        """
+        Разбирает единственный ``<script type="application/ld+json">`` без
+        построения дерева документа. В ItemList лежат элементы вида
+        ``{"item": {"name": ..., "url": ".../decks/stats/card1,card2,..."}}``,
+        слаги карт берём из последнего сегмента URL.
+        """
+        data = self._json_ld(html)
+        if data is None:
+            return
+
+        # mainEntity может быть в dict или в одном из элементов списка
+        main_entities = None
+        if isinstance(data, dict):
+            main_entities = data.get("mainEntity")
+        elif isinstance(data, list):
+            for obj in data:
+                if isinstance(obj, dict) and "mainEntity" in obj:
+                    main_entities = obj.get("mainEntity")
+                    break
+
+        if isinstance(main_entities, dict):
+            main_entities = [main_entities]
+        if not isinstance(main_entities, list):
+            return
+
+        for entity in main_entities:
+            if not isinstance(entity, dict) or entity.get("@type") != "ItemList":
+                continue
+            for elem in entity.get("itemListElement") or []:
+                item = elem.get("item") if isinstance(elem, dict) else None
+                url = item.get("url") if isinstance(item, dict) else None
+                if not isinstance(url, str):
+                    continue
+                slugs = [s for s in url.rstrip("/").split("/")[-1].split(",") if s]
+                if len(slugs) == 8:
+                    yield RawDeck(card_slugs=slugs)
+
+    @staticmethod
+    def _json_ld(html: str):
+        marker = html.find('type="application/ld+json"')
+        if marker == -1:
+            return None
+        start = html.find(">", marker)
+        end = html.find("</script>", start)
+        if start == -1 or end == -1:
+            return None
+        try:
+            return json.loads(html[start + 1:end])
+        except json.JSONDecodeError:
+            return None
+
+    def parse_text(self, html: str) -> Iterator[RawDeck]:
+        import bs4  # type: ignore
+
+        soup = bs4.BeautifulSoup(html, "html.parser")
+
+        # Ищем элементы, где встречается текст 'Avg Elixir'
+        for avg_label in soup.find_all(
+            string=lambda s: isinstance(s, str) and "Avg Elixir" in s
+        ):
+            container = avg_label.find_parent("section") or avg_label.find_parent("div")
+            if not container:
+                continue
+
+            texts = [t.strip() for t in container.stripped_strings if t.strip()]
+            try:
+                idx = texts.index("Avg Elixir")
+            except ValueError:
+                continue
+
+            card_names = self._card_names(texts[:idx])
+            if card_names is None:
+                continue
+
+            yield RawDeck(
+                card_names=card_names,
+                avg_elixir=self._first_number(texts[idx + 1:]),
+            )
+
+    def _card_names(self, candidates: List[str]) -> List[str] | None:
+        filtered = [
+            t
+            for t in candidates
+            if t not in self.bad_tokens
+            and not self._looks_like_number(t)
+            and not t.endswith("%")
+        ]
+
+        seen: set[str] = set()
+        cards_reversed: List[str] = []
+        for t in reversed(filtered):
+            if t in seen:
+                continue
+            seen.add(t)
+            cards_reversed.append(t)
+            if len(cards_reversed) == 8:
+                break
+
+        if len(cards_reversed) != 8:
+            return None
+        return list(reversed(cards_reversed))
+
+    @staticmethod
+    def _looks_like_number(s: str) -> bool:
+        return bool(re.fullmatch(r"[0-9]+(\.[0-9]+)?", s.replace(",", ".")))
+
+    @staticmethod
+    def _first_number(texts: List[str]) -> float | None:
+        for txt in texts:
+            try:
+                return float(txt.replace(",", ".").strip())
+            except ValueError:
+                continue
+        return None
+
+
+SOURCES: Dict[str, Type[DeckSource]] = {
+    StatsRoyaleSource.name: StatsRoyaleSource,
+    RoyaleAPISource.name: RoyaleAPISource,
+}
+
+
+def get_source(name: str) -> DeckSource:
+    try:
+        return SOURCES[name]()
+    except KeyError:
+        raise ValueError(
+            f"Неизвестный источник колод: {name}. Доступны: {', '.join(SOURCES)}."
+        ) from None
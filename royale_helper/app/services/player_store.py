@@ -0,0 +1,274 @@
+import json
+import logging
+import queue
+import struct
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from app.models import Card, PlayerDelta, StoredPlayer
+from .clash_royale import ClashRoyaleAPI, PlayerCard, PlayerProfile
+
+
+logger = logging.getLogger(__name__)
+
+# Карта в упакованном виде: api_id, level, max_level, star_level,
+# evolution_level. Отсутствующее значение — NONE.
+CARD_STRUCT = struct.Struct("<IBBBB")
+NONE = 0xFF
+
+
+def _byte(value: int | None) -> int:
+    return NONE if value is None else min(int(value), NONE - 1)
+
+
+def _value(byte: int) -> int | None:
+    return None if byte == NONE else byte
+
+
+def pack_cards(cards: Iterable[PlayerCard]) -> bytes:
+    """Уровни карт одним блобом по 8 байт на карту, по возрастанию api_id."""
+    return b"".join(
+        CARD_STRUCT.pack(
+            card.id,
+            _byte(card.level),
+            _byte(card.max_level),
+            _byte(card.star_level),
+            _byte(card.evolution_level),
+        )
+        for card in sorted(cards, key=lambda card: card.id)
+    )
+
+
+def _split(blob: bytes) -> Dict[int, bytes]:
+    size = CARD_STRUCT.size
+    return {
+        CARD_STRUCT.unpack_from(blob, offset)[0]: blob[offset:offset + size]
+        for offset in range(0, len(blob), size)
+    }
+
+
+def unpack_cards(blob: bytes, names: Dict[int, str] | None = None) -> List[PlayerCard]:
+    names = names or {}
+    return [
+        PlayerCard(
+            id=api_id,
+            name=names.get(api_id, ""),
+            level=level,
+            max_level=_value(max_level),
+            star_level=_value(star_level),
+            evolution_level=_value(evolution_level),
+        )
+        for api_id, level, max_level, star_level, evolution_level
+        in CARD_STRUCT.iter_unpack(bytes(blob))
+    ]
+
+
+def save_profiles(profiles: Iterable[PlayerProfile], now: datetime | None = None) -> int:
+    """
+    Сохраняет пачку профилей одной транзакцией. Неизменившиеся профили
+    получают только новое fetched_at, для изменившихся пишется PlayerDelta
+    с картами, которые поменялись. Возвращает число изменившихся профилей.
+    """
+    now = now or timezone.now()
+    latest = {profile.tag: profile for profile in profiles}
+    if not latest:
+        return 0
+    existing = {
+        player.tag: player
+        for player in StoredPlayer.objects.filter(tag__in=list(latest))
+    }
+
+    new_players: List[StoredPlayer] = []
+    changed_players: List[StoredPlayer] = []
+    seen_players: List[StoredPlayer] = []
+    deltas: List[PlayerDelta] = []
+    for tag, profile in latest.items():
+        fields = {
+            "name": profile.name,
+            "exp_level": profile.exp_level,
+            "trophies": profile.trophies,
+            "best_trophies": profile.best_trophies,
+            "cards": pack_cards(profile.cards),
+        }
+        player = existing.get(tag)
+        if player is None:
+            new_players.append(
+                StoredPlayer(tag=tag, fetched_at=now, changed_at=now, **fields)
+            )
+            continue
+
+        player.fetched_at = now
+        player.cards = bytes(player.cards)
+        if all(getattr(player, name) == value for name, value in fields.items()):
+            seen_players.append(player)
+            continue
+
+        old_cards = _split(player.cards)
+        changed_cards = b"".join(
+            packed
+            for api_id, packed in _split(fields["cards"]).items()
+            if old_cards.get(api_id) != packed
+        )
+        deltas.append(
+            PlayerDelta(
+                player=player,
+                changed_at=now,
+                trophies=profile.trophies,
+                cards=changed_cards,
+            )
+        )
+        for name, value in fields.items():
+            setattr(player, name, value)
+        player.changed_at = now
+        changed_players.append(player)
+
+    with transaction.atomic():
+        StoredPlayer.objects.bulk_create(new_players)
+        StoredPlayer.objects.bulk_update(seen_players, ["fetched_at"])
+        StoredPlayer.objects.bulk_update(
+            changed_players,
+            ["name", "exp_level", "trophies", "best_trophies", "cards", "fetched_at", "changed_at"],
+        )
+        PlayerDelta.objects.bulk_create(deltas)
+
+    return len(new_players) + len(changed_players)
+
+
+def load_profile(raw_tag: str) -> PlayerProfile | None:
+    """Последний сохранённый профиль игрока или None."""
+    try:
+        tag = ClashRoyaleAPI.normalize_tag(raw_tag)
+    except ValueError:
+        return None
+    return load_profiles([tag]).get(tag)
+
+
+def load_profiles(
+    raw_tags: Iterable[str],
+    names: Dict[int, str] | None = None,
+) -> Dict[str, PlayerProfile]:
+    """
+    Сохранённые профили пачкой (по нормализованному тегу) — один запрос на
+    игроков. Названия карт берутся из ``names`` или из таблицы Card.
+    """
+    tags = set()
+    for raw_tag in raw_tags:
+        try:
+            tags.add(ClashRoyaleAPI.normalize_tag(raw_tag))
+        except ValueError:
+            continue
+    players = list(StoredPlayer.objects.filter(tag__in=tags))
+    blobs = {player.tag: bytes(player.cards) for player in players}
+    if names is None:
+        api_ids = {api_id for blob in blobs.values() for api_id in _split(blob)}
+        names = dict(Card.objects.filter(api_id__in=api_ids).values_list("api_id", "name"))
+    return {
+        player.tag: PlayerProfile(
+            tag=player.tag,
+            name=player.name,
+            exp_level=player.exp_level,
+            trophies=player.trophies,
+            best_trophies=player.best_trophies,
+            cards=unpack_cards(blobs[player.tag], names),
+            cached_at=player.fetched_at,
+        )
+        for player in players
+    }
+
+
+def iter_profile_dumps(directory: str | Path) -> Iterator[Dict[str, Any]]:
+    """
+    Ответы API из JSON-дампов ``player_profiles/*.json`` (либо сам ответ,
+    либо ``{"raw": ответ, "meta": ...}``) по одному, без загрузки всех сразу.
+    """
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        data = data.get("raw", data) if isinstance(data, dict) else None
+        if isinstance(data, dict) and data.get("tag"):
+            yield data
+
+
+class PlayerStore:
+    """
+    Хранилище профилей для ClashRoyaleAPI: ``submit`` только ставит профиль
+    в очередь, запись идёт пачками в фоновом потоке вне обработки запроса.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_pending: int = 10_000,
+    ) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue[PlayerProfile] = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, profile: PlayerProfile) -> None:
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(profile)
+        except queue.Full:
+            logger.warning("Очередь профилей переполнена, профиль %s не сохранён", profile.tag)
+
+    def load(self, raw_tag: str) -> PlayerProfile | None:
+        return load_profile(raw_tag)
+
+    def flush(self) -> int:
+        """Синхронно записывает всё, что накопилось в очереди."""
+        return save_profiles(self._drain(block=False))
+
+    def _drain(self, block: bool) -> List[PlayerProfile]:
+        """
+        Пачка профилей из очереди. В фоновом потоке ждёт первый профиль и
+        ещё до ``flush_interval`` секунд добирает остальные.
+        """
+        batch: List[PlayerProfile] = []
+        deadline = 0.0
+        if block:
+            batch.append(self._queue.get())
+            deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _ensure_writer(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="player-store-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._drain(block=True)
+            try:
+                save_profiles(batch)
+            except Exception:  # noqa: BLE001 - поток записи не должен умирать
+                logger.exception("Не удалось сохранить %d профилей", len(batch))
+            finally:
+                close_old_connections()
+
+
+player_store = PlayerStore()
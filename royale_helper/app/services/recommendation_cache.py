@@ -0,0 +1,120 @@
+import logging
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from hashlib import blake2b
+from typing import Dict, Iterable, Tuple
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class RecommendationCache:
+    """
+    LRU-кэш результатов скоринга перед DeckRecommender.
+
+    Ключ — стабильный хеш вектора (api_id, effective_level) игрока, limit,
+    параметров скоринга и версии каталога, поэтому смена каталога
+    инвалидирует записи автоматически. Храним только индексы выбранных
+    колод: карточки результата всегда собираются по уровням текущего игрока.
+
+    ``level_bucket`` > 1 квантует уровни (например, 2 — уровни 13 и 14
+    попадают в одну корзину), повышая hit rate ценой приближённого ранжирования.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        level_bucket: int = 1,
+        report_every: int = 1000,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize должен быть положительным.")
+        if level_bucket < 1:
+            raise ValueError("level_bucket должен быть положительным.")
+        self.maxsize = maxsize
+        self.level_bucket = level_bucket
+        self.report_every = report_every
+        self._entries: "OrderedDict[bytes, Tuple[int, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def make_key(
+        self,
+        levels: Dict[int, int],
+        limit: int,
+        params: Iterable[object],
+        catalog_version: str,
+    ) -> bytes:
+        bucket = self.level_bucket
+        digest = blake2b(digest_size=16)
+        for api_id, level in sorted(levels.items()):
+            digest.update(struct.pack("<qq", api_id, level // bucket))
+        digest.update(repr((limit, tuple(params), catalog_version)).encode("utf-8"))
+        return digest.digest()
+
+    def get(self, key: bytes) -> Tuple[int, ...] | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._entries.move_to_end(key)
+            lookups = self._hits + self._misses
+        if self.report_every and lookups % self.report_every == 0:
+            stats = self.stats()
+            logger.info(
+                "Recommendation cache: hit rate %.1f%% (%d/%d), size %d/%d",
+                stats.hit_rate * 100,
+                stats.hits,
+                lookups,
+                stats.size,
+                stats.maxsize,
+            )
+        return value
+
+    def put(self, key: bytes, value: Tuple[int, ...]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                size=len(self._entries),
+                maxsize=self.maxsize,
+            )
+
+
+recommendation_cache = RecommendationCache(
+    maxsize=getattr(settings, "RECOMMENDATION_CACHE_SIZE", 1024),
+    level_bucket=getattr(settings, "RECOMMENDATION_CACHE_LEVEL_BUCKET", 1),
+)
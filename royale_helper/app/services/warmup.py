@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from django.apps import apps
+from django.db import connection
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+from .deck_catalog import get_catalog
+from .deck_generator import get_deck_generator
+from .deck_search import get_search_index
+from .deck_similarity import get_similarity_index
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupState:
+    started_at: float | None = None
+    finished: bool = False
+    error: str = ""
+    # Время шагов прогрева, секунд, в порядке выполнения.
+    steps: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def running(self) -> bool:
+        return self.started_at is not None and not self.finished
+
+    @property
+    def ready(self) -> bool:
+        return self.finished and not self.error
+
+
+def _load_templates() -> None:
+    root = Path(apps.get_app_config("app").path, "templates")
+    for path in sorted(root.rglob("*.html")):
+        get_template(path.relative_to(root).as_posix())
+
+
+# То, за что иначе платит первый запрос воркера: импорт views через
+# URLconf, соединение с БД, каталог с картами, индексы и шаблоны.
+STEPS: List[Tuple[str, Callable[[], object]]] = [
+    ("urls", lambda: get_resolver().url_patterns),
+    ("db", connection.ensure_connection),
+    ("catalog", get_catalog),
+    ("search_index", get_search_index),
+    ("similarity_index", get_similarity_index),
+    ("deck_generator", get_deck_generator),
+    ("templates", _load_templates),
+]
+
+_lock = threading.Lock()
+_state = WarmupState()
+_thread: threading.Thread | None = None
+
+
+def warmup_state() -> WarmupState:
+    return _state
+
+
+def warm_up() -> WarmupState:
+    """Выполняет шаги прогрева в текущем потоке и пишет их время в лог."""
+    state = _state
+    if state.started_at is None:
+        state.started_at = time.perf_counter()
+    try:
+        for name, step in STEPS:
+            started = time.perf_counter()
+            step()
+            state.steps[name] = time.perf_counter() - started
+    except Exception as exc:  # noqa: BLE001 - прогрев не должен ронять воркер
+        state.error = f"{type(exc).__name__}: {exc}"
+        logger.exception("Прогрев не удался на шаге %s", name)
+    else:
+        logger.info(
+            "Прогрев завершён за %.2f с (%s)",
+            time.perf_counter() - state.started_at,
+            ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in state.steps.items()),
+        )
+    finally:
+        state.finished = True
+        # Соединение потока прогрева больше никому не понадобится.
+        connection.close()
+    return state
+
+
+def start_warmup() -> bool:
+    """
+    Запускает прогрев в фоновом потоке, если он ещё не шёл или завершился
+    ошибкой. Возвращает True, если прогрев запущен этим вызовом.
+    """
+    global _state, _thread
+    with _lock:
+        if _state.running or _state.ready:
+            return False
+        _state = WarmupState(started_at=time.perf_counter())
+        _thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+    _thread.start()
+    return True
+
+
+def _before_fork() -> None:
+    """
+    Форк (gunicorn --preload, uWSGI без lazy-apps) ждёт конца прогрева:
+    поток прогрева в дочерний процесс не переходит, а занятые им блокировки
+    каталога и индексов остались бы занятыми навсегда. Воркеры получают уже
+    прогретые данные.
+    """
+    thread = _thread
+    if thread is not None and thread is not threading.current_thread():
+        thread.join()
+
+
+def _after_fork_in_child() -> None:
+    """Незавершённый прогрев в воркере сбрасывается: его перезапустит /ready."""
+    global _lock, _state, _thread
+    _lock = threading.Lock()
+    _thread = None
+    if _state.running:
+        _state = WarmupState()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_before_fork, after_in_child=_after_fork_in_child)
@@ -1,8 +1,92 @@
-from django.test import TestCase
+import csv
+import json
+import logging
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-from app.models import Card, Deck, DeckCard
-from app.services.deck_recommendation import DeckRecommender
-from app.services.clash_royale import PlayerCard, PlayerProfile
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, transaction
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from app.models import (
+    BattleDeckStats,
+    CatalogChange,
+    Card,
+    Deck,
+    DeckCard,
+    DeckStatSnapshot,
+    DeckTrend,
+    IngestedBattle,
+    PlayerDelta,
+    StoredPlayer,
+)
+from app.apps import _serves_requests
+from app.management.commands.import_cards import card_defaults, fetch_cards
+from app.management.commands.refresh_daemon import (
+    Command as RefreshDaemonCommand,
+    RefreshJob,
+    _prune_history,
+    single_instance_lock,
+)
+from app.services.battle_log import BATTLELOG_MODE, BattleAggregator
+from app.services.card_index import CardIndex
+from app.services.clan_recommend import clan_report
+from app.services.catalog_sync import DeckRecord, sync_cards, sync_decks
+from app.services.deck_history import prune_snapshots, refresh_trends
+from app.services.deck_pipeline import run_pages_pipeline, run_pipeline
+from app.services.deck_sources import RoyaleAPISource, StatsRoyaleSource
+from app.services.catalog_snapshot import SnapshotError, load_snapshot, write_snapshot
+from app.services.deck_catalog import (
+    CardInfo,
+    DeckCatalog,
+    get_catalog,
+    prune_catalog_changes,
+    record_catalog_changes,
+)
+from app.services.deck_generator import DeckConstraints, DeckGenerator
+from app.services.deck_recommendation import MAX_CARD_LEVEL, DeckRecommender
+from app.services.deck_search import DeckQuery, DeckSearchIndex
+from app.services.deck_similarity import DeckSimilarityIndex
+from app.services.recommendation_cache import RecommendationCache
+from app.services.warmup import (
+    WarmupState,
+    _after_fork_in_child,
+    start_warmup,
+    warm_up,
+    warmup_state,
+)
+from app.services.api_stub import (
+    StubConfig,
+    StubData,
+    load_recorded_profiles,
+    start_stub_server,
+    stub_base_url,
+)
+from app.services.clash_royale import (
+    ClashRoyaleAPI,
+    ClashRoyaleAPIError,
+    PlayerCard,
+    PlayerProfile,
+    RateLimiter,
+    TokenPool,
+)
+from app.services.player_store import PlayerStore, save_profiles
+from royale_helper.db import ReadReplicaRouter, sqlite_database
 
 
 class DeckRecommenderTest(TestCase):
@@ -58,9 +142,1010 @@ class DeckRecommenderTest(TestCase):
         recommendations = recommender.recommend(self.player, decks, limit=3)
 
         self.assertTrue(recommendations)
-        self.assertEqual(recommendations[0].deck, self.deck_full)
+        self.assertEqual(recommendations[0].deck.id, self.deck_full.pk)
         self.assertGreater(
             recommendations[0].owned_cards_count,
             recommendations[1].owned_cards_count,
         )
 
+    def test_recommend_from_catalog_builds_only_top_results(self):
+        recommender = DeckRecommender()
+        catalog = DeckCatalog.from_db()
+
+        recommendations = recommender.recommend(self.player, catalog, limit=1)
+
+        self.assertEqual(len(recommendations), 1)
+        top = recommendations[0]
+        self.assertEqual(top.deck.id, self.deck_full.pk)
+        self.assertEqual(top.owned_cards_count, 8)
+        self.assertEqual(top.total_level, 80)
+        self.assertEqual(
+            [card_info.card.api_id for card_info in top.cards],
+            list(range(1, 9)),
+        )
+
+    def test_recommend_uses_cache_until_catalog_changes(self):
+        cache = RecommendationCache(maxsize=4)
+        recommender = DeckRecommender(cache=cache)
+
+        first = recommender.recommend(self.player, DeckCatalog.from_db(), limit=2)
+        second = recommender.recommend(self.player, DeckCatalog.from_db(), limit=2)
+
+        self.assertEqual(first, second)
+        self.assertEqual((cache.stats().hits, cache.stats().misses), (1, 1))
+
+        new_deck = Deck.objects.create(mode="test")
+        record_catalog_changes(upserted=[new_deck.pk])
+        recommender.recommend(self.player, DeckCatalog.from_db(), limit=2)
+
+        self.assertEqual(cache.stats().misses, 2)
+
+    def test_cache_hit_rate_report_reaches_configured_log(self):
+        logger = logging.getLogger("app.services.recommendation_cache")
+        self.assertTrue(logger.isEnabledFor(logging.INFO))
+        self.assertTrue(any(parent.handlers for parent in (logger, logger.parent)))
+
+        cache = RecommendationCache(maxsize=4, report_every=2)
+        with self.assertLogs(logger, "INFO") as logs:
+            cache.get(b"a")
+            cache.get(b"b")
+        self.assertIn("hit rate 0.0% (0/2)", logs.output[0])
+
+    def test_diversity_reranking_is_deterministic_and_avoids_overlap(self):
+        decks = {
+            1: [1, 2, 3, 4, 5, 6, 7, 8],
+            2: [1, 2, 3, 4, 5, 6, 7, 9],  # почти копия колоды 1
+            3: [1, 2, 3, 4, 5, 6, 8, 9],  # тоже
+            4: [5, 6, 7, 8, 9, 10, 11, 12],
+        }
+        rows = [(deck_id, "test", None, None, None) for deck_id in decks]
+        catalog = DeckCatalog.from_rows(rows, decks, {})
+        player = PlayerProfile(
+            tag="#PLAYER",
+            name="Player",
+            exp_level=50,
+            trophies=7000,
+            best_trophies=None,
+            cards=[PlayerCard(id=i, name="", level=10) for i in range(1, 11)],
+        )
+        recommender = DeckRecommender()
+
+        plain = recommender.recommend(player, catalog, limit=2)
+        self.assertEqual([item.deck.id for item in plain], [3, 2])
+
+        diverse = [
+            [item.deck.id for item in recommender.recommend(player, catalog, limit=2, diversity=0.6)]
+            for _ in range(3)
+        ]
+        self.assertEqual(diverse, [[3, 4]] * 3)
+
+    def test_upgrade_advisor_ranks_cards_by_weighted_deck_gain(self):
+        self.player.cards[4] = PlayerCard(id=5, name="Card 5", level=MAX_CARD_LEVEL)
+        catalog = DeckCatalog.from_db()
+
+        upgrades = DeckRecommender().upgrades(self.player, catalog, limit=5)
+
+        # Карты 6–8 есть в обеих колодах (вес 8/8 + 4/8), 1–4 — только в полной;
+        # карта 5 уже на максимуме.
+        self.assertEqual([item.card.api_id for item in upgrades], [6, 7, 8, 1, 2])
+        self.assertEqual([item.decks for item in upgrades], [2, 2, 2, 1, 1])
+        self.assertAlmostEqual(upgrades[0].gain, 1.5)
+        self.assertAlmostEqual(upgrades[3].gain, 1.0)
+
+    def test_generator_builds_synergistic_deck_within_constraints(self):
+        names = {1: "Hog Rider", 2: "Zap", 3: "Fireball"}
+        cards = {
+            api_id: CardInfo(api_id=api_id, name=names.get(api_id, f"Troop {api_id}"), icon_url="", max_level=None)
+            for api_id in range(1, 13)
+        }
+        decks = {deck_id: [1, 2, 4, 5, 6, 7, 8, 9] for deck_id in range(1, 6)}
+        decks[6] = [3, 4, 5, 6, 7, 10, 11, 12]
+        decks[7] = [1, 3, 4, 5, 10, 11, 12, 9]
+        rows = [(deck_id, "test", None, None, None) for deck_id in decks]
+        catalog = DeckCatalog.from_rows(rows, decks, cards)
+        generator = DeckGenerator(DeckSimilarityIndex(catalog), {api_id: 3 for api_id in cards})
+        player = PlayerProfile(
+            tag="#PLAYER",
+            name="Player",
+            exp_level=50,
+            trophies=7000,
+            best_trophies=None,
+            cards=[PlayerCard(id=api_id, name="", level=10) for api_id in cards],
+        )
+
+        best = generator.generate(player, limit=2)
+        self.assertEqual([card.card.api_id for card in best[0].cards], decks[1])
+        self.assertEqual(best[0].avg_elixir, 3.0)
+        self.assertGreaterEqual(len({card.card.api_id for card in best[1].cards} - set(decks[1])), 2)
+
+        two_spells = generator.generate(player, limit=1, constraints=DeckConstraints(min_spells=2))
+        api_ids = {card.card.api_id for card in two_spells[0].cards}
+        self.assertTrue({1, 2, 3} <= api_ids)
+
+        no_win_condition = DeckConstraints(min_win_conditions=2)
+        self.assertEqual(generator.generate(player, constraints=no_win_condition), [])
+
+    def test_catalog_applies_deltas_like_full_reload(self):
+        catalog = DeckCatalog.from_db()
+
+        new_deck = Deck.objects.create(mode="delta", win_rate=55.0)
+        for position, card in enumerate(Card.objects.order_by("api_id")[2:10]):
+            DeckCard.objects.create(deck=new_deck, card=card, position=position)
+        deleted_id = self.deck_partial.pk
+        self.deck_partial.delete()
+        record_catalog_changes(upserted=[new_deck.pk], deleted=[deleted_id])
+
+        changes = list(
+            CatalogChange.objects.filter(id__gt=catalog.sequence).values_list(
+                "id", "deck_id", "action"
+            )
+        )
+        # Дельта: только колоды и карты изменённых колод, без полной загрузки.
+        with self.assertNumQueries(2):
+            updated = catalog.apply_changes(changes)
+        reloaded = DeckCatalog.from_db()
+
+        self.assertEqual(updated.sequence, reloaded.sequence)
+        self.assertIsNone(updated.index_of(deleted_id))
+        self.assertEqual(
+            list(updated.deck_card_ids(updated.index_of(new_deck.pk))),
+            list(range(3, 11)),
+        )
+
+        recommender = DeckRecommender()
+        self.assertEqual(
+            recommender.recommend(self.player, updated, limit=5),
+            recommender.recommend(self.player, reloaded, limit=5),
+        )
+
+    def test_catalog_deltas_copy_on_write_and_compaction_changes_version(self):
+        catalog = DeckCatalog.from_db()
+        rows = list(catalog.deck_ids)
+        cache = RecommendationCache(maxsize=8)
+        recommender = DeckRecommender(cache=cache)
+
+        deleted_id = self.deck_full.pk
+        self.deck_full.delete()
+        record_catalog_changes(deleted=[deleted_id])
+        changes = list(CatalogChange.objects.values_list("id", "deck_id", "action"))
+        with mock.patch("app.services.deck_catalog.COMPACT_RATIO", 1.0):
+            updated = catalog.apply_changes(changes)
+
+        # Опубликованный каталог не тронут: читатели дорабатывают на нём.
+        self.assertIsNot(updated, catalog)
+        self.assertEqual(list(catalog.deck_ids), rows)
+        self.assertEqual(catalog.index_of(deleted_id), 0)
+        self.assertIsNone(updated.index_of(deleted_id))
+
+        # Уплотнение перенумеровывает строки: закэшированные индексы
+        # старой раскладки не должны к нему применяться.
+        before = recommender.recommend(self.player, updated, limit=2)
+        compacted = updated.compact()
+        self.assertNotEqual(compacted.version, updated.version)
+        self.assertEqual(recommender.recommend(self.player, compacted, limit=2), before)
+        self.assertEqual(cache.stats().hits, 0)
+
+    def test_catalog_reloads_when_change_log_was_pruned(self):
+        with mock.patch("app.services.deck_catalog._catalog", None), self.settings(
+            CATALOG_SNAPSHOT_PATH=""
+        ):
+            catalog = get_catalog()
+            new_deck = Deck.objects.create(mode="test")
+            record_catalog_changes(upserted=[new_deck.pk])
+            record_catalog_changes(cards_changed=True)
+            CatalogChange.objects.update(created_at=timezone.now() - timedelta(days=30))
+
+            # Последняя запись остаётся, чтобы отставшие процессы видели разрыв.
+            self.assertEqual(prune_catalog_changes(days=7), 1)
+            self.assertEqual(CatalogChange.objects.count(), 1)
+
+            updated = get_catalog()
+        self.assertGreater(updated.sequence, catalog.sequence)
+        self.assertEqual(updated.version, str(updated.sequence))
+        self.assertIsNotNone(updated.index_of(new_deck.pk))
+
+    def test_similarity_index_follows_catalog_deltas(self):
+        catalog = DeckCatalog.from_db()
+        index = DeckSimilarityIndex(catalog)
+
+        new_deck = Deck.objects.create(mode="delta")
+        for position, card in enumerate(Card.objects.order_by("api_id")[2:10]):
+            DeckCard.objects.create(deck=new_deck, card=card, position=position)
+        deleted_id = self.deck_partial.pk
+        self.deck_partial.delete()
+        record_catalog_changes(upserted=[new_deck.pk], deleted=[deleted_id])
+        changes = CatalogChange.objects.values_list("id", "deck_id", "action")
+
+        with mock.patch("app.services.deck_catalog.COMPACT_RATIO", 1.0):
+            updated = catalog.apply_changes(list(changes))
+        old, index = index, index.sync(updated)
+        self.assertIsNot(index, old)
+        # Опубликованный индекс не меняется: идущий запрос видит свою версию.
+        self.assertIs(old.catalog, catalog)
+        self.assertEqual((old.cooccurrence(11, 12), index.cooccurrence(11, 12)), (1, 0))
+        self.assertEqual(
+            [item.deck.id for item in old.similar_to_deck(self.deck_full.pk)], [deleted_id]
+        )
+
+        fresh = DeckSimilarityIndex(DeckCatalog.from_db())
+        for a, b in [(3, 4), (5, 9), (9, 10), (1, 2)]:
+            self.assertEqual(index.cooccurrence(a, b), fresh.cooccurrence(a, b))
+        self.assertEqual(index.cooccurrence(9, 11), 0)
+
+        similar = index.similar_to_deck(self.deck_full.pk)
+        self.assertEqual([item.deck.id for item in similar], [new_deck.pk])
+        self.assertAlmostEqual(similar[0].similarity, 6 / 10)
+
+    def test_search_index_intersects_postings_and_follows_deltas(self):
+        catalog = DeckCatalog.from_db()
+        index = DeckSearchIndex(catalog)
+
+        def found(**query):
+            return [deck.id for deck in index.search(DeckQuery(**query)).decks]
+
+        self.assertEqual(found(include=[5]), [self.deck_partial.pk, self.deck_full.pk])
+        self.assertEqual(found(include=[1], exclude=[9]), [self.deck_full.pk])
+        self.assertEqual(found(include=[1, 9]), [])
+        self.assertEqual(found(exclude=[12], mode="test"), [self.deck_full.pk])
+
+        new_deck = Deck.objects.create(mode="test", avg_elixir=3.0, win_rate=55)
+        for position, card in enumerate(Card.objects.order_by("api_id")[2:10]):
+            DeckCard.objects.create(deck=new_deck, card=card, position=position)
+        deleted_id = self.deck_full.pk
+        self.deck_full.delete()
+        record_catalog_changes(upserted=[new_deck.pk], deleted=[deleted_id])
+        changes = CatalogChange.objects.values_list("id", "deck_id", "action")
+
+        with mock.patch("app.services.deck_catalog.COMPACT_RATIO", 1.0):
+            updated = catalog.apply_changes(list(changes))
+        old, index = index, index.sync(updated)
+        self.assertIsNot(index, old)
+        # Опубликованный индекс не меняется: идущий поиск видит свою версию.
+        self.assertIs(old.catalog, catalog)
+        self.assertEqual(old.count(5), 2)
+        self.assertEqual(
+            [deck.id for deck in old.search(DeckQuery(include=[5])).decks],
+            [self.deck_partial.pk, deleted_id],
+        )
+
+        self.assertEqual(found(include=[5]), [new_deck.pk, self.deck_partial.pk])
+        self.assertEqual(found(include=[5], max_elixir=3.2, min_win_rate=50), [new_deck.pk])
+        self.assertEqual(found(include=[1]), [])
+        result = index.search(DeckQuery(include=[5], limit=1))
+        self.assertTrue(result.has_more)
+
+        with mock.patch("app.views.get_search_index", return_value=index):
+            response = self.client.get("/api/decks/search/", {"include": "card-3,4", "exclude": "Card 12"})
+            self.assertEqual([deck["id"] for deck in response.json()["decks"]], [new_deck.pk])
+            self.assertEqual(self.client.get("/api/decks/search/", {"include": "nope"}).status_code, 400)
+            page = self.client.get("/decks/", {"include": "Card 11"})
+            self.assertEqual([deck.pk for deck in page.context["decks"]], [self.deck_partial.pk])
+
+    def test_snapshot_round_trip_scores_like_db_catalog(self):
+        catalog = DeckCatalog.from_db()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "catalog.snapshot"
+            write_snapshot(catalog, path)
+            snapshot = load_snapshot(path)
+
+            self.assertEqual(snapshot.version, catalog.version)
+            self.assertEqual(list(snapshot.deck_ids), list(catalog.deck_ids))
+            recommender = DeckRecommender()
+            self.assertEqual(
+                recommender.recommend(self.player, snapshot, limit=5),
+                recommender.recommend(self.player, catalog, limit=5),
+            )
+
+    def test_snapshot_from_other_database_or_pruned_log_is_not_served(self):
+        def fresh_catalog():
+            with mock.patch("app.services.deck_catalog._catalog", None):
+                return get_catalog()
+
+        record_catalog_changes(cards_changed=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "catalog.snapshot"
+            write_snapshot(DeckCatalog.from_db(), path)
+
+            with self.settings(CATALOG_SNAPSHOT_PATH=str(path)):
+                self.assertEqual(type(fresh_catalog().deck_ids), memoryview)
+
+                with self.assertRaises(SnapshotError):
+                    load_snapshot(path, database=b"\0" * 16)
+                with mock.patch(
+                    "app.services.catalog_snapshot.database_fingerprint",
+                    return_value=b"\0" * 16,
+                ), self.assertLogs("app.services.deck_catalog", "WARNING"):
+                    self.assertIsInstance(fresh_catalog().deck_ids, array)
+
+                # Журнал ушёл вперёд, а запись сразу после снимка удалена.
+                record_catalog_changes(cards_changed=True)
+                record_catalog_changes(cards_changed=True)
+                first, second = CatalogChange.objects.order_by("id")[:2]
+                first.delete()
+                second.delete()
+                with self.assertLogs("app.services.deck_catalog", "WARNING"):
+                    self.assertIsInstance(fresh_catalog().deck_ids, array)
+
+
+def statsroyale_box(card_ids, elixir="3.5", win_rate="55%", crowns="1.2"):
+    deck = ";".join(str(card_id) for card_id in card_ids)
+    return (
+        '<div class="content-box">'
+        f'<a href="clashroyale://copyDeck?deck={deck}">copy</a>'
+        f'<div><img src="/images/elixir.png"><div>{elixir}</div></div>'
+        f'<div><img src="/images/battle.png"><div>{win_rate}</div></div>'
+        f'<div><img src="/images/crown-blue.png"><div>{crowns}</div></div>'
+        "</div>"
+    )
+
+
+class RepopulateDbTest(TestCase):
+    def setUp(self):
+        self.stale_card = Card.objects.create(api_id=999, name="Stale")
+        self.unused_card = Card.objects.create(api_id=998, name="Unused")
+        self.other_deck = Deck.objects.create(mode="old")
+        DeckCard.objects.create(deck=self.other_deck, card=self.stale_card, position=0)
+
+        self.api_items = [
+            {"id": i, "name": f"Card {i}", "maxLevel": 14} for i in range(1, 11)
+        ]
+        cards = {i: Card.objects.create(api_id=i, name=f"Card {i}") for i in range(1, 11)}
+        # Колода режима, которой больше нет на странице, и колода, которая
+        # на странице осталась: её история статистики должна сохраниться.
+        self.dropped = Deck.objects.create(
+            mode="path-of-legends", signature=Deck.make_signature(range(2, 10))
+        )
+        self.kept = Deck.objects.create(
+            mode="path-of-legends", signature=Deck.make_signature(range(1, 9)), win_rate=40.0
+        )
+        for deck, api_ids in [(self.dropped, range(2, 10)), (self.kept, range(1, 9))]:
+            for position, api_id in enumerate(api_ids):
+                DeckCard.objects.create(deck=deck, card=cards[api_id], position=position)
+        DeckStatSnapshot.objects.create(deck=self.kept, taken_at=1, win_rate_x100=4000)
+
+        # Дубль колоды на странице пишется один раз.
+        html = statsroyale_box(range(1, 9)) + statsroyale_box(range(3, 11)) * 2
+        # Колода с неизвестной картой должна быть пропущена.
+        html += statsroyale_box([1, 2, 3, 4, 5, 6, 7, 12345])
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.page = Path(self.tmp_dir.name) / "page.html"
+        self.page.write_text(f"<html><body>{html}</body></html>", encoding="utf-8")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_repopulate_replaces_only_its_mode_through_deck_sink(self):
+        module = "app.management.commands.repopulate_db"
+        changes_before = CatalogChange.objects.count()
+        with mock.patch(f"{module}.fetch_cards", return_value=self.api_items):
+            call_command("repopulate_db", file=str(self.page), stdout=StringIO())
+
+        # Колоды других режимов и карты, на которые они ссылаются, остаются.
+        self.assertTrue(Deck.objects.filter(pk=self.other_deck.pk).exists())
+        self.assertTrue(Card.objects.filter(api_id=999).exists())
+        self.assertFalse(Card.objects.filter(api_id=998).exists())
+        self.assertEqual(Card.objects.filter(max_level=14).count(), 10)
+
+        decks = Deck.objects.filter(mode="path-of-legends")
+        self.assertEqual(
+            sorted(decks.values_list("signature", flat=True)),
+            sorted([Deck.make_signature(range(1, 9)), Deck.make_signature(range(3, 11))]),
+        )
+        self.assertFalse(Deck.objects.filter(pk=self.dropped.pk).exists())
+        self.kept.refresh_from_db()
+        self.assertEqual(self.kept.win_rate, 55.0)
+        self.assertEqual(self.kept.snapshots.count(), 2)
+        self.assertEqual(DeckCard.objects.count(), 17)
+
+        actions = list(
+            CatalogChange.objects.order_by("id")[changes_before:].values_list("action", "deck_id")
+        )
+        self.assertNotIn(CatalogChange.RESET, [action for action, _ in actions])
+        self.assertIn((CatalogChange.DELETE, self.dropped.pk), actions)
+        self.assertIn((CatalogChange.UPSERT, self.kept.pk), actions)
+
+
+class RefreshDaemonTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lock_file = Path(self.tmp_dir.name) / "refresh_daemon.lock"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_second_instance_exits_while_lock_is_held(self):
+        with single_instance_lock(self.lock_file):
+            with self.assertRaisesMessage(CommandError, "уже запущен"):
+                with single_instance_lock(self.lock_file):
+                    self.fail("второй экземпляр получил блокировку")
+        # После выхода первого экземпляра блокировка свободна.
+        with single_instance_lock(self.lock_file):
+            pass
+
+    def test_tick_reschedules_with_jitter_and_survives_failing_job(self):
+        now = [1000.0]
+        command = RefreshDaemonCommand(stdout=StringIO(), stderr=StringIO())
+        command.clock = lambda: now[0]
+        command._jitter = 0.5
+        applied = []
+
+        def broken():
+            raise RuntimeError("источник недоступен")
+
+        jobs = [
+            RefreshJob("broken", 100.0, broken, applied.append),
+            RefreshJob("decks", 60.0, lambda: "decks", applied.append),
+            RefreshJob("cards", 3600.0, lambda: "cards", applied.append, next_run=5000.0),
+        ]
+        uniform = "app.management.commands.refresh_daemon.random.uniform"
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            with mock.patch(uniform, side_effect=[0.25, -0.5]) as jitter:
+                delay = command._tick(jobs, executor)
+            jitter.assert_called_with(-0.5, 0.5)
+
+            # Упавшая задача не остановила остальные и осталась в расписании.
+            self.assertEqual(applied, ["decks"])
+            self.assertIn("[broken] ошибка обновления: источник недоступен", command.stderr.getvalue())
+            self.assertEqual([job.next_run for job in jobs], [1125.0, 1030.0, 5000.0])
+            self.assertEqual(delay, 30.0)
+
+            now[0] = 1030.0
+            with mock.patch(uniform, return_value=0.0):
+                self.assertEqual(command._tick(jobs, executor), 60.0)
+            self.assertEqual(applied, ["decks", "decks"])
+            self.assertEqual(jobs[1].next_run, 1090.0)
+
+    def test_history_job_prunes_battle_keys(self):
+        now = int(time.time())
+        IngestedBattle.objects.bulk_create(
+            [
+                IngestedBattle(key="old", battle_at=now - 90 * 86400),
+                IngestedBattle(key="new", battle_at=now - 60),
+            ]
+        )
+
+        _prune_history()
+
+        self.assertEqual(list(IngestedBattle.objects.values_list("key", flat=True)), ["new"])
+
+
+class SqliteSettingsTest(SimpleTestCase):
+    databases = {"default"}
+
+    def test_router_reads_from_replica_and_writes_to_default(self):
+        router = ReadReplicaRouter()
+
+        self.assertEqual(router.db_for_read(Deck), "replica")
+        self.assertEqual(router.db_for_write(Deck), "default")
+        self.assertTrue(router.allow_migrate("default", "app"))
+        self.assertFalse(router.allow_migrate("replica", "app"))
+        # Внутри транзакции на default читаем свои же незакоммиченные записи.
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Deck), "default")
+
+    def test_new_connections_use_wal_and_read_only_replica(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "db.sqlite3"
+            handler = ConnectionHandler(
+                {
+                    "default": sqlite_database(path),
+                    "replica": sqlite_database(path, read_only=True),
+                }
+            )
+            try:
+                with handler["default"].cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], "wal")
+                    cursor.execute("PRAGMA synchronous")
+                    self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+                    cursor.execute("CREATE TABLE t (x INTEGER)")
+
+                with handler["replica"].cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], "wal")
+                    cursor.execute("SELECT COUNT(*) FROM t")
+                    with self.assertRaises(OperationalError):
+                        cursor.execute("INSERT INTO t VALUES (1)")
+            finally:
+                handler.close_all()
+
+
+class CatalogSyncTest(TestCase):
+    def setUp(self):
+        for i in range(1, 10):
+            Card.objects.create(api_id=i, name=f"Card {i}")
+        Card.objects.filter(api_id=9).update(name="Mini P.E.K.K.A", slug="mini-pekka")
+
+    def test_sync_decks_writes_only_differences(self):
+        records = [
+            DeckRecord(api_ids=list(range(1, 9)), avg_elixir=3.1, win_rate=51.0),
+            DeckRecord(api_ids=list(range(2, 10)), avg_elixir=3.4, win_rate=49.0),
+        ]
+        first = sync_decks(records, mode="test")
+        self.assertEqual((first.created, first.updated), (2, 0))
+
+        changes_before = CatalogChange.objects.count()
+        again = sync_decks(records, mode="test")
+        self.assertEqual((again.created, again.updated, again.unchanged), (0, 0, 2))
+        self.assertEqual(CatalogChange.objects.count(), changes_before)
+
+        # Тот же состав в другом порядке — та же колода; None не затирает win_rate.
+        updated = sync_decks(
+            [DeckRecord(api_ids=list(range(8, 0, -1)), avg_elixir=3.2, win_rate=None)],
+            mode="test",
+        )
+        self.assertEqual((updated.created, updated.updated), (0, 1))
+        deck = Deck.objects.get(signature=Deck.make_signature(range(1, 9)))
+        self.assertEqual((deck.avg_elixir, deck.win_rate), (3.2, 51.0))
+        self.assertEqual(Deck.objects.count(), 2)
+
+    def test_sync_cards_backfills_elixir_of_existing_cards(self):
+        fields = card_defaults(
+            {"id": 1, "name": "Card 1", "elixirCost": 3, "iconUrls": {"medium": ""}}
+        )
+        self.assertIsNone(Card.objects.get(api_id=1).elixir)
+
+        result = sync_cards({1: fields})
+
+        self.assertEqual((result.created, result.updated), (0, 1))
+        self.assertEqual(Card.objects.get(api_id=1).elixir, 3)
+        self.assertEqual(sync_cards({1: fields}).unchanged, 1)
+
+    def test_imports_keep_stat_history_and_rolling_trend(self):
+        api_ids = list(range(1, 9))
+        for win_rate in (50.0, 50.0, 52.0):
+            sync_decks([DeckRecord(api_ids=api_ids, win_rate=win_rate, usage=100)], mode="test")
+        deck = Deck.objects.get(mode="test")
+        self.assertEqual(deck.snapshots.count(), 3)
+
+        # Разносим снимки по дням и пересчитываем агрегат: +1 п.п. в день.
+        day = 24 * 60 * 60
+        now = DeckStatSnapshot.objects.first().taken_at
+        for offset, snapshot in zip((-2, -1, 0), deck.snapshots.order_by("id")):
+            snapshot.taken_at = now + offset * day
+            snapshot.win_rate_x100 = round((50 + offset + 2) * 100)
+            snapshot.save()
+        DeckStatSnapshot.objects.create(deck=deck, taken_at=now - 30 * day, win_rate_x100=9000)
+        stale_at = timezone.now() - timedelta(days=1)
+        DeckTrend.objects.filter(deck=deck).update(updated_at=stale_at)
+        refresh_trends([deck.pk], now=now)
+
+        trend = DeckTrend.objects.get(deck=deck)
+        self.assertGreater(trend.updated_at, stale_at)
+        self.assertEqual((trend.samples, trend.win_rate, trend.usage), (3, 51.0, 100.0))
+        self.assertAlmostEqual(trend.win_rate_change, 1.0)
+        self.assertEqual(prune_snapshots(days=7), 1)
+
+    def test_pipeline_streams_source_into_sink(self):
+        html = (
+            statsroyale_box(range(1, 9))
+            + statsroyale_box(range(1, 9), win_rate="60%")
+            + statsroyale_box([1, 2, 3, 4, 5, 6, 7, 404])
+        )
+
+        report = run_pipeline(StatsRoyaleSource(), html, mode="test")
+
+        self.assertEqual((report.parsed, report.unresolved), (3, 1))
+        self.assertEqual((report.sync.created, report.sync.unchanged), (1, 1))
+        deck = Deck.objects.get(mode="test")
+        self.assertEqual(deck.win_rate, 55.0)
+        self.assertEqual(deck.deck_cards.count(), 8)
+
+    def test_pages_pipeline_parses_tar_archive_in_parallel(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pages = Path(tmp, "pages")
+            pages.mkdir()
+            Path(pages, "a.html").write_text(statsroyale_box(range(1, 9)), encoding="utf-8")
+            Path(pages, "b.html").write_text(statsroyale_box(range(2, 10)), encoding="utf-8")
+            archive = Path(tmp, "pages.tar.gz")
+            with tarfile.open(archive, "w:gz") as tar:
+                tar.add(pages, arcname="pages")
+
+            report = run_pages_pipeline(StatsRoyaleSource(), str(archive), mode="test", workers=2)
+
+        self.assertEqual((report.pages, report.parsed, report.sync.created), (2, 2, 2))
+        self.assertEqual(Deck.objects.filter(mode="test").count(), 2)
+
+    def test_royaleapi_json_ld_resolves_slugs(self):
+        slugs = ",".join(
+            ["card-1", "card-2-ev1", "card-3", "card-4", "card-5", "card-6", "card-7", "mini-pekka"]
+        )
+        html = (
+            '<html><head><script type="application/ld+json">'
+            '{"mainEntity": [{"@type": "ItemList", "itemListElement": ['
+            '{"item": {"name": "Deck", "url": "https://royaleapi.com/decks/stats/'
+            + slugs
+            + '"}}]}]}</script></head><body>Avg Elixir</body></html>'
+        )
+
+        report = run_pipeline(RoyaleAPISource(), html, mode="ranked")
+
+        self.assertEqual((report.parsed, report.sync.created), (1, 1))
+        deck = Deck.objects.get(mode="ranked")
+        self.assertEqual(deck.signature, Deck.make_signature([1, 2, 3, 4, 5, 6, 7, 9]))
+
+    def test_card_index_normalizes_and_reports_unresolved(self):
+        index = CardIndex.from_db(fuzzy=True)
+
+        self.assertEqual(index.by_name("MINI PEKKA"), 9)
+        self.assertEqual(index.by_name("Mini P.E.K.A"), 9)  # одна опечатка
+        self.assertIsNone(index.by_name("Card"))  # равно близко к нескольким
+        # Без явного fuzzy опечатка не превращается в другую карту.
+        self.assertEqual(CardIndex.from_db().by_name("MINI PEKKA"), 9)
+        self.assertIsNone(CardIndex.from_db().by_name("Mini P.E.K.A"))
+
+        names = ["Card 1", "card-2", "Card 3", "Card 4", "Card 5", "Card 6", "Bogus", "Bogus"]
+        self.assertIsNone(index.resolve_names(names))
+        self.assertEqual(index.unresolved, {"Bogus": 2})
+
+    def test_battle_aggregator_dedupes_battles_and_publishes_stats(self):
+        def battle(at, team, opponent, team_crowns, opponent_crowns, cards=(range(1, 9), range(2, 10))):
+            return {
+                "type": "PvP",
+                "battleTime": time.strftime("%Y%m%dT%H%M%S.000Z", time.gmtime(at)),
+                "team": [{"tag": team, "crowns": team_crowns, "cards": [{"id": i} for i in cards[0]]}],
+                "opponent": [{"tag": opponent, "crowns": opponent_crowns, "cards": [{"id": i} for i in cards[1]]}],
+            }
+
+        now = int(time.time())
+        first = ClashRoyaleAPI.parse_battle_log(
+            [battle(now - 60, "#A", "#B", 3, 1), battle(now - 120, "#A", "#C", 0, 1), {"type": "PvP"}]
+        )
+        # Тот же бой из журнала соперника (стороны поменялись местами) и бой
+        # за пределами срока хранения.
+        second = ClashRoyaleAPI.parse_battle_log(
+            [
+                battle(now - 60, "#B", "#A", 1, 3, (range(2, 10), range(1, 9))),
+                battle(now - 90 * 86400, "#B", "#D", 1, 0, (range(2, 10), range(1, 9))),
+            ]
+        )
+        self.assertEqual(len(first), 2)
+
+        aggregator = BattleAggregator(batch_size=1, min_battles=2)
+        aggregator.add(first)
+        aggregator.add(second)
+        result = aggregator.flush()
+        self.assertEqual((result.battles, result.duplicates, result.skipped), (2, 1, 1))
+
+        stats = BattleDeckStats.objects.get(signature=Deck.make_signature(range(1, 9)))
+        self.assertEqual((stats.battles, stats.wins, stats.losses, stats.crowns), (2, 1, 1, 3))
+        deck = Deck.objects.get(mode=BATTLELOG_MODE, signature=stats.signature)
+        self.assertEqual((deck.win_rate, deck.avg_crowns), (50.0, 1.5))
+        self.assertEqual(aggregator._seen, set())
+
+        # Следующая пачка идёт через тот же DeckSink и обновляет колоду, а не
+        # создаёт дубль.
+        sink = aggregator._sink
+        aggregator.add(ClashRoyaleAPI.parse_battle_log([battle(now - 30, "#A", "#E", 2, 0)]))
+        aggregator.flush()
+        self.assertIs(aggregator._sink, sink)
+        self.assertEqual(
+            Deck.objects.filter(mode=BATTLELOG_MODE, signature=stats.signature).count(), 1
+        )
+        deck.refresh_from_db()
+        self.assertEqual((deck.win_rate, deck.avg_crowns), (66.67, 1.67))
+
+        # Повторный прогон тех же журналов ничего не меняет.
+        again = BattleAggregator(min_battles=2)
+        again.add(first + second)
+        self.assertEqual((again.flush().battles, again.result.duplicates), (0, 3))
+        stats.refresh_from_db()
+        self.assertEqual(stats.battles, 3)
+
+
+class PlayerStoreTest(TestCase):
+    def profile(self, hog_level):
+        return PlayerProfile(
+            tag="#2YG80UJJ2",
+            name="Player",
+            exp_level=50,
+            trophies=7000,
+            best_trophies=7500,
+            cards=[
+                PlayerCard(id=26000000, name="Knight", level=14, max_level=16),
+                PlayerCard(id=26000021, name="Hog Rider", level=hog_level, max_level=14),
+            ],
+        )
+
+    def test_stores_deltas_and_serves_profile_when_api_is_down(self):
+        self.assertEqual(save_profiles([self.profile(10)]), 1)
+        self.assertEqual(save_profiles([self.profile(10)]), 0)
+        self.assertEqual(save_profiles([self.profile(11)]), 1)
+
+        delta = PlayerDelta.objects.get()
+        self.assertEqual(len(delta.cards), 8)  # изменилась одна карта
+        self.assertEqual(StoredPlayer.objects.count(), 1)
+
+        session = mock.Mock()
+        session.get.side_effect = requests.Timeout()
+        with self.settings(CLASH_ROYALE_API_TOKEN="token"):
+            player = ClashRoyaleAPI(session=session, store=PlayerStore()).get_player("2yg80ujj2")
+
+        self.assertIsNotNone(player.cached_at)
+        self.assertEqual([(card.id, card.level) for card in player.cards], [(26000000, 14), (26000021, 11)])
+
+    def test_batch_recommend_streams_stored_and_dumped_profiles(self):
+        deck = Deck.objects.create(mode="test", win_rate=55.0)
+        for position, (api_id, name) in enumerate([(26000000, "Knight"), (26000021, "Hog Rider")]):
+            card = Card.objects.create(api_id=api_id, name=name)
+            DeckCard.objects.create(deck=deck, card=card, position=position)
+        save_profiles([self.profile(10)])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            dump = {"raw": {"tag": "#QQQ", "name": "Dumped", "cards": [{"id": 26000000, "level": 9}]}}
+            Path(tmp, "QQQ.json").write_text(json.dumps(dump), encoding="utf-8")
+            output = Path(tmp, "out.csv")
+            with mock.patch(
+                "app.services.batch_recommend.get_catalog", return_value=DeckCatalog.from_db()
+            ):
+                call_command("batch_recommend", "#2YG80UJJ2", "#PPP", "bad tag!", "--profiles", tmp,
+                             "--workers", "1", "--chunk-size", "2", "--format", "csv", "--output", str(output),
+                             stdout=StringIO())
+                ndjson, log = StringIO(), StringIO()
+                # Без модуля resource (Windows) сводка выходит без пика памяти.
+                with mock.patch("app.management.commands.batch_recommend.resource", None):
+                    call_command("batch_recommend", "--stored", "--workers", "1", stdout=ndjson, stderr=log)
+
+            with output.open(encoding="utf-8") as stream:
+                rows = list(csv.DictReader(stream))
+
+        self.assertEqual(
+            [(row["tag"], row["deck_id"], row["owned_cards"], row["error"] != "") for row in rows],
+            [
+                ("#2YG80UJJ2", str(deck.pk), "2", False),
+                ("#PPP", "", "", True),
+                ("bad tag!", "", "", True),
+                ("#QQQ", str(deck.pk), "1", False),
+            ],
+        )
+        [stored] = [json.loads(line) for line in ndjson.getvalue().splitlines()]
+        self.assertEqual(stored["recommendations"][0]["cards"], [26000000, 26000021])
+        self.assertIn("Обработано профилей: 1 (ошибок 0)", log.getvalue())
+        self.assertNotIn("пик памяти", log.getvalue())
+
+
+class ApiStubTest(TestCase):
+    def test_client_reads_recorded_and_synthetic_profiles_from_stub(self):
+        profiles = load_recorded_profiles(Path(__file__).resolve().parent.parent / "player_profiles")
+        data = StubData(profiles)
+
+        for config, expected_error in [(StubConfig(), False), (StubConfig(error_rate=1.0), True)]:
+            server = start_stub_server(data, config)
+            try:
+                with self.settings(
+                    CLASH_ROYALE_API_BASE_URL=stub_base_url(server),
+                    CLASH_ROYALE_API_TOKEN="stub-token",
+                ):
+                    api = ClashRoyaleAPI()
+                    if expected_error:
+                        with self.assertRaises(ClashRoyaleAPIError):
+                            api.get_player("#2YG80UJJ2")
+                        continue
+                    recorded = api.get_player("#2YG80UJJ2")
+                    synthetic = api.get_player("#P0000002")
+            finally:
+                server.shutdown()
+                server.server_close()
+
+        self.assertEqual(recorded.name, profiles["#2YG80UJJ2"]["name"])
+        self.assertTrue(synthetic.cards)
+        self.assertEqual(synthetic.tag, "#P0000002")
+
+    def test_card_import_goes_through_token_pool(self):
+        cards = [{"id": 26000000, "name": "Knight", "maxLevel": 16, "elixirCost": 3}]
+        server = start_stub_server(StubData({}, cards), StubConfig())
+        pool = TokenPool(["stub-token"], rate=1000)
+        try:
+            with self.settings(CLASH_ROYALE_API_BASE_URL=stub_base_url(server)):
+                items = fetch_cards(ClashRoyaleAPI(pool=pool))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(items, cards)
+        [stats] = pool.stats()
+        self.assertEqual((stats.requests, stats.in_flight), (1, 0))
+
+        with self.settings(CLASH_ROYALE_API_TOKEN="", CLASH_ROYALE_API_TOKENS=[]):
+            with self.assertRaises(CommandError):
+                fetch_cards()
+
+
+class FakeClock:
+    """Часы для RateLimiter: время идёт только через sleep."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class RateLimiterTest(SimpleTestCase):
+    def test_bucket_refills_from_clock_and_drains(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rate=10, burst=5, clock=clock, sleep=clock.sleep)
+
+        self.assertEqual([limiter.try_acquire() for _ in range(5)], [0.0] * 5)
+        self.assertEqual(limiter.try_acquire(), 0.1)
+
+        limiter.acquire()  # ждёт ровно один токен
+        self.assertEqual(clock.sleeps, [0.1])
+        self.assertEqual(limiter.available(), 0.0)
+
+        clock.now += 60
+        self.assertEqual(limiter.available(), 5.0)  # не больше burst
+        limiter.drain()
+        self.assertEqual(limiter.available(), 0.0)
+
+
+class TokenPoolTest(SimpleTestCase):
+    def test_token_pool_spreads_load_and_drains_throttled_tokens(self):
+        clock = FakeClock()
+        pool = TokenPool(["bad", "good", "spare"], rate=10, burst=1, clock=clock, sleep=clock.sleep)
+        self.assertEqual([pool.acquire() for _ in range(3)], ["bad", "good", "spare"])
+        for token in ("bad", "good"):
+            pool.release(token)
+        pool.release("spare", 429)
+
+        stats = {item.token: item for item in pool.stats()}
+        self.assertEqual(
+            [(item.requests, item.in_flight, item.throttled, item.available) for item in stats.values()],
+            [(1, 0, 0, 0.0), (1, 0, 0, 0.0), (1, 0, 1, 0.0)],
+        )
+
+        pool.acquire()  # бюджет всех токенов исчерпан — ждём пополнения
+        self.assertEqual(clock.sleeps, [0.1])
+        self.assertEqual(sum(item.requests for item in pool.stats()), 4)
+
+    def test_token_pool_retires_forbidden_tokens(self):
+        def get(url, headers, timeout):
+            response = mock.Mock()
+            if headers["Authorization"] == "Bearer bad":
+                response.status_code = 403
+            else:
+                response.status_code = 200
+                response.json.return_value = {"tag": "#2YG80UJJ2", "name": "Player", "cards": []}
+            return response
+
+        session = mock.Mock()
+        session.get.side_effect = get
+        pool = TokenPool(["bad", "good"], rate=1000)
+        player = ClashRoyaleAPI(session=session, pool=pool).get_player("#2YG80UJJ2")
+
+        self.assertEqual(player.name, "Player")
+        self.assertEqual(pool.active, 1)
+        stats = {item.token: item for item in pool.stats()}
+        self.assertTrue(stats["…bad"].retired)
+        self.assertEqual((stats["…good"].requests, stats["…good"].in_flight), (1, 0))
+
+        pool.release("good", 403)
+        with self.assertRaises(ClashRoyaleAPIError):
+            pool.acquire()
+
+
+class ClanRecommendTest(TestCase):
+    def test_clan_report_fetches_members_through_pool_and_caches(self):
+        cards = []
+        deck = Deck.objects.create(mode="test", win_rate=55.0)
+        for position in range(8):
+            card = Card.objects.create(api_id=26000000 + position, name=f"Card {position}", max_level=14)
+            DeckCard.objects.create(deck=deck, card=card, position=position)
+            cards.append({"id": card.api_id, "name": card.name, "maxLevel": 14})
+        cache.clear()
+
+        server = start_stub_server(StubData({}, cards), StubConfig())
+        pool = TokenPool(["stub-token"], rate=1000)
+        try:
+            with self.settings(
+                CLASH_ROYALE_API_BASE_URL=stub_base_url(server),
+                CLASH_ROYALE_API_TOKEN="stub-token",
+            ), mock.patch(
+                "app.services.clan_recommend.get_catalog", return_value=DeckCatalog.from_db()
+            ):
+                api = ClashRoyaleAPI(pool=pool)
+                report = clan_report("#9gulpj9l", api=api, workers=8, diversity=0.0)
+                # refresh из запроса игнорируется: публичный view не обходит кэш.
+                response = self.client.get("/api/clans/9GULPJ9L/", {"refresh": "1"})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(len(report.members), 50)
+        self.assertEqual(report.failed, 0)
+        self.assertTrue(all(item.recommendations[0].deck.id == deck.pk for item in report.members))
+        # Список клана и профиль каждого участника, все токены возвращены в пул.
+        [stats] = pool.stats()
+        self.assertEqual((stats.requests, stats.in_flight, stats.throttled), (51, 0, 0))
+
+        payload = response.json()
+        self.assertTrue(payload["from_cache"])
+        self.assertEqual(
+            [member["tag"] for member in payload["members"]],
+            [item.member.tag for item in report.members],
+        )
+
+
+class WarmupTest(TestCase):
+    def test_ready_endpoint_reports_warmup_progress(self):
+        steps = [("catalog", lambda: None), ("templates", lambda: None)]
+        with mock.patch("app.services.warmup.STEPS", steps), mock.patch(
+            "app.services.warmup._state", WarmupState(started_at=0.0)
+        ), mock.patch("app.views.start_warmup") as start:
+            self.assertEqual(self.client.get("/ready").status_code, 503)
+            start.assert_called_once()
+
+            with self.assertLogs("app.services.warmup", "INFO"):
+                warm_up()
+            response = self.client.get("/ready")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()["steps_ms"]), ["catalog", "templates"])
+
+        failing = [("catalog", mock.Mock(side_effect=RuntimeError("нет БД")))]
+        with mock.patch("app.services.warmup.STEPS", failing), mock.patch(
+            "app.services.warmup._state", WarmupState()
+        ), self.assertLogs("app.services.warmup", "ERROR"):
+            state = warm_up()
+        self.assertFalse(state.ready)
+        self.assertIn("нет БД", state.error)
+
+    def test_warmup_starts_only_in_server_processes(self):
+        cases = [
+            (["/venv/bin/gunicorn", "royale_helper.wsgi"], {}, True),
+            (["/venv/lib/uvicorn/__main__.py", "royale_helper.asgi:application"], {}, True),
+            (["manage.py", "runserver"], {"RUN_MAIN": "true"}, True),
+            (["manage.py", "runserver"], {"RUN_MAIN": ""}, False),  # процесс автоперезагрузки
+            (["manage.py", "batch_recommend"], {}, False),
+            (["-c"], {}, False),
+            (["/venv/bin/pytest"], {}, False),
+            (["/venv/bin/celery", "-A", "royale_helper", "worker"], {}, False),
+        ]
+        for argv, env, expected in cases:
+            with self.subTest(argv=argv), mock.patch.object(sys, "argv", argv), mock.patch.dict(
+                os.environ, env
+            ):
+                self.assertIs(_serves_requests(), expected)
+
+    @skipUnless(hasattr(os, "fork"), "нужен os.fork")
+    def test_fork_inherits_finished_warmup_instead_of_running_one(self):
+        steps = [("catalog", lambda: time.sleep(0.05))]
+        with mock.patch("app.services.warmup.STEPS", steps), mock.patch(
+            "app.services.warmup._state", WarmupState()
+        ):
+            self.assertTrue(start_warmup())
+            pid = os.fork()
+            if pid == 0:
+                os._exit(0 if warmup_state().ready else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertTrue(warmup_state().ready)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+        # Прогрев, оборвавшийся форком, в воркере сбрасывается и перезапускается.
+        with mock.patch("app.services.warmup._state", WarmupState(started_at=0.0)):
+            _after_fork_in_child()
+            self.assertFalse(warmup_state().running)
+
+
+class LazyImportTest(SimpleTestCase):
+    def test_service_layer_imports_http_and_html_parsers_lazily(self):
+        code = (
+            "import sys, django; django.setup(); "
+            "import app.views, app.services.batch_recommend, app.services.deck_sources, "
+            "app.management.commands.repopulate_db; "
+            "print(sorted({'requests', 'bs4'} & set(sys.modules)))"
+        )
+        completed = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(completed.stdout.strip(), "[]")
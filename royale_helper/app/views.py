@@ -1,32 +1,203 @@
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 
 from .models import Deck
 from .services import (
+    ClanNotFoundError,
     ClashRoyaleAPI,
     ClashRoyaleAPIError,
     DeckRecommender,
     PlayerNotFoundError,
 )
+from .services.clan_recommend import clan_report, report_payload
+from .services.clash_royale import get_token_pool
+from .services.deck_catalog import get_catalog
+from .services.deck_generator import get_deck_generator
+from .services.deck_history import attach_trends
+from .services.deck_search import DeckQuery, DeckSearchIndex, get_search_index
+from .services.deck_similarity import get_similarity_index
+from .services.player_store import player_store
+from .services.recommendation_cache import recommendation_cache
+from .services.warmup import start_warmup, warmup_state
 
 
 def index(request):
     return render(request, "app/index.html")
 
 
+def ready(request):
+    """
+    Готовность воркера для балансировщика: 200 после прогрева, 503 пока он
+    идёт или если завершился ошибкой (тогда запрос запускает его заново).
+    """
+    start_warmup()
+    state = warmup_state()
+    return JsonResponse(
+        {
+            "ready": state.ready,
+            "error": state.error,
+            "steps_ms": {name: round(seconds * 1000, 1) for name, seconds in state.steps.items()},
+        },
+        status=200 if state.ready else 503,
+    )
+
+
+SEARCH_PARAMS = ("include", "exclude", "mode", "min_elixir", "max_elixir", "min_win_rate")
+SEARCH_MAX_LIMIT = 200
+
+
+def _split_cards(params, name: str) -> List[str]:
+    return [value for raw in params.getlist(name) for value in raw.split(",")]
+
+
+def _optional_float(params, name: str) -> float | None:
+    raw = params.get(name, "").strip().replace(",", ".")
+    if not raw:
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        raise ValueError(f"Параметр {name} должен быть числом.") from None
+
+
+def _deck_query(params, index: DeckSearchIndex, limit: int) -> DeckQuery:
+    """DeckQuery из GET-параметров; ValueError с текстом для пользователя."""
+    cards = {}
+    for name in ("include", "exclude"):
+        cards[name] = index.resolve_cards(_split_cards(params, name))
+        if cards[name] is None:
+            raise ValueError(f"Неизвестная карта в параметре {name}.")
+    try:
+        limit = min(int(params.get("limit", limit)), SEARCH_MAX_LIMIT)
+    except ValueError:
+        raise ValueError("Параметр limit должен быть целым числом.") from None
+    return DeckQuery(
+        include=cards["include"],
+        exclude=cards["exclude"],
+        mode=params.get("mode", "").strip() or None,
+        min_elixir=_optional_float(params, "min_elixir"),
+        max_elixir=_optional_float(params, "max_elixir"),
+        min_win_rate=_optional_float(params, "min_win_rate"),
+        limit=max(limit, 1),
+    )
+
+
 def decks(request):
-    decks = Deck.objects.prefetch_related("deck_cards__card").all()
-    return render(request, "app/decks.html", {"decks": decks})
+    context: Dict[str, Any] = {"search": {name: request.GET.get(name, "") for name in SEARCH_PARAMS}}
+    if not any(request.GET.get(name) for name in SEARCH_PARAMS):
+        context["decks"] = Deck.objects.prefetch_related("deck_cards__card").all()
+        return render(request, "app/decks.html", context)
+
+    index = get_search_index()
+    try:
+        result = index.search(_deck_query(request.GET, index, 100))
+    except ValueError as exc:
+        context["error"] = str(exc)
+        context["decks"] = []
+        return render(request, "app/decks.html", context)
+
+    found = Deck.objects.prefetch_related("deck_cards__card").in_bulk(
+        [deck.id for deck in result.decks]
+    )
+    context["decks"] = [found[deck.id] for deck in result.decks if deck.id in found]
+    context["has_more"] = result.has_more
+    return render(request, "app/decks.html", context)
+
+
+def search_decks(request):
+    """
+    JSON-поиск по каталогу: ``include``/``exclude`` — карты через запятую
+    (api_id, название или слаг), ``mode``, ``min_elixir``, ``max_elixir``,
+    ``min_win_rate``, ``limit``.
+    """
+    index = get_search_index()
+    try:
+        query = _deck_query(request.GET, index, 50)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    result = index.search(query)
+    return JsonResponse(
+        {
+            "decks": [
+                {
+                    "id": deck.id,
+                    "mode": deck.mode,
+                    "avg_elixir": deck.avg_elixir,
+                    "win_rate": deck.win_rate,
+                    "avg_crowns": deck.avg_crowns,
+                    "cards": api_ids,
+                }
+                for deck, api_ids in zip(result.decks, result.card_ids)
+            ],
+            "has_more": result.has_more,
+        },
+        json_dumps_params={"ensure_ascii": False},
+    )
+
+
+def clan_recommendations(request, clan_tag: str):
+    """
+    JSON: рекомендации для всех участников клана (тег без ``#``).
+    ``limit`` — колод на игрока, ``diverse=1`` — разные колоды. Отчёт
+    всегда берётся из кэша, пока тот не истёк: пересчёт стоит ~50 запросов
+    к API из общего бюджета токенов, поэтому анонимный обход кэша не
+    предусмотрен (принудительно — ``manage.py clan_recommend --refresh``).
+    """
+    try:
+        limit = min(max(int(request.GET.get("limit", 3)), 1), 10)
+    except ValueError:
+        return JsonResponse({"error": "Параметр limit должен быть целым числом."}, status=400)
+    try:
+        report = clan_report(
+            clan_tag,
+            limit=limit,
+            diversity=settings.RECOMMENDATION_DIVERSITY if request.GET.get("diverse") == "1" else 0.0,
+        )
+    except ValueError:
+        return JsonResponse({"error": "Некорректный тег клана."}, status=400)
+    except ClanNotFoundError as exc:
+        return JsonResponse({"error": str(exc)}, status=404)
+    except ImproperlyConfigured as exc:
+        return JsonResponse({"error": str(exc)}, status=503)
+    except ClashRoyaleAPIError as exc:
+        return JsonResponse({"error": str(exc)}, status=502)
+    return JsonResponse(report_payload(report), json_dumps_params={"ensure_ascii": False})
+
+
+def similar_decks(request, deck_id: int):
+    index = get_similarity_index()
+    catalog = index.catalog
+    row = catalog.index_of(deck_id)
+    if row is None:
+        raise Http404("Колода не найдена.")
+
+    def cards(row: int):
+        return [catalog.card_info(api_id) for api_id in catalog.deck_card_ids(row)]
+
+    context = {
+        "deck": catalog.deck_info(row),
+        "deck_cards": cards(row),
+        "similar": [
+            {"item": item, "cards": cards(item.index)}
+            for item in index.similar_to_deck(deck_id, limit=6)
+        ],
+    }
+    return render(request, "app/similar_decks.html", context)
 
 
 @require_http_methods(["GET", "POST"])
 def recommend_deck(request):
     context: Dict[str, Any] = {}
     context["debug_mode"] = settings.DEBUG or request.GET.get("debug") == "1"
+    context["diverse"] = request.method != "POST" or request.POST.get("diverse") == "1"
+    context["generate"] = request.POST.get("generate") == "1"
 
     if request.method == "POST":
         player_tag = request.POST.get("player_tag", "").strip()
@@ -37,22 +208,33 @@ def recommend_deck(request):
         else:
             api = None
             try:
-                api = ClashRoyaleAPI()
+                api = ClashRoyaleAPI(store=player_store)
             except ImproperlyConfigured as exc:
                 context["error"] = str(exc)
 
             if api is not None and "error" not in context:
-                recommender = DeckRecommender()
+                recommender = DeckRecommender(cache=recommendation_cache)
                 try:
                     player = api.get_player(player_tag)
                     context["player"] = player
+                    if player.cached_at is not None:
+                        context["info"] = (
+                            "Clash Royale API сейчас недоступен, показан профиль, "
+                            f"сохранённый {timezone.localtime(player.cached_at):%d.%m.%Y %H:%M}."
+                        )
 
-                    all_decks = Deck.objects.prefetch_related(
-                        "deck_cards__card"
-                    ).all()
-                    recommendations = recommender.recommend(player, all_decks, limit=3)
+                    catalog = get_catalog()
+                    recommendations = recommender.recommend(
+                        player,
+                        catalog,
+                        limit=3,
+                        diversity=settings.RECOMMENDATION_DIVERSITY if context["diverse"] else 0.0,
+                    )
 
-                    context["recommendations"] = recommendations
+                    context["recommendations"] = attach_trends(recommendations)
+                    context["upgrades"] = recommender.upgrades(player, catalog, limit=5)
+                    if context["generate"]:
+                        context["generated"] = get_deck_generator().generate(player, limit=3)
 
                     if not recommendations:
                         context[
@@ -63,5 +245,12 @@ def recommend_deck(request):
                 except ClashRoyaleAPIError as exc:
                     context["error"] = str(exc)
 
+    if context["debug_mode"]:
+        context["cache_stats"] = recommendation_cache.stats()
+        try:
+            context["token_stats"] = get_token_pool().stats()
+        except ImproperlyConfigured:
+            pass
+
     return render(request, "app/recommend.html", context)
 
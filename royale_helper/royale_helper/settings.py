@@ -15,6 +15,8 @@ import os
 
 from dotenv import load_dotenv
 
+from royale_helper.db import sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 # BASE_DIR указывает на папку с manage.py (royale_helper).
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -83,13 +85,20 @@ WSGI_APPLICATION = 'royale_helper.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Прагмы (WAL, synchronous, mmap_size, cache_size) и persistent-соединения
+# настраиваются в royale_helper/db.py и через переменные окружения SQLITE_*.
+DATABASE_PATH = Path(os.getenv("DJANGO_DB_PATH", str(BASE_DIR / 'db.sqlite3')))
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': sqlite_database(DATABASE_PATH),
 }
 
+# Отдельное read-only соединение для чтений: импорты пишут в default,
+# а view читают согласованный снимок через replica.
+if os.getenv("DJANGO_DB_READ_REPLICA", "false").lower() == "true":
+    DATABASES['replica'] = sqlite_database(DATABASE_PATH, read_only=True)
+    DATABASE_ROUTERS = ['royale_helper.db.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,5 +142,69 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-CLASH_ROYALE_API_BASE_URL = "https://api.clashroyale.com/v1"
+# Для нагрузочных тестов можно направить на заглушку (manage.py api_stub).
+CLASH_ROYALE_API_BASE_URL = os.getenv(
+    "CLASH_ROYALE_API_BASE_URL",
+    "https://api.clashroyale.com/v1",
+)
 CLASH_ROYALE_API_TOKEN = os.getenv("CLASH_ROYALE_API_TOKEN", "")
+# Дополнительные токены через запятую: лимиты API действуют на токен,
+# запросы распределяются по пулу (services.clash_royale.TokenPool).
+CLASH_ROYALE_API_TOKENS = [
+    token.strip()
+    for token in os.getenv("CLASH_ROYALE_API_TOKENS", "").split(",")
+    if token.strip()
+]
+# Таймаут запроса к API, секунд. Если API не уложился, берётся профиль из
+# хранилища (services.player_store).
+CLASH_ROYALE_API_TIMEOUT = float(os.getenv("CLASH_ROYALE_API_TIMEOUT", "10"))
+# Запросов в секунду на один токен API.
+CLASH_ROYALE_API_RATE_LIMIT = float(os.getenv("CLASH_ROYALE_API_RATE_LIMIT", "20"))
+
+# Кэш результатов подбора колод (LRU на процесс).
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "1024"))
+# Квантование уровней в ключе кэша: 1 — без квантования.
+RECOMMENDATION_CACHE_LEVEL_BUCKET = int(
+    os.getenv("RECOMMENDATION_CACHE_LEVEL_BUCKET", "1")
+)
+# Вес штрафа за общие карты между рекомендованными колодами (0 — выключено),
+# применяется, когда на странице подбора включено «Разные колоды».
+RECOMMENDATION_DIVERSITY = float(os.getenv("RECOMMENDATION_DIVERSITY", "0.2"))
+
+# Сколько секунд хранится отчёт по клану (services.clan_recommend).
+CLAN_REPORT_TTL = int(os.getenv("CLAN_REPORT_TTL", "600"))
+
+# Бинарный снимок каталога колод (manage.py export_catalog_snapshot).
+# Если файл существует, воркеры открывают его через mmap вместо загрузки из БД.
+CATALOG_SNAPSHOT_PATH = os.getenv(
+    "CATALOG_SNAPSHOT_PATH",
+    str(BASE_DIR / "catalog.snapshot"),
+)
+
+# Срок хранения журнала изменений каталога (CatalogChange), дней: процессы,
+# отставшие сильнее, перечитывают каталог целиком.
+CATALOG_CHANGE_RETENTION_DAYS = int(os.getenv("CATALOG_CHANGE_RETENTION_DAYS", "7"))
+
+# Срок хранения снимков статистики колод (services.deck_history), дней.
+DECK_HISTORY_RETENTION_DAYS = int(os.getenv("DECK_HISTORY_RETENTION_DAYS", "90"))
+
+# Прогрев воркера при старте (services.warmup): каталог, индексы и шаблоны
+# загружаются в фоне до первого запроса; готовность — GET /ready.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        # Сводки сервисов — hit rate кэша рекомендаций, время прогрева
+        # по шагам — в лог воркера.
+        "app.services": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
+# Бои старше этого срока не учитываются, а их ключи удаляются
+# (services.battle_log), дней.
+BATTLE_LOG_RETENTION_DAYS = int(os.getenv("BATTLE_LOG_RETENTION_DAYS", "30"))
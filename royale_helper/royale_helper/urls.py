@@ -7,7 +7,12 @@ from app import views
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", views.index, name="index"),
+    # Без завершающего слеша: проверки балансировщика не следуют редиректам.
+    path("ready", views.ready, name="ready"),
     path("decks/", views.decks, name="decks"),
+    path("api/decks/search/", views.search_decks, name="search_decks"),
+    path("api/clans/<str:clan_tag>/", views.clan_recommendations, name="clan_recommendations"),
+    path("decks/<int:deck_id>/similar/", views.similar_decks, name="similar_decks"),
     path("recommend/", views.recommend_deck, name="recommend_deck"),
 ]
 